@@ -0,0 +1,223 @@
+"""
+Compare benchmark results against a baseline.
+
+A benchmark regresses when its median wall time exceeds the baseline
+median by more than the time threshold and the two runs do not overlap,
+the first quartile of its times lying above the third quartile of the
+baseline times, or when its peak memory exceeds the baseline peak by
+more than the memory threshold. Requiring both a relative slowdown and
+separated quartiles keeps the noise of a single slow repeat from
+failing the comparison. Medians below min_seconds are too short to
+compare and only their memory is checked, and peak memory increases of
+less than min_bytes are ignored.
+
+    python -m benchmarks.compare benchmarks/baseline.json results.json
+
+exits with status 1 and reports each benchmark if any regressed.
+
+"""
+
+from __future__ import division, absolute_import, print_function
+
+import argparse
+import json
+import sys
+
+
+OK = "ok"
+IMPROVED = "improved"
+REGRESSED = "regressed"
+NEW = "new"
+MISSING = "missing"
+
+
+def load_results(path):
+    """ Load the results saved by benchmarks.suite to path. """
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def quantile(values, q):
+    """ Return the q quantile of values by linear interpolation. """
+    values = sorted(values)
+    position = (len(values) - 1)*q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    fraction = position - lower
+    return values[lower] + (values[upper] - values[lower])*fraction
+
+
+def summarize(result):
+    """ Return the median, quartiles and peak memory of a result. """
+    times = result["times"]
+    return {
+        "median": quantile(times, 0.5),
+        "q1": quantile(times, 0.25),
+        "q3": quantile(times, 0.75),
+        "repeats": len(times),
+        "peak_memory": result["peak_memory"],
+    }
+
+
+def compare_result(baseline,
+                   current,
+                   threshold=0.1,
+                   memory_threshold=0.1,
+                   min_seconds=0.001,
+                   min_bytes=65536):
+    """
+    Compare the summaries of a benchmark and return a (status,
+    reasons) tuple.
+    """
+    reasons = []
+    status = OK
+    median_ratio = current["median"]/baseline["median"] \
+        if baseline["median"] else float("inf")
+    comparable = max(current["median"], baseline["median"]) >= min_seconds
+    if comparable and median_ratio > 1.0 + threshold \
+            and current["q1"] > baseline["q3"]:
+        status = REGRESSED
+        reasons.append("median time {:+.1%}".format(median_ratio - 1.0))
+    elif comparable and median_ratio < 1.0 - threshold \
+            and current["q3"] < baseline["q1"]:
+        status = IMPROVED
+        reasons.append("median time {:+.1%}".format(median_ratio - 1.0))
+
+    increase = current["peak_memory"] - baseline["peak_memory"]
+    if baseline["peak_memory"] and increase >= min_bytes:
+        memory_ratio = current["peak_memory"]/baseline["peak_memory"]
+        if memory_ratio > 1.0 + memory_threshold:
+            status = REGRESSED
+            reasons.append("peak memory {:+.1%}".format(memory_ratio - 1.0))
+    return status, reasons
+
+
+def compare(baseline,
+            current,
+            threshold=0.1,
+            memory_threshold=0.1,
+            min_seconds=0.001,
+            min_bytes=65536):
+    """
+    Compare two result files loaded with load_results.
+
+    Returns a list of comparison dicts, one per benchmark and scale of
+    either file, with the name, scale, status, reasons and the baseline
+    and current summaries.
+    """
+    def keyed(results):
+        return {(result["name"], result["scale"]): summarize(result)
+                for result in results["results"]}
+
+    baseline = keyed(baseline)
+    current = keyed(current)
+    comparisons = []
+    keys = list(current) + [key for key in baseline if key not in current]
+    for key in keys:
+        name, scale = key
+        base = baseline.get(key)
+        cur = current.get(key)
+        if base is None:
+            status, reasons = NEW, []
+        elif cur is None:
+            status, reasons = MISSING, []
+        else:
+            status, reasons = compare_result(base,
+                                             cur,
+                                             threshold,
+                                             memory_threshold,
+                                             min_seconds,
+                                             min_bytes)
+        comparisons.append({
+            "name": name,
+            "scale": scale,
+            "status": status,
+            "reasons": reasons,
+            "baseline": base,
+            "current": cur,
+        })
+    return comparisons
+
+
+def regressions(comparisons):
+    return [c for c in comparisons if c["status"] == REGRESSED]
+
+
+def format_report(comparisons):
+    """ Return a table of the comparisons. """
+    lines = ["{:20} {:8} {:>12} {:>12} {:>12} {:>12}  {}".format(
+        "benchmark", "scale", "base median", "median",
+        "base peak", "peak", "status"
+    )]
+
+    def cell(summary, field, fmt):
+        return fmt.format(summary[field]) if summary else "-"
+
+    for c in comparisons:
+        status = c["status"]
+        if c["reasons"]:
+            status += " (" + ", ".join(c["reasons"]) + ")"
+        lines.append("{:20} {:8} {:>12} {:>12} {:>12} {:>12}  {}".format(
+            c["name"],
+            c["scale"],
+            cell(c["baseline"], "median", "{:.4f}s"),
+            cell(c["current"], "median", "{:.4f}s"),
+            cell(c["baseline"], "peak_memory", "{:d}B"),
+            cell(c["current"], "peak_memory", "{:d}B"),
+            status
+        ))
+    regressed = regressions(comparisons)
+    if regressed:
+        lines.append("{} benchmark(s) regressed.".format(len(regressed)))
+    else:
+        lines.append("No regression.")
+    return "\n".join(lines)
+
+
+def add_threshold_arguments(parser):
+    parser.add_argument("--threshold",
+                        type=float,
+                        default=0.1,
+                        help="relative median time increase to fail on")
+    parser.add_argument("--memory-threshold",
+                        type=float,
+                        default=0.1,
+                        help="relative peak memory increase to fail on")
+    parser.add_argument("--min-seconds",
+                        type=float,
+                        default=0.001,
+                        help="shortest median time compared")
+    parser.add_argument("--min-bytes",
+                        type=int,
+                        default=65536,
+                        help="smallest peak memory increase to fail on")
+
+
+def gate(baseline, current, args, out=None):
+    """
+    Print the report of the comparison to out, stdout by default, and
+    return the exit status.
+    """
+    comparisons = compare(baseline,
+                          current,
+                          args.threshold,
+                          args.memory_threshold,
+                          args.min_seconds,
+                          args.min_bytes)
+    print(format_report(comparisons), file=out or sys.stdout)
+    return 1 if regressions(comparisons) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    add_threshold_arguments(parser)
+    args = parser.parse_args()
+    sys.exit(gate(load_results(args.baseline),
+                  load_results(args.current),
+                  args))
+
+
+if __name__ == "__main__":
+    main()
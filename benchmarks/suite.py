@@ -0,0 +1,245 @@
+"""
+Benchmark the Marchand model on synthetic data.
+
+Each benchmark times one stage of the pipeline, parsing, munging and
+rectification, building, a single execution, an all-epicenter sweep and
+an execution with recorders, on synthetic data generated at several
+scales. Every benchmark is repeated and its wall times recorded, then
+run once more under tracemalloc to record its peak memory. The results
+are saved as JSON, by default under benchmarks/results named after the
+current commit, to be compared across commits.
+
+    python -m benchmarks.suite --scales small medium --repeats 5
+
+With --baseline, the results are compared against a baseline results
+file and the suite exits with status 1 if any benchmark regressed, see
+benchmarks.compare:
+
+    python -m benchmarks.suite --repeats 7 --baseline benchmarks/baseline.json
+
+"""
+
+from __future__ import division, absolute_import, print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple, OrderedDict
+from timeit import default_timer
+
+from effayoh.marchandmodel.engine import ArrayEngine
+from effayoh.marchandmodel.executor import ScenarioExecutor
+from effayoh.marchandmodel.scenario import ShockScenario
+from effayoh.recorders.eventlogrecorder import EventLogRecorder
+from effayoh.recorders.nodestaterecorder import NodeStateRecorder
+from effayoh.recorders.tradevolumesrecorder import TradeVolumeRecorder
+
+from benchmarks import compare
+from benchmarks.synthetic import (
+    generate, largest_exporter, mungers, synthetic_builder
+)
+
+
+BENCHMARKS_DIR, _ = os.path.split(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+# The parameters of the synthetic data of each scale, see generate.
+SCALES = OrderedDict([
+    ("small", {"countries": 20, "items": 5, "years": 3, "density": 0.3}),
+    ("medium", {"countries": 60, "items": 10, "years": 5, "density": 0.2}),
+    ("large", {"countries": 150, "items": 20, "years": 9, "density": 0.15}),
+])
+
+
+Benchmark = namedtuple("Benchmark", ["name", "setup", "run"])
+
+
+def run_parse(instances):
+    for munger in instances:
+        munger.get_raw_data()
+
+
+def run_munge(instances):
+    for munger in instances:
+        munger.munge()
+
+
+def setup_execute(data, recorders=()):
+    model = synthetic_builder(data, recorders).build()
+    model.set_epicenter(largest_exporter(model))
+    return model
+
+
+def setup_sweep(data):
+    model = synthetic_builder(data).build()
+    compiled = model.compile()
+    scenarios = [ShockScenario.single(node) for node in compiled.nodes]
+    return model, compiled, scenarios
+
+
+def run_sweep(state):
+    model, compiled, scenarios = state
+    engine = ArrayEngine(compiled, model.static_params, model.max_iterations)
+    for scenario in scenarios:
+        engine.run(scenario)
+
+
+def run_executor_sweep(state):
+    model, compiled, scenarios = state
+    with ScenarioExecutor(compiled,
+                          processes=2,
+                          static_params=model.static_params,
+                          max_iterations=model.max_iterations) as executor:
+        executor.run(scenarios)
+
+
+BENCHMARKS = [
+    Benchmark("parse", mungers, run_parse),
+    Benchmark("munge", mungers, run_munge),
+    Benchmark("build", synthetic_builder, lambda builder: builder.build()),
+    Benchmark("execute", setup_execute, lambda model: model.execute()),
+    Benchmark(
+        "execute_recorders",
+        lambda data: setup_execute(data, (TradeVolumeRecorder,
+                                          NodeStateRecorder,
+                                          EventLogRecorder)),
+        lambda model: model.execute()
+    ),
+    Benchmark("sweep", setup_sweep, run_sweep),
+    Benchmark("sweep_executor", setup_sweep, run_executor_sweep),
+]
+
+
+def measure(benchmark, data, repeats):
+    """
+    Return the wall times and the peak memory of benchmark on data.
+
+    The setup of the benchmark is not measured.
+    """
+    times = []
+    for _ in range(repeats):
+        state = benchmark.setup(data)
+        start = default_timer()
+        benchmark.run(state)
+        times.append(default_timer() - start)
+
+    state = benchmark.setup(data)
+    tracemalloc.start()
+    try:
+        benchmark.run(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"times": times, "peak_memory": peak}
+
+
+def run_suite(scales=("small",), names=None, repeats=3, data_dir=None):
+    """
+    Run the benchmarks named in names, by default all of them, at each
+    scale and return the list of their results.
+
+    The synthetic data is generated under data_dir, by default in a
+    temporary directory removed afterwards.
+    """
+    temporary = data_dir is None
+    if temporary:
+        data_dir = tempfile.mkdtemp(prefix="effayoh-benchmarks-")
+    results = []
+    try:
+        for scale in scales:
+            params = SCALES[scale]
+            data = generate(os.path.join(data_dir, scale), **params)
+            for benchmark in BENCHMARKS:
+                if names and benchmark.name not in names:
+                    continue
+                result = {"name": benchmark.name, "scale": scale}
+                result["params"] = dict(params)
+                result.update(measure(benchmark, data, repeats))
+                results.append(result)
+    finally:
+        if temporary:
+            shutil.rmtree(data_dir)
+    return results
+
+
+def current_commit():
+    """ Return the commit checked out in the repository, if any. """
+    try:
+        output = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                         cwd=BENCHMARKS_DIR,
+                                         stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("ascii").strip()
+
+
+def metadata():
+    return {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(results, path):
+    """ Save results with the run metadata as JSON to path. """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, "w") as fh:
+        json.dump({"metadata": metadata(), "results": results},
+                  fh,
+                  indent=2,
+                  sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales",
+                        nargs="+",
+                        choices=list(SCALES),
+                        default=["small"])
+    parser.add_argument("--benchmarks",
+                        nargs="+",
+                        choices=[benchmark.name for benchmark in BENCHMARKS])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--data-dir")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline",
+                        help="results file to compare the results against")
+    compare.add_threshold_arguments(parser)
+    args = parser.parse_args()
+
+    results = run_suite(args.scales,
+                        args.benchmarks,
+                        args.repeats,
+                        args.data_dir)
+    output = args.output
+    if output is None:
+        name = (current_commit() or "results")[:12] + ".json"
+        output = os.path.join(RESULTS_DIR, name)
+    save_results(results, output)
+    for result in results:
+        print("{name:20} {scale:8} {best:10.4f}s {peak:12d}B".format(
+            best=min(result["times"]),
+            peak=result["peak_memory"],
+            **result
+        ))
+    print(output)
+
+    if args.baseline:
+        baseline = compare.load_results(args.baseline)
+        current = compare.load_results(output)
+        sys.exit(compare.gate(baseline, current, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Generate synthetic FAOSTAT and USDA PSD data at any scale.
+
+The generated Detailed Trade Matrix, Food Balance Sheets and PSD files
+follow the schemas of the real data files and use the names and codes
+of real countries, items, elements, commodities and attributes, so the
+base model mungers build a network from them exactly as from the real
+data. Rows the base mungers filter out, such as import quantities or
+population, are generated too so that parsing does realistic work.
+synthetic_builder returns a base model builder reading generated data,
+for the benchmarks and the tests.
+
+    python -m benchmarks.synthetic --countries 100 --items 10 --years 5 \\
+        --density 0.2 --output /tmp/synthetic
+
+"""
+
+from __future__ import division, absolute_import, print_function
+from builtins import super
+
+import argparse
+import csv
+import os
+import random
+from collections import Counter, namedtuple
+
+import networkx as nx
+
+from effayoh.marchandmodel.base.mungers import dtm as base_dtm
+from effayoh.marchandmodel.base.mungers import fbs as base_fbs
+from effayoh.marchandmodel.base.mungers import psd as base_psd
+from effayoh.marchandmodel.base.mungers.dtm import BaseDTMMunger
+from effayoh.marchandmodel.base.mungers.fbs import BaseFBSMunger
+from effayoh.marchandmodel.base.mungers.psd import BasePSDMunger
+from effayoh.marchandmodel.builder import MarchandModelBuilder
+from effayoh.mungers import FAOCountry
+from effayoh.mungers.dtm import DTMElement
+from effayoh.mungers.psd import PSDCountry
+from effayoh.rectification.rectifier import PoliticalRectifier
+from effayoh.resources.faostat import map as fao_map
+from effayoh.resources.usda import map as psd_map
+from effayoh.util import FAOSTAT_ENCODING
+
+
+SyntheticData = namedtuple(
+    "SyntheticData",
+    ["dtm_path", "fbs_path", "psd_path", "countries", "years"]
+)
+
+FIRST_YEAR = 2005
+
+IMPORT_TONNES = DTMElement(element="Import Quantity", code="5610")
+
+POPULATION_ITEM = ("Population", "2501")
+POPULATION_ELEMENT = ("Total Population - Both sexes", "511")
+
+PSD_ATTRIBUTES = [
+    base_psd.ENDING_STOCKS,
+    ("125", "Domestic Consumption"),
+    ("028", "Production"),
+]
+
+
+def mapped_countries():
+    """
+    Return the countries of both the FAOSTAT and the PSD maps.
+
+    Returns a list of (politent, FAOCountry, PSDCountry) tuples in
+    politent name order, restricted to the politents mapped from a
+    single FAOCountry so that every country is a whole node.
+    """
+    fao_counts = Counter(fao_map.values())
+    psd_countries = {}
+    for psd_country, politent in sorted(psd_map.items()):
+        psd_countries.setdefault(politent, psd_country)
+    countries = [
+        (politent, fao_country, psd_countries[politent])
+        for fao_country, politent in fao_map.items()
+        if fao_counts[politent] == 1 and politent in psd_countries
+    ]
+    return sorted(countries, key=lambda country: country[0].name)
+
+
+def year_fields(years):
+    """ Return the FAOSTAT value and flag columns of years. """
+    fields = []
+    for year in years:
+        fields.extend(["Y{}".format(year), "Y{}F".format(year)])
+    return fields
+
+
+def year_values(rng, scale, years):
+    """ Return the FAOSTAT value and flag cells of a row. """
+    cells = []
+    for year in years:
+        cells.extend(["{:.3f}".format(scale*rng.uniform(0.5, 1.5)), ""])
+    return cells
+
+
+def generate(output_dir,
+             countries=50,
+             items=10,
+             years=5,
+             density=0.2,
+             seed=0):
+    """
+    Write synthetic DTM, FBS and PSD files to output_dir.
+
+    Parameters
+    ----------
+    output_dir:
+        The directory to write the files to, created if necessary.
+    countries:
+        The number of countries, at most len(mapped_countries()).
+    items:
+        The number of items of each data source, capped at the number
+        of items of the base model for that source.
+    years:
+        The number of years, starting from 2005.
+    density:
+        The probability that a country exports an item to another.
+    seed:
+        The seed of the random values.
+
+    Returns a SyntheticData with the paths of the files, the names of
+    the network nodes and the list of years.
+    """
+    available = mapped_countries()
+    if countries > len(available):
+        msg = "Only {} countries are available, {} were requested."
+        raise ValueError(msg.format(len(available), countries))
+    rng = random.Random(seed)
+    selected = rng.sample(available, countries)
+    selected.sort(key=lambda country: country[0].name)
+    years = list(range(FIRST_YEAR, FIRST_YEAR + years))
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    dtm_path = os.path.join(output_dir, "dtm_synthetic.csv")
+    fbs_path = os.path.join(output_dir, "fbs_synthetic.csv")
+    psd_path = os.path.join(output_dir, "psd_synthetic.csv")
+
+    write_dtm(dtm_path, rng, selected, items, years, density)
+    write_fbs(fbs_path, rng, selected, items, years)
+    write_psd(psd_path, rng, selected, items, years)
+
+    nodes = [politent.name for politent, _, _ in selected]
+    return SyntheticData(dtm_path, fbs_path, psd_path, nodes, years)
+
+
+def write_dtm(path, rng, countries, items, years, density):
+    header = [
+        "Reporter Country Code",
+        "Reporter Countries",
+        "Partner Country Code",
+        "Partner Countries",
+        "Item Code",
+        "Item",
+        "Element Code",
+        "Element",
+    ] + year_fields(years)
+    element = base_dtm.EXPORT_TONNES
+    dtm_items = base_dtm.ITEMS[:items]
+
+    with open(path, "w", newline="", encoding=FAOSTAT_ENCODING) as fh:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+        for _, (reporter, reporter_code), _ in countries:
+            for _, (partner, partner_code), _ in countries:
+                if reporter_code == partner_code:
+                    continue
+                for item, item_code in dtm_items:
+                    if rng.random() >= density:
+                        continue
+                    scale = rng.lognormvariate(9.0, 1.5)
+                    for element_name, element_code in (element,
+                                                       IMPORT_TONNES):
+                        writer.writerow([
+                            reporter_code,
+                            reporter,
+                            partner_code,
+                            partner,
+                            item_code,
+                            item,
+                            element_code,
+                            element_name,
+                        ] + year_values(rng, scale, years))
+
+
+def write_fbs(path, rng, countries, items, years):
+    header = [
+        "Area Code",
+        "Area",
+        "Item Code",
+        "Item",
+        "Element Code",
+        "Element",
+    ] + year_fields(years)
+    fbs_items = base_fbs.ITEMS[:items]
+
+    with open(path, "w", newline="", encoding=FAOSTAT_ENCODING) as fh:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+        for _, (area, area_code), _ in countries:
+            size = rng.lognormvariate(9.0, 1.5)
+            writer.writerow([
+                area_code,
+                area,
+                POPULATION_ITEM[1],
+                POPULATION_ITEM[0],
+                POPULATION_ELEMENT[1],
+                POPULATION_ELEMENT[0],
+            ] + year_values(rng, size, years))
+            for item, item_code in fbs_items:
+                for element, element_code in base_fbs.ELEMENTS:
+                    scale = size*rng.uniform(0.01, 0.2)
+                    writer.writerow([
+                        area_code,
+                        area,
+                        item_code,
+                        item,
+                        element_code,
+                        element,
+                    ] + year_values(rng, scale, years))
+
+
+def write_psd(path, rng, countries, items, years):
+    header = [
+        "Commodity_Code",
+        "Commodity_Description",
+        "Country_Code",
+        "Country_Name",
+        "Market_Year",
+        "Attribute_ID",
+        "Attribute_Description",
+        "Value",
+    ]
+    commodities = base_psd.COMMODITIES[:items]
+
+    with open(path, "w") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+        for _, _, (country_code, country) in countries:
+            for commodity_code, commodity in commodities:
+                scale = rng.lognormvariate(5.0, 1.5)
+                for year in years:
+                    for attribute_id, attribute in PSD_ATTRIBUTES:
+                        writer.writerow([
+                            commodity_code,
+                            commodity,
+                            country_code,
+                            country,
+                            year,
+                            attribute_id,
+                            attribute,
+                            "{:.3f}".format(scale*rng.uniform(0.5, 1.5)),
+                        ])
+
+
+def with_data_path(munger_class, path):
+    """ Return a subclass of munger_class reading the file at path. """
+
+    class Munger(munger_class):
+
+        def __init__(self, political_rectifier):
+            super().__init__(political_rectifier)
+            self.set_data_path(path)
+
+    # The identity of the class, see fingerprint.identity, is that of
+    # munger_class but for the module.
+    Munger.__name__ = munger_class.__name__
+    Munger.__qualname__ = munger_class.__qualname__
+    return Munger
+
+
+def synthetic_builder(data, recorders=()):
+    """ Return a base model builder reading the synthetic data. """
+    builder = MarchandModelBuilder()
+    builder.set_years(data.years)
+    builder.add_static_param("fc", 0.01)
+    builder.add_static_param("fr", 0.5)
+    builder.add_static_param("fp", 0.2)
+    builder.add_static_param("alpha", 0.001)
+    builder.register_data_source(with_data_path(BaseDTMMunger, data.dtm_path),
+                                 FAOCountry,
+                                 fao_map)
+    builder.register_data_source(with_data_path(BaseFBSMunger, data.fbs_path),
+                                 FAOCountry,
+                                 fao_map)
+    builder.register_data_source(with_data_path(BasePSDMunger, data.psd_path),
+                                 PSDCountry,
+                                 psd_map)
+    builder.add_network_initializer(MarchandModelBuilder.shocked_initializer)
+    builder.add_network_initializer(MarchandModelBuilder.reserves_initializer)
+    builder.add_network_initializer(
+        MarchandModelBuilder.production_initializer
+    )
+    builder.add_network_initializer(
+        MarchandModelBuilder.consumption_initializer
+    )
+    builder.add_network_initializer(MarchandModelBuilder.supply_initializer)
+    for recorder_class in recorders:
+        builder.add_recorder(recorder_class)
+    return builder
+
+
+def largest_exporter(model):
+    """ Return the node with the largest total exports. """
+    totals = {node: 0.0 for node in model.network}
+    for u, v, data in model.network.edges(data=True):
+        totals[u] += data["exports"]
+    return max(sorted(totals), key=totals.get)
+
+
+def mungers(data):
+    """ Return the base model mungers reading the synthetic data. """
+    builder = synthetic_builder(data)
+    rectifier = PoliticalRectifier(nx.DiGraph(), builder.politent_maps)
+    instances = []
+    for munger_class in builder.munger_classes:
+        munger = munger_class(rectifier)
+        munger.set_years(data.years)
+        instances.append(munger)
+    return instances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--countries", type=int, default=50)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    data = generate(args.output,
+                    args.countries,
+                    args.items,
+                    args.years,
+                    args.density,
+                    args.seed)
+    for path in (data.dtm_path, data.fbs_path, data.psd_path):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import logging
+
+
+# Library code does not output log records unless the application
+# configures logging, see effayoh.logs.
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,214 @@
+"""
+Provide timing and counter instrumentation.
+
+The builder and the model report the time spent in each phase of a
+build and an execution, and counts such as the rows read and kept by
+the mungers or the nodes updated in each iteration, to the active
+Instrumentation. Instrumentation is disabled by default: the active
+instrumentation is then a NullInstrumentation whose timers and counters
+do nothing, and the instrumented code only calls it at phase
+boundaries, never per row or per node, so it costs next to nothing.
+
+    from effayoh import instrumentation
+
+    instr = instrumentation.enable()
+    model = builder.build()
+    model.execute()
+    instr.report()
+    instr.write_metrics("effayoh.prom")
+
+Timers nest: a timer started while another is running is reported under
+the path of the running timer, e.g. "build/munge/BaseDTMMunger".
+
+"""
+
+from __future__ import division, absolute_import, print_function
+
+import io
+from timeit import default_timer
+
+
+class Timer:
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        stack = self.instrumentation.stack
+        stack.append(self.name)
+        self.path = "/".join(stack)
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = default_timer() - self.start
+        self.instrumentation.stack.pop()
+        timers = self.instrumentation.timers
+        calls, total = timers.get(self.path, (0, 0.0))
+        timers[self.path] = (calls + 1, total + elapsed)
+
+
+class Instrumentation:
+    """
+    Collect nested timers and labelled counters.
+
+    Attributes
+    ----------
+    timers:
+        A dict mapping the path of each timer to a (calls, seconds)
+        tuple.
+    counters:
+        A dict mapping (name, labels) pairs to counts, where labels is
+        a sorted tuple of (label, value) pairs.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.stack = []
+
+    def timer(self, name):
+        """ Return a context manager timing the block it wraps. """
+        return Timer(self, name)
+
+    def count(self, name, n=1, **labels):
+        """ Add n to the counter name with labels. """
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.stack = []
+
+    def report(self):
+        """
+        Return the timers and counters as a JSON serializable dict.
+
+        The dict has a timers list of {"path", "calls", "seconds"}
+        dicts, in the order the timers were first stopped, and a
+        counters list of {"name", "labels", "value"} dicts.
+        """
+        timers = [
+            {"path": path, "calls": calls, "seconds": seconds}
+            for path, (calls, seconds) in self.timers.items()
+        ]
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(self.counters.items(),
+                                                key=_counter_sort_key)
+        ]
+        return {"timers": timers, "counters": counters}
+
+    def metrics(self, prefix="effayoh"):
+        """
+        Return the timers and counters in the Prometheus text format.
+        """
+        lines = []
+        timers = sorted(self.timers.items())
+        for metric, field in (("phase_seconds", 1), ("phase_calls", 0)):
+            if not timers:
+                break
+            metric = "{}_{}".format(prefix, metric)
+            lines.append("# TYPE {} counter".format(metric))
+            for path, values in timers:
+                lines.append("{}{} {!r}".format(
+                    metric,
+                    _format_labels((("phase", path),)),
+                    values[field]
+                ))
+        names = set()
+        for (name, labels), value in sorted(self.counters.items(),
+                                            key=_counter_sort_key):
+            metric = "{}_{}".format(prefix, name)
+            if name not in names:
+                names.add(name)
+                lines.append("# TYPE {} counter".format(metric))
+            lines.append("{}{} {}".format(metric,
+                                          _format_labels(labels),
+                                          value))
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path, prefix="effayoh"):
+        """ Write the metrics to path for a textfile collector. """
+        with io.open(path, "w", encoding="utf-8") as fh:
+            fh.write(u"" + self.metrics(prefix))
+
+
+class NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class NullInstrumentation:
+    """ Instrumentation that records nothing. """
+
+    enabled = False
+
+    def timer(self, name):
+        return NULL_TIMER
+
+    def count(self, name, n=1, **labels):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+_active = NULL_INSTRUMENTATION
+
+
+def active():
+    """ Return the active instrumentation. """
+    return _active
+
+
+def enable(instrumentation=None):
+    """
+    Activate instrumentation, a new Instrumentation by default, and
+    return it.
+    """
+    global _active
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    _active = instrumentation
+    return instrumentation
+
+
+def disable():
+    """ Deactivate instrumentation. """
+    global _active
+    _active = NULL_INSTRUMENTATION
+
+
+def name_of(obj):
+    """ Return the name of a class or callable to label a timer with. """
+    name = getattr(obj, "__name__", None)
+    if name is None:
+        # functools.partial and other callable instances.
+        name = name_of(getattr(obj, "func", type(obj)))
+    return name
+
+
+def _counter_sort_key(item):
+    (name, labels), value = item
+    return (name, [(label, str(value)) for label, value in labels])
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(label, str(value).replace("\\", "\\\\")
+                                          .replace('"', '\\"'))
+        for label, value in labels
+    ) + "}"
@@ -0,0 +1,104 @@
+"""
+Provide logging helpers.
+
+Every effayoh module logs to a logger named after it, under the effayoh
+logger. The effayoh logger has a NullHandler, so nothing is output
+unless the application configures logging, for instance with configure:
+
+    from effayoh import logs
+
+    logs.configure(logging.INFO)
+
+Messages use lazy %-style formatting and carry their variable parts as
+structured fields, passed with the fields helper:
+
+    log.debug("Executing iteration %d", i, extra=fields(iteration=i))
+
+Messages that may be logged for every row or node are aggregated into a
+summary by the code logging them. RateLimitFilter additionally bounds
+the number of records output for any one message.
+
+"""
+
+from __future__ import division, absolute_import, print_function
+from builtins import super
+
+import logging
+
+
+LOGGER_NAME = "effayoh"
+
+
+def fields(**kwargs):
+    """ Return the extra argument attaching kwargs to a log record. """
+    return {"fields": kwargs}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most limit records of each message.
+
+    Records are grouped by logger and unformatted message. The number
+    of suppressed records of each message is given by suppressed.
+    """
+
+    def __init__(self, limit=10):
+        super().__init__()
+        self.limit = limit
+        self.counts = {}
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        return count <= self.limit
+
+    def suppressed(self):
+        """ Return a dict mapping each message to its suppressed count. """
+        return {key: count - self.limit
+                for key, count in self.counts.items()
+                if count > self.limit}
+
+
+class StructuredFormatter(logging.Formatter):
+    """ Append the structured fields of a record as key=value pairs. """
+
+    def format(self, record):
+        message = super().format(record)
+        record_fields = getattr(record, "fields", None)
+        if record_fields:
+            message += " " + " ".join(
+                "{}={!r}".format(key, value)
+                for key, value in sorted(record_fields.items())
+            )
+        return message
+
+
+def configure(level=logging.WARNING, handler=None, rate_limit=10):
+    """
+    Output the effayoh log records of at least level.
+
+    Parameters
+    ----------
+    level:
+        The minimum level of the records to output.
+    handler:
+        The handler to output records with, a StreamHandler writing to
+        stderr by default.
+    rate_limit:
+        The maximum number of records output for any one message, or
+        None for no limit.
+
+    Returns the handler.
+    """
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(
+            StructuredFormatter("%(levelname)s %(name)s: %(message)s")
+        )
+    if rate_limit is not None:
+        handler.addFilter(RateLimitFilter(rate_limit))
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    return handler
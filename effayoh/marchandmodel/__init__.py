@@ -3,14 +3,32 @@ Provide the MarchandModel class.
 
 """
 
+import logging
+import math
+from operator import itemgetter
+
 import networkx as nx
 
+from effayoh import instrumentation
+from effayoh.logs import fields
+from effayoh.marchandmodel.changes import IterationChanges
+from effayoh.marchandmodel.compiled import CompiledNetwork
+from effayoh.marchandmodel.hooks import HookRegistry
+from effayoh.marchandmodel.scenario import ShockScenario
 from effayoh.rectification.rectifier import PoliticalRectifier
 
 
 class MarchandModelError(Exception): pass
 
 
+log = logging.getLogger(__name__)
+
+
+# The running trade totals may leave a rounding residue once a node's
+# trade is removed, so trade volumes below this value are zero.
+TRADE_EPSILON = 1e-9
+
+
 class MarchandModel:
 
     """
@@ -39,7 +57,30 @@ class MarchandModel:
         self.political_rectifier = PoliticalRectifier(self.network,
                                                       politent_maps)
         self.max_iterations = 50
+        self.scenario = None
         self.affected_nodes = {}
+        self.changes = None
+        # Running trade totals used to compute the adjustable trade
+        # volume of a node in constant time. They are maintained
+        # incrementally as trade flows and shocked flags change and
+        # are recomputed exactly every trade_totals_refresh_interval
+        # iterations to guard against floating point drift.
+        self.export_totals = {}
+        self.unshocked_import_totals = {}
+        self.trade_totals_refresh_interval = 10
+        # In reproducible mode nodes and edges are evaluated in the
+        # canonical order and sums are exactly rounded, see iterate.
+        self.reproducible = False
+        # The callbacks around execution phases, see
+        # effayoh.marchandmodel.hooks, and the functions replacing the
+        # execution, node update and iteration continuation condition.
+        self.hooks = HookRegistry()
+        self.execution_function = None
+        self.node_update_function = None
+        self.iterate_again_function = None
+        # The graphs of the layers of the build other than the base
+        # layer, see effayoh.marchandmodel.layers.
+        self.layers = {}
 
     def get_political_rectifier(self):
         return self.political_rectifier
@@ -51,63 +92,179 @@ class MarchandModel:
         pass
 
     def set_execution_function(self, func):
-        pass
+        """
+        Set a function replacing the execution of the model.
+
+        func is called with the model as its single argument by execute,
+        None restores the base execution.
+        """
+        if func is not None and not callable(func):
+            msg = "func must be a function."
+            raise MarchandModelError(msg)
+
+        self.execution_function = func
+
+    def add_hook(self, point, pre=None, post=None):
+        """
+        Register callbacks before and after a phase of the execution,
+        see effayoh.marchandmodel.hooks.
+        """
+        self.hooks.add(point, pre, post)
 
     def execute(self):
         """
         Execute the Marchand model.
+
+        The execution is timed by the active instrumentation, which also
+        counts the nodes updated and shocked and the edges adjusted and
+        removed in each iteration, see effayoh.instrumentation.
         """
-        print("Executing the model.")
+        instr = instrumentation.active()
+        with instr.timer("execute"):
+            self.hooks.run_pre("execute", self)
+            if self.execution_function is not None:
+                self.execution_function(self)
+            else:
+                self._execute(instr)
+            self.hooks.run_post("execute", self)
+
+    def _execute(self, instr):
+        log.info("Executing the model.")
         self.inject_params()
         self.apply_recorders()
-        production = self.network.node[self.epicenter]["production"]
-        shock = fp*production
-        self.network.node[self.epicenter]["production"] -= shock
-        self.affected_nodes[self.epicenter] = shock
-
-        for i in range(1, self.max_iterations+1):
-            print("Executing iteration {i}".format(i=i))
-            self.update_params()
-            self.affected_edges = {}
-            self.iterate()
-            self.apply_recorders()
-            if not self.iterate_again():
-                break
+        if self.scenario is None:
+            raise MarchandModelError("No epicenter or scenario is set.")
+        shocks = self.scenario.initial_shocks(self.network.node, fp)
+        for node, shock in shocks:
+            self.network.node[node]["production"] -= shock
+            self.affected_nodes[node] = shock
+        self.compute_trade_totals()
+
+        # Look for iteration callbacks once so that an execution without
+        # them only tests a local per iteration.
+        iteration_hooks = self.hooks.has("iteration")
+        try:
+            for i in range(1, self.max_iterations+1):
+                log.debug("Executing iteration %d",
+                          i,
+                          extra=fields(iteration=i))
+                if i % self.trade_totals_refresh_interval == 0:
+                    self.compute_trade_totals()
+                self.update_params()
+                self.affected_edges = {}
+                self.changes = IterationChanges(i)
+                if iteration_hooks:
+                    self.hooks.run_pre("iteration", self, i)
+                with instr.timer("iteration"):
+                    self.iterate()
+                self.apply_recorders(self.changes)
+                if instr.enabled:
+                    self.count_changes(instr, self.changes)
+                if iteration_hooks:
+                    self.hooks.run_post("iteration", self, i, self.changes)
+                if not self.iterate_again():
+                    break
+        finally:
+            self.finish_recorders()
 
     def iterate(self):
+        """
+        Apply one iteration of the model.
+
+        The affected nodes are updated in the order in which they were
+        first affected, then the trade flows of the affected edges are
+        adjusted in the order in which they were first adjusted.
+
+        In reproducible mode the affected nodes are instead updated in
+        the canonical order, sorted by node name, and the affected edges
+        are adjusted in the canonical (exporter, importer) order, which
+        is the order of a CompiledNetwork. Every sum of shocks and trade
+        flows is exactly rounded with math.fsum so that it does not
+        depend on the order of its terms. The final state is then bit
+        identical to that of an ArrayEngine in reproducible mode.
+        """
         # Apply the node update policy to each of the affected nodes.
         # Changes to trade flows are recorded in the model instance
         # attribute affected_edges.
-        for node, shock in self.affected_nodes.items():
-            self.node_update(node, shock)
+        affected_nodes = self.affected_nodes.items()
+        affected_edges = self.affected_edges.items()
+        if self.reproducible:
+            affected_nodes = sorted(affected_nodes, key=itemgetter(0))
+        update = self.node_updater()
+        with instrumentation.active().timer("node_update"):
+            for node, shock in affected_nodes:
+                update(node, shock)
         self.affected_nodes = {}
+        if self.reproducible:
+            affected_edges = sorted(affected_edges, key=itemgetter(0))
+            total = math.fsum
+        else:
+            total = sum
         # Apply the updates to trade flows. Trade flows updates are
         # managed because a unilateral update within an iteration might
         # subsequently affect further updates in that same iteration.
-        for (u, v), edge_data in self.affected_edges.items():
+        shocks = {}
+        for (u, v), edge_data in affected_edges:
             adjustments = edge_data["adjustments"]
             if u in adjustments:  # v is shocked
-                inc = adjustments[u]
-                if v in self.affected_nodes:
-                    self.affected_nodes[v] += abs(inc)
-                else:
-                    self.affected_nodes[v] = abs(inc)
+                shocks.setdefault(v, []).append(abs(adjustments[u]))
             if v in adjustments:  # u is shocked
-                inc = adjustments[v]
-                if u in self.affected_nodes:
-                    self.affected_nodes[u] += abs(inc)
-                else:
-                    self.affected_nodes[u] = abs(inc)
+                shocks.setdefault(u, []).append(abs(adjustments[v]))
 
-            edge_data["exports"] += sum(adjustments.values())
+            exports = edge_data["exports"]
+            if self.reproducible:
+                edge_data["exports"] = total(
+                    [exports] + list(adjustments.values())
+                )
+            else:
+                edge_data["exports"] += total(adjustments.values())
+            delta = edge_data["exports"] - exports
 
             if abs(edge_data["exports"]) < 0.001:
-                edge_data.pop("exports")
+                delta -= edge_data.pop("exports")
+
+            self.update_trade_totals(u, v, delta)
+            self.changes.edges[(u, v)] = delta
 
             edge_data.pop("adjustments")
 
             if not edge_data:
                 self.network.remove_edge(u, v)
+                self.changes.removed_edges.append((u, v))
+
+        for node, increments in shocks.items():
+            self.affected_nodes[node] = total(increments)
+
+    def node_updater(self):
+        """
+        Return the function updating a node with its shock.
+
+        It is the node update function if one is set, otherwise the base
+        node update, wrapped to call the node_update callbacks only if
+        any are registered.
+        """
+        if self.node_update_function is None:
+            update = self.node_update
+        else:
+            func = self.node_update_function
+
+            def update(node, shock):
+                func(self, node, shock)
+
+        if not self.hooks.has("node_update"):
+            return update
+
+        pre = self.hooks.pre["node_update"]
+        post = self.hooks.post["node_update"]
+
+        def hooked_update(node, shock):
+            for callback in pre:
+                callback(self, node, shock)
+            update(node, shock)
+            for callback in post:
+                callback(self, node, shock)
+
+        return hooked_update
 
     def node_update(self, node, shock):
         """
@@ -120,37 +277,21 @@ class MarchandModel:
         max_dC = fc*self.network.node[node]["consumption"]
         dC = min(max_dC, shock)
         if dC > 0.0:
-            self.network.node[node]["shocked"] = True
+            self.set_shocked(node)
         shock -= dC
 
         if shock <= alpha*self.network.node[node]["supply"]:
             dC += shock
-            self.network.node[node]["reserves"] -= dR
-            self.network.node[node]["consumption"] -= dC
-            self.network.node[node]["supply"] -= (dR + dC)
+            self.apply_node_update(node, dR, dC, 0.0)
             return
 
-        # Compute the adjustable trade volume of this node.
-        Tvol = 0.0
-        # Sum exports.
-        export_links = self.network.out_edges_iter(nbunch=[node],
-                                                   data=True)
-        for u, v, data in export_links:
-            Tvol += data["exports"]
-
-        # Sum imports from countries that have not been shocked.
-        import_links = self.network.in_edges_iter(nbunch=[node],
-                                                  data=True)
-        for u, v, data in import_links:
-            if self.network.node[u]["shocked"]:
-                continue
-            Tvol += data["exports"]
+        Tvol = self.adjustable_trade_volume(node)
 
-        if Tvol == 0.0:  # This node is has no trade.
+        # The running totals may drift from zero by rounding error
+        # after all of a node's trade links have been removed.
+        if Tvol < TRADE_EPSILON:  # This node is has no trade.
             dC += shock
-            self.network.node[node]["reserves"] -= dR
-            self.network.node[node]["consumption"] -= dC
-            self.network.node[node]["supply"] -= (dR + dC)
+            self.apply_node_update(node, dR, dC, 0.0)
             return
 
         Tshock = min(shock, Tvol)
@@ -180,18 +321,129 @@ class MarchandModel:
             else:
                 data["adjustments"] = {v: adjustment}
 
-        self.network.node[node]["reserves"] -= dR
-        self.network.node[node]["consumption"] -= dC
-        self.network.node[node]["supply"] -= (dR + dC)
+        self.apply_node_update(node, dR, dC, Tshock)
+
+    def apply_node_update(self, node, dR, dC, Tshock):
+        """
+        Decrease the reserves of node by dR and its consumption by dC.
+
+        Tshock is the shock the node passed on to its trade partners.
+        """
+        data = self.network.node[node]
+        data["reserves"] -= dR
+        data["consumption"] -= dC
+        data["supply"] -= (dR + dC)
+        if self.changes is not None:
+            self.changes.nodes[node] = (dR, dC, Tshock)
+
+    def adjustable_trade_volume(self, node):
+        """
+        Return the adjustable trade volume of node.
+
+        The adjustable trade volume of a node is the sum of its exports
+        and its imports from countries that have not been shocked. It
+        is read from the running trade totals, or summed exactly over
+        the trade links of node in reproducible mode.
+        """
+        if not self.reproducible:
+            return (self.export_totals[node] +
+                    self.unshocked_import_totals[node])
+
+        volumes = [data["exports"] for u, v, data
+                   in self.network.out_edges_iter(nbunch=[node], data=True)]
+        for u, v, data in self.network.in_edges_iter(nbunch=[node],
+                                                     data=True):
+            if not self.network.node[u]["shocked"]:
+                volumes.append(data["exports"])
+        return math.fsum(volumes)
+
+    def set_reproducible(self, reproducible=True):
+        """
+        Set whether the model is executed in reproducible mode.
+
+        See iterate for the evaluation order of reproducible mode.
+        """
+        self.reproducible = reproducible
+
+    def set_shocked(self, node):
+        """
+        Flag node as shocked and update the trade totals.
+
+        Imports from a shocked country are no longer adjustable, so the
+        exports of node are removed from the unshocked import totals of
+        its trade partners.
+        """
+        data = self.network.node[node]
+        if data["shocked"]:
+            return
+        data["shocked"] = True
+        if self.changes is not None:
+            self.changes.shocked.append(node)
+        totals = self.unshocked_import_totals
+        for u, v, edge_data in self.network.out_edges_iter(nbunch=[node],
+                                                           data=True):
+            totals[v] -= edge_data["exports"]
+
+    def compute_trade_totals(self):
+        """
+        Compute the export and unshocked import totals of every node.
+        """
+        export_totals = dict.fromkeys(self.network, 0.0)
+        import_totals = dict.fromkeys(self.network, 0.0)
+        nodes = self.network.node
+        for u, v, data in self.network.edges_iter(data=True):
+            exports = data["exports"]
+            export_totals[u] += exports
+            if not nodes[u]["shocked"]:
+                import_totals[v] += exports
+        self.export_totals = export_totals
+        self.unshocked_import_totals = import_totals
+
+    def update_trade_totals(self, u, v, delta):
+        """
+        Update the trade totals for a change of delta in exports on the
+        edge (u, v).
+        """
+        self.export_totals[u] += delta
+        if not self.network.node[u]["shocked"]:
+            self.unshocked_import_totals[v] += delta
 
     def set_node_update(self, func):
-        raise NotImplementedError()
+        """
+        Set a function replacing the base node update.
+
+        func is called as func(model, node, shock) for each affected
+        node of an iteration, and may call model.node_update to apply
+        the base update. None restores the base node update.
+        """
+        if func is not None and not callable(func):
+            msg = "func must be a function."
+            raise MarchandModelError(msg)
+
+        self.node_update_function = func
 
     def iterate_again(self):
+        """
+        Return whether to execute another iteration, by default whether
+        any node is affected.
+        """
+        if self.iterate_again_function is not None:
+            return self.iterate_again_function(self)
         return bool(self.affected_nodes)
 
     def set_iterate_again_function(self, func):
-        raise NotImplementedError()
+        """
+        Set the iteration continuation condition.
+
+        func is called with the model after each iteration and the
+        execution stops when it returns False. None restores the base
+        condition.
+        """
+        if func is not None and not callable(func):
+            msg = "func must be a function."
+            raise MarchandModelError(msg)
+
+        self.iterate_again_function = func
 
     def inject_params(self):
         """
@@ -212,10 +464,15 @@ class MarchandModel:
         globals_ = globals()
 
         for param, value in self.static_params.items():
-            if param in globals_:
-                msg = ("Static parameter {param} is already defined "
-                       "you are clobbering a previous value.")
-                print(msg.format(**locals()))
+            # Executing a model again injects its parameters again, so
+            # only a change of value is worth a warning.
+            if param in globals_ and globals_[param] != value:
+                log.warning("Static parameter %s is already defined, "
+                            "clobbering its previous value %r with %r.",
+                            param,
+                            globals_[param],
+                            value,
+                            extra=fields(param=param))
 
             globals_[param] = value
 
@@ -237,9 +494,64 @@ class MarchandModel:
             model = self
             globals_[param] = func(model)
 
-    def apply_recorders(self):
+    def apply_recorders(self, changes=None):
+        """
+        Apply the recorders to the network.
+
+        Recorders that define a record_changes method are passed the
+        IterationChanges of the last iteration, the others, and all the
+        recorders before the first iteration, record the whole network.
+        """
+        instr = instrumentation.active()
+        with instr.timer("record"):
+            for recorder in self.recorders:
+                with instr.timer(instrumentation.name_of(type(recorder))):
+                    if (changes is not None and
+                            hasattr(recorder, "record_changes")):
+                        recorder.record_changes(self.network, changes)
+                    else:
+                        recorder.record(self.network)
+
+    def count_changes(self, instr, changes):
+        """ Count the changes of an iteration on instr. """
+        i = changes.iteration
+        instr.count("nodes_updated", len(changes.nodes), iteration=i)
+        instr.count("nodes_shocked", len(changes.shocked), iteration=i)
+        instr.count("edges_adjusted", len(changes.edges), iteration=i)
+        instr.count("edges_removed", len(changes.removed_edges), iteration=i)
+
+    def finish_recorders(self):
+        """
+        Finish the recorders that define a finish method.
+
+        Recorders streaming their records to disk flush and close their
+        files when execution ends.
+        """
         for recorder in self.recorders:
-            recorder.record(self.network)
+            if hasattr(recorder, "finish"):
+                recorder.finish()
+
+    def compile(self):
+        """
+        Return a CompiledNetwork of the current state of the network.
+
+        Compile a model before executing it to obtain the base network
+        of an ArrayEngine or a ScenarioExecutor.
+        """
+        return CompiledNetwork.from_network(self.network, self.static_params)
 
     def set_epicenter(self, country):
+        """ Shock country alone by the fraction fp of its production. """
         self.epicenter = country
+        self.scenario = ShockScenario.single(country)
+
+    def set_scenario(self, scenario):
+        """
+        Set the ShockScenario seeding the affected nodes.
+
+        All the origins of the scenario are shocked before the first
+        iteration and their shocks are propagated together.
+        """
+        if not isinstance(scenario, ShockScenario):
+            raise MarchandModelError("scenario must be a ShockScenario")
+        self.scenario = scenario
@@ -0,0 +1,234 @@
+"""
+Save built Marchand models to artifacts and load them back.
+
+A model artifact holds the arrays of the CompiledNetwork of a built
+model, its node names, its static parameters and provenance metadata,
+so a model can be loaded, ready to execute, without reading the data
+files, rectifying the data or running the network initializers again:
+
+    builder.set_artifact_path("model.effmdl")
+    builder.build()
+    ...
+    model = load_model("model.effmdl", builder=builder)
+
+An artifact starts with an 8 byte magic string, the length of a JSON
+header as a little endian 4 byte unsigned integer and the header,
+padded with spaces so that the arrays start on an 8 byte boundary. The
+header holds the format version, the byte order of the arrays, the node
+names, the static parameters, the maximum number of iterations, the
+buffer layout of the arrays, see buffer_layout, the attributes of the
+network that are not compiled, see extra_attributes, and the provenance
+metadata: the configuration and fingerprint of the builder and the time
+the artifact was created. The arrays follow as a single buffer.
+
+The state of the base model, the node attributes of NODE_ATTRS, the
+shocked flags and the exports of the edges, is saved in the arrays. The
+other attributes of the nodes and edges, e.g. the population of a node
+read by a dynamic parameter, and the layers of the model, see
+effayoh.marchandmodel.layers, are saved in the header, so they must be
+JSON serializable.
+
+An artifact is written to a partial file moved into place once it is
+complete, so an interrupted save never leaves a torn artifact at path.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import io
+import json
+import os
+import struct
+import sys
+import time
+
+import networkx as nx
+
+from effayoh.marchandmodel import MarchandModel
+from effayoh.marchandmodel.base import policy as base_policy
+from effayoh.marchandmodel.compiled import (
+    NODE_ATTRS, CompiledNetwork, buffer_layout, write_buffer, map_buffer
+)
+
+
+class ArtifactError(Exception): pass
+
+
+MAGIC = b"EFFMDL\x00\x01"
+FORMAT_VERSION = 2
+# Version 1 artifacts have no extra attributes or layers.
+READABLE_VERSIONS = (1, 2)
+
+# The attributes saved in the arrays of an artifact.
+COMPILED_NODE_ATTRS = frozenset(NODE_ATTRS) | {"shocked"}
+COMPILED_EDGE_ATTRS = frozenset(["exports"])
+HEADER_LENGTH = struct.Struct("<I")
+ALIGNMENT = 8
+
+
+def provenance(model):
+    """ Return the provenance metadata of a model built by a builder. """
+    metadata = {"created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    builder = model.builder
+    if builder is not None:
+        metadata["configuration"] = builder.configuration()
+        metadata["fingerprint"] = builder.fingerprint()
+    return metadata
+
+
+def extra_attributes(network, node_attrs=(), edge_attrs=()):
+    """
+    Return the {"nodes", "edges"} dict of the attributes of network but
+    node_attrs and edge_attrs.
+
+    nodes is a list of the [node, attributes] pairs and edges of the
+    [u, v, attributes] triples of the nodes and edges with such
+    attributes, in the order of network.
+    """
+    nodes = []
+    for node, data in network.nodes(data=True):
+        extra = {k: v for k, v in data.items() if k not in node_attrs}
+        if extra:
+            nodes.append([node, extra])
+    edges = []
+    for u, v, data in network.edges(data=True):
+        extra = {k: v for k, v in data.items() if k not in edge_attrs}
+        if extra:
+            edges.append([u, v, extra])
+    return {"nodes": nodes, "edges": edges}
+
+
+def set_attributes(network, attributes):
+    """ Set the attributes of extra_attributes on network. """
+    for node, data in attributes["nodes"]:
+        network.add_node(node, **data)
+    for u, v, data in attributes["edges"]:
+        network.add_edge(u, v, **data)
+
+
+def save_model(model, path, metadata=None):
+    """
+    Save the network of model to an artifact at path.
+
+    The model must be built and not executed. metadata, a JSON
+    serializable dict, is saved in the provenance of the artifact.
+    Returns the header of the artifact.
+    """
+    compiled = model.compile()
+    offsets, size = buffer_layout(compiled.layout(), ALIGNMENT)
+    header = {
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "nodes": compiled.nodes,
+        "static_params": compiled.static_params,
+        "max_iterations": model.max_iterations,
+        "layout": offsets,
+        "size": size,
+        "extra": extra_attributes(model.network,
+                                  COMPILED_NODE_ATTRS,
+                                  COMPILED_EDGE_ATTRS),
+        "layers": {suffix: extra_attributes(layer)
+                   for suffix, layer in model.layers.items()},
+        "provenance": dict(provenance(model), **(metadata or {})),
+    }
+    try:
+        encoded = json.dumps(header, sort_keys=True).encode("utf-8")
+    except TypeError as e:
+        raise ArtifactError("The model cannot be saved: {}".format(e))
+    start = len(MAGIC) + HEADER_LENGTH.size
+    encoded += b" "*(-(start + len(encoded)) % ALIGNMENT)
+
+    buf = bytearray(size)
+    write_buffer(compiled, buf, offsets)
+    partial = path + ".partial"
+    try:
+        with io.open(partial, mode="wb") as fh:
+            fh.write(MAGIC)
+            fh.write(HEADER_LENGTH.pack(len(encoded)))
+            fh.write(encoded)
+            fh.write(buf)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.isfile(partial):
+            os.remove(partial)
+        raise
+    return header
+
+
+def read_header(fh, path):
+    start = len(MAGIC) + HEADER_LENGTH.size
+    prefix = fh.read(start)
+    if len(prefix) < start or prefix[:len(MAGIC)] != MAGIC:
+        raise ArtifactError("{} is not a model artifact.".format(path))
+    length, = HEADER_LENGTH.unpack(prefix[len(MAGIC):])
+    header = json.loads(fh.read(length).decode("utf-8"))
+    if header["version"] not in READABLE_VERSIONS:
+        msg = "{} has format version {}, versions {} are supported."
+        raise ArtifactError(msg.format(path,
+                                       header["version"],
+                                       list(READABLE_VERSIONS)))
+    if header["byteorder"] != sys.byteorder:
+        msg = "{} was saved on a {} endian machine."
+        raise ArtifactError(msg.format(path, header["byteorder"]))
+    return header
+
+
+def load_compiled(path):
+    """
+    Load the artifact at path as a CompiledNetwork.
+
+    Returns a (compiled, header) tuple. The arrays of compiled are read
+    only views of the data read from the file, which can be executed by
+    an ArrayEngine or a ScenarioExecutor.
+    """
+    with io.open(path, mode="rb") as fh:
+        header = read_header(fh, path)
+        data = fh.read()
+    if len(data) != header["size"]:
+        raise ArtifactError("{} is truncated.".format(path))
+    offsets = [tuple(entry) for entry in header["layout"]]
+    arrays = map_buffer(data, offsets)
+    compiled = CompiledNetwork(header["nodes"],
+                               arrays,
+                               header["static_params"])
+    return compiled, header
+
+
+def load_model(path, builder=None):
+    """
+    Load the artifact at path as a MarchandModel ready to execute.
+
+    If builder is given, the model gets the dynamic parameters, policy,
+    recorders, political entity maps and hooks of builder, otherwise
+    those of the base model and no recorders. The static parameters are
+    those saved in the artifact.
+
+    The nodes and edges of the model are in the canonical order, see
+    CompiledNetwork, so the model executes exactly as the model saved
+    in reproducible mode, see MarchandModel.iterate. The attributes that
+    are not compiled and the layers of the model saved are restored.
+    """
+    compiled, header = load_compiled(path)
+    if builder is None:
+        model = MarchandModel(compiled.static_params, {}, base_policy, [],
+                              {}, builder=None)
+    else:
+        recorders = [recorder_class()
+                     for recorder_class in builder.recorder_classes]
+        model = MarchandModel(compiled.static_params,
+                              builder.dynamic_params,
+                              builder.policy,
+                              recorders,
+                              builder.politent_maps,
+                              builder=builder)
+        model.hooks = builder.hooks.copy()
+    model.max_iterations = header["max_iterations"]
+    compiled.to_network(model.network)
+    if "extra" in header:
+        set_attributes(model.network, header["extra"])
+    for suffix, attributes in header.get("layers", {}).items():
+        # A layer has every node of the network, see split_layers.
+        layer = nx.DiGraph()
+        layer.add_nodes_from(model.network)
+        set_attributes(layer, attributes)
+        model.layers[suffix] = layer
+    return model
@@ -0,0 +1,36 @@
+"""
+Provides the commodities of the base Marchand model for commodity
+layers, see MarchandModelBuilder.add_commodity_layer.
+
+Each commodity holds the DTM items, FBS items and PSD commodities of the
+base mungers of a cereal, the DTM items including the products of the
+cereal, e.g. flour of wheat and bread for wheat.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from effayoh.marchandmodel.base.mungers import dtm, fbs, psd
+
+
+WHEAT = frozenset([
+    dtm.WHEAT, dtm.FLOUR_OF_WHEAT, dtm.MACARONI, dtm.BREAD, dtm.BULGUR,
+    dtm.PASTRY, fbs.WHEAT, psd.WHEAT
+])
+
+RICE = frozenset([dtm.RICE, fbs.RICE, psd.RICE_MILLED])
+
+MAIZE = frozenset([
+    dtm.MAIZE, dtm.GERM_OF_MAIZE, dtm.FLOUR_OF_MAIZE, dtm.POPCORN,
+    fbs.MAIZE, psd.CORN
+])
+
+BARLEY = frozenset([
+    dtm.BARLEY, dtm.BARLEY_PEARLED, dtm.MALT, fbs.BARLEY, psd.BARLEY
+])
+
+COMMODITIES = [
+    ("wheat", WHEAT),
+    ("rice", RICE),
+    ("maize", MAIZE),
+    ("barley", BARLEY),
+]
@@ -4,19 +4,42 @@ Provides the FAOSTATPopulationFilter class.
 The FAOSTATPopulationFilter implements a filter for excluding countries
 with populations of less than or equal to half a million people.
 
+The populations are read once from the Population rows of the food
+balance sheets, for all their years, into a PopulationIndex that the
+filters of any years and threshold query. The index of a data file is
+kept for the life of the process and rebuilt when the file changes, and
+population_index optionally persists it to a file, so that constructing
+a filter does not read the food balance sheets.
+
+A persisted index starts with an 8 byte magic string, the length of a
+JSON header as a little endian 4 byte unsigned integer and the header,
+which holds the format version, the byte order of the populations, the
+fingerprint of the food balance sheets, the years and the FAOCountries
+of the rows. The populations follow as an array of doubles. The index
+file is data only, like a model artifact, so loading it runs no code.
+
 """
+from __future__ import division, absolute_import, print_function
 
 import os
 import csv
 import io
+import json
+import logging
+import re
+import struct
+import sys
+from array import array
 
+from effayoh.logs import fields
+from effayoh.marchandmodel.fingerprint import file_fingerprint
 from effayoh.mungers import FAOCountry
 from effayoh.mungers.fbs import FBSItem, FBSElement
 
 from effayoh.rectification.political_entities import FAOPolitEnt
 from effayoh.resources.faostat import map as map_
 
-from effayoh.util import FAOSTAT_DIR
+from effayoh.util import FAOSTAT_DIR, FAOSTAT_ENCODING
 
 
 data_path = os.path.join(
@@ -53,30 +76,170 @@ EXCLUDED_COUNTRIES = [
 
 years = list(range(2006, 2010+1))
 
+log = logging.getLogger(__name__)
 
-class FAOSTATPopulationFilter:
+YEAR_FIELD = re.compile(r"^Y(\d{4})$")
+
+NAN = float("nan")
+
+INDEX_MAGIC = b"EFFPOP\x00\x01"
+INDEX_VERSION = 1
+INDEX_HEADER_LENGTH = struct.Struct("<I")
+
+
+class PopulationIndex:
 
-    def __init__(self, years=years, threshold=500000.0):
+    """
+    The populations of the countries of the food balance sheets in each
+    of their years.
+
+    The index has a row per Population row of the food balance sheets,
+    in file order, holding its FAOCountry, the political entity it maps
+    to, None if it is unmapped, and the populations of the years in a
+    single array of floats, NaN for a year without a population.
+    """
+
+    def __init__(self, years):
+        self.years = list(years)
+        self.positions = {year: i for i, year in enumerate(self.years)}
+        self.countries = []
+        self.effpents = []
+        self.values = array("d")
+        # The (populations, missing) of the queries of each years.
+        self.queries = {}
+
+    def add(self, country, effpent, years_values):
+        """ Add the populations of the (year, value) pairs of country. """
+        row = array("d", [NAN])*len(self.years)
+        for year, value in years_values:
+            row[self.positions[year]] = value
+        self.countries.append(country)
+        self.effpents.append(effpent)
+        self.values.extend(row)
+
+    def populations(self, years):
         """
-        Compute the countries that do not reach the threshold.
+        Return the mean populations of the political entities in years.
+
+        Returns a (populations, missing) tuple: populations is a dict
+        mapping each political entity to the list of the mean
+        populations of its rows with a population in years, in persons,
+        and missing the list of the FAOCountries without.
 
+        Raises a ValueError if any of years is not a year of the index.
         """
+        years = tuple(years)
+        query = self.queries.get(years)
+        if query is not None:
+            return query
 
-        self.country_populations = {}
-        self.excluded_countries = set(EXCLUDED_COUNTRIES)
-        years_fields = [(year, "Y" + str(year)) for year in years]
+        unknown = [year for year in years if year not in self.positions]
+        if unknown:
+            msg = "The years {} are not in the population index."
+            raise ValueError(msg.format(unknown))
+        columns = [self.positions[year] for year in years]
+        width = len(self.years)
+        values = self.values
+        populations = {}
+        missing = []
+        for row, (country, effpent) in enumerate(zip(self.countries,
+                                                     self.effpents)):
+            start = row*width
+            row_values = [values[start + column] for column in columns]
+            row_values = [value for value in row_values if value == value]
+            if not row_values:
+                missing.append(country)
+                continue
+            if effpent is None:
+                continue
+            # Adjust for the fact that the Food Balance Sheet reports
+            # values in units of "1000 persons".
+            population = sum(row_values) / len(row_values) * 1000.0
+            populations.setdefault(effpent, []).append(population)
+
+        query = self.queries[years] = (populations, missing)
+        return query
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["queries"] = {}
+        return state
+
+    def save(self, path, fingerprint):
+        """
+        Save the index of the food balance sheets with fingerprint to
+        path, through a partial file moved into place once complete.
+        """
+        header = {
+            "version": INDEX_VERSION,
+            "byteorder": sys.byteorder,
+            "fingerprint": fingerprint,
+            "years": self.years,
+            "countries": [list(country) for country in self.countries],
+        }
+        encoded = json.dumps(header, sort_keys=True).encode("utf-8")
+        partial = path + ".partial"
+        try:
+            with io.open(partial, mode="wb") as fh:
+                fh.write(INDEX_MAGIC)
+                fh.write(INDEX_HEADER_LENGTH.pack(len(encoded)))
+                fh.write(encoded)
+                fh.write(self.values.tobytes())
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.isfile(partial):
+                os.remove(partial)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """
+        Return the (fingerprint, index) of the index saved at path.
+
+        Raises a ValueError if the file is not a saved index of this
+        format version and byte order, or is truncated.
+        """
+        with io.open(path, mode="rb") as fh:
+            start = len(INDEX_MAGIC) + INDEX_HEADER_LENGTH.size
+            prefix = fh.read(start)
+            if len(prefix) < start or prefix[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                raise ValueError("{} is not a population index.".format(path))
+            length, = INDEX_HEADER_LENGTH.unpack(prefix[len(INDEX_MAGIC):])
+            header = json.loads(fh.read(length).decode("utf-8"))
+            data = fh.read()
+        if (header.get("version") != INDEX_VERSION
+                or header.get("byteorder") != sys.byteorder):
+            raise ValueError("{} cannot be read.".format(path))
+
+        index = cls(header["years"])
+        index.countries = [FAOCountry(*country)
+                           for country in header["countries"]]
+        index.effpents = [map_.get(country, None)
+                          for country in index.countries]
+        if len(data) != (len(index.countries)*len(index.years)
+                         *index.values.itemsize):
+            raise ValueError("{} is truncated.".format(path))
+        index.values.frombytes(data)
+        return header["fingerprint"], index
 
-        with io.open(data_path, mode='rb') as fh:
+    @classmethod
+    def read(cls, path):
+        """ Return the index of the food balance sheets at path. """
+        with io.open(path,
+                     mode='r',
+                     newline='',
+                     encoding=FAOSTAT_ENCODING) as fh:
 
             reader = csv.DictReader(fh)
+            years_fields = []
+            for field in reader.fieldnames:
+                match = YEAR_FIELD.match(field)
+                if match is not None:
+                    years_fields.append((int(match.group(1)), field))
+            index = cls(year for year, _ in years_fields)
 
             for row in reader:
 
-                country = FAOCountry(
-                    country=row["Area"],
-                    code=row["Area Code"]
-                )
-
                 item = FBSItem(
                     item=row["Item"],
                     code=row["Item Code"]
@@ -91,33 +254,91 @@ class FAOSTATPopulationFilter:
                 if not element is POPULATION_ELEMENT:
                     continue
 
-                values = []
+                country = FAOCountry(
+                    country=row["Area"],
+                    code=row["Area Code"]
+                )
+
+                years_values = []
                 for year, field in years_fields:
                     try:
-                        value = float(row[field])
-                        values.append(value)
-                    except ValueError as ve:
+                        years_values.append((year, float(row[field])))
+                    except ValueError:
                         pass
 
-                if not values:
-                    print(("FAOCountry {country} does not have any "
-                           "population in the time period including the"
-                           " years {years}").format(**locals()))
-                    continue
+                index.add(country, map_.get(country, None), years_values)
 
-                population = sum(values) / len(values)
-                # Adjust for the fact that the Food Balance Sheet
-                # reports values in units of "1000 persons"
-                population *= 1000.0
+        return index
 
-                effpent = map_.get(country, None)
-                if effpent is None:
-                    continue
 
-                self.country_populations[effpent] = population
+# The index and fingerprint of each data file read in this process.
+_indexes = {}
+
+
+def population_index(path=None, index_path=None):
+    """
+    Return the PopulationIndex of the food balance sheets at path, by
+    default those of the base model.
+
+    The index is read once per process and again only when the file
+    changes. If index_path is given the index is also saved to and
+    loaded from that file, so that other processes do not read the food
+    balance sheets either. The file is rewritten if it is not a valid
+    index of the current food balance sheets.
+    """
+    path = os.path.abspath(path or data_path)
+    fingerprint = file_fingerprint(path)
+    cached = _indexes.get(path)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    index = None
+    if index_path is not None:
+        try:
+            saved_fingerprint, saved_index = PopulationIndex.load(index_path)
+            if saved_fingerprint == fingerprint:
+                index = saved_index
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+
+    if index is None:
+        index = PopulationIndex.read(path)
+        if index_path is not None:
+            index.save(index_path, fingerprint)
+
+    _indexes[path] = (fingerprint, index)
+    return index
+
+
+class FAOSTATPopulationFilter:
+
+    def __init__(self, years=years, threshold=500000.0, index=None):
+        """
+        Compute the countries that do not reach the threshold.
+
+        The populations are those of index, by default the
+        PopulationIndex of the base model food balance sheets.
+
+        """
+        if index is None:
+            index = population_index()
+
+        self.country_populations = {}
+        self.excluded_countries = set(EXCLUDED_COUNTRIES)
+
+        populations, missing = index.populations(years)
+        for effpent, effpent_populations in populations.items():
+            # The last row of a political entity mapped from several
+            # countries sets its population, any of them excludes it.
+            self.country_populations[effpent] = effpent_populations[-1]
+            if min(effpent_populations) <= threshold:
+                self.excluded_countries.add(effpent)
 
-                if population <= threshold:
-                    self.excluded_countries.add(effpent)
+        if missing:
+            log.info("%d FAOCountries have no population in the years %s.",
+                     len(missing),
+                     years,
+                     extra=fields(countries=missing))
 
         if FAOPolitEnt.LUXEMBOURG in self.excluded_countries:
             self.excluded_countries.remove(FAOPolitEnt.LUXEMBOURG)
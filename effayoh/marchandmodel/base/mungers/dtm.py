@@ -9,6 +9,7 @@ data used in development.
 from __future__ import division, absolute_import, print_function
 from builtins import super
 
+from effayoh.mungers.conversions import WeightedSum
 from effayoh.mungers.dtm import (
     DTMItem, DTMItemGroup, DTMElement, DTMMunger
 )
@@ -122,6 +123,11 @@ def calorie_cereals_exports_converter(item_tons):
     }
     return sum(item_calories.values())
 
+
+# The declarative equivalent of calorie_cereals_exports_converter, see
+# effayoh.mungers.conversions.
+calorie_cereals_exports_conversion = WeightedSum(calories_per_ton)
+
 ITEMS = (
     WHEAT, FLOUR_OF_WHEAT, MACARONI, BREAD, BULGUR,
     PASTRY, RICE, BREAKFAST_CEREALS, BARLEY, BARLEY_PEARLED,
@@ -138,7 +144,7 @@ calorie_cereals_exports = (
     EXPORT_TONNES,  # element
     "exports",  # attribute name
     ITEMS,
-    calorie_cereals_exports_converter  # conversion function
+    calorie_cereals_exports_conversion  # conversion
 )
 
 
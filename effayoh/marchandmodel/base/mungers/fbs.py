@@ -7,6 +7,7 @@ model.
 from __future__ import division, absolute_import, print_function
 from builtins import super
 
+from effayoh.mungers.conversions import Factor
 from effayoh.mungers.fbs import (
     FBSItem, FBSItemGroup, FBSElement, FBSElementGroup,
     FBSItemsElementsGroup, FBSMunger
@@ -247,5 +248,5 @@ class BaseFBSMunger(FBSMunger):
             self.set_item_element_conversion(
                 item,
                 element,
-                lambda x, factor=factor: x*factor
+                Factor(factor)
             )
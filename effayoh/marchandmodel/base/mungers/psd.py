@@ -6,6 +6,7 @@ model.
 from __future__ import division, absolute_import, print_function
 from builtins import super
 
+from effayoh.mungers.conversions import Factor
 from effayoh.mungers.psd import (
     PSDCommodity, PSDCommodityGroup, PSDCountry, PSDAttribute, PSDMunger
 )
@@ -67,7 +68,7 @@ class BasePSDMunger(PSDMunger):
             self.set_attribute_commodity_conversion(
                 attribute,
                 commodity,
-                lambda x, factor=factor: x*factor
+                Factor(factor)
             )
 
         # Add attribute commodities group.
@@ -4,12 +4,24 @@ Provide the MarchandModelBuilder.
 """
 from __future__ import division, absolute_import, print_function
 
+import logging
+import multiprocessing
+
 import funcsigs
 
 
 
+from effayoh import instrumentation
 from effayoh.marchandmodel import MarchandModel, MarchandModelError
+from effayoh.marchandmodel import initializers
+from effayoh.marchandmodel.artifact import save_model, load_model
+from effayoh.marchandmodel.cache import BuildCache
+from effayoh.marchandmodel.layers import SEPARATORS, split_layers
 from effayoh.marchandmodel.base import policy as base_policy
+from effayoh.marchandmodel.hooks import HookRegistry
+from effayoh.marchandmodel.fingerprint import (
+    identity, file_fingerprint, digest
+)
 
 from effayoh.marchandmodel.base.filters.population_filter import (FAOSTATPopulationFilter)
 
@@ -25,6 +37,36 @@ from effayoh.resources.usda import map as psd_map
 
 
 
+log = logging.getLogger(__name__)
+
+
+def parse_data_source(args):
+    """
+    Read the data of a data source in a parsing process.
+
+    args is a (munger_class, years) tuple. Returns the data, rows_read
+    and rows_kept of the munger.
+    """
+    munger_class, years = args
+    munger = munger_class(None)
+    munger.set_years(years)
+    data = munger.get_raw_data()
+    return data, munger.rows_read, munger.rows_kept
+
+
+def data_path(munger_class):
+    """
+    Return the path of the data file of munger_class, None if it has
+    none.
+    """
+    # Mungers only record their configuration on construction so
+    # instantiating one without a rectifier is cheap.
+    munger = munger_class(None)
+    if hasattr(munger, "get_data_path"):
+        return munger.get_data_path()
+    return None
+
+
 class MarchandModelBuilder:
 
     """
@@ -45,6 +87,14 @@ class MarchandModelBuilder:
         self.static_params = {}
         self.dynamic_params = {}
         self.policy = base_policy
+        self.release_munger_data = False
+        self.parse_processes = 1
+        self.fuse_initializers = True
+        self.artifact_path = None
+        self.year_aggregation = None
+        self.commodity_layers = []
+        self.build_cache = None
+        self.hooks = HookRegistry()
 
     def set_years(self, years):
         """
@@ -92,6 +142,48 @@ class MarchandModelBuilder:
 
         self.network_initializers.append(initializer)
 
+    def set_fuse_initializers(self, fuse=True):
+        """
+        Set whether consecutive fusable initializers are applied in a
+        single pass, see effayoh.marchandmodel.initializers.
+        """
+        self.fuse_initializers = fuse
+
+    def set_year_aggregation(self, aggregation):
+        """
+        Set the year aggregation of the mungers, see
+        effayoh.mungers.aggregation. The attributes of the layers other
+        than the base layer are split off the network of the model into
+        model.layers, see effayoh.marchandmodel.layers.
+        """
+        self.year_aggregation = aggregation
+
+    def add_commodity_layer(self, name, items):
+        """
+        Add a layer of the commodity name to the models built.
+
+        The mungers convert their groups restricted to the items of the
+        commodity, DTM and FBS items or PSD commodities, into the
+        attributes of the layer in the same pass over the data as the
+        aggregate attributes, see effayoh.mungers.aggregation. The
+        attributes of the layer are split off the network of the model
+        into model.layers, see effayoh.marchandmodel.layers.
+        """
+        if not name or any(sep in name for sep in SEPARATORS):
+            msg = "A commodity name must be non-empty and contain none of {}."
+            raise MarchandModelError(msg.format(", ".join(SEPARATORS)))
+        if name in dict(self.commodity_layers):
+            msg = "A commodity layer {!r} was already added.".format(name)
+            raise MarchandModelError(msg)
+        self.commodity_layers.append((name, frozenset(items)))
+
+    def set_artifact_path(self, path):
+        """
+        Set the path to save each model built to as an artifact, see
+        effayoh.marchandmodel.artifact, None to not save models.
+        """
+        self.artifact_path = path
+
     def add_static_param(self, name, val):
         """ Add a static parameter to the builder. """
         self.static_params[name] = val
@@ -118,6 +210,53 @@ class MarchandModelBuilder:
     def add_recorder(self, recorder_class):
         self.recorder_classes.append(recorder_class)
 
+    def set_release_munger_data(self, release=True):
+        """
+        Set whether munger data is released once it is in the network.
+
+        The data a munger parses is otherwise held until the munger is
+        discarded, which may be after the next munger has parsed its own
+        data, or for as long as the caller of build holds the mungers.
+        """
+        self.release_munger_data = release
+
+    def set_parse_processes(self, processes=None):
+        """
+        Set the number of processes reading the data sources.
+
+        With more than one process the data files are read concurrently,
+        each in a process of a multiprocessing pool, and the data is
+        then munged into the network in the build process, in the order
+        in which the data sources are registered, so the network is the
+        same as when the files are read in turn. None uses one process
+        per data source, 1, the default, reads the files in the build
+        process.
+
+        Munger classes must be picklable, i.e. defined at the top level
+        of a module, to be read in another process.
+        """
+        self.parse_processes = processes
+
+    def set_build_cache(self, cache=True):
+        """
+        Set the cache of the outputs of the build stages, see
+        effayoh.marchandmodel.cache.
+
+        True uses a new in memory BuildCache, None or False builds every
+        stage on every build.
+        """
+        if cache is True:
+            cache = BuildCache()
+        self.build_cache = cache or None
+
+    def add_hook(self, point, pre=None, post=None):
+        """
+        Register callbacks before and after a phase of the build or of
+        the execution of the models built, see
+        effayoh.marchandmodel.hooks.
+        """
+        self.hooks.add(point, pre, post)
+
     def setup_base_model(self):
         """
         Setup the base Marchand model.
@@ -160,10 +299,38 @@ class MarchandModelBuilder:
         )
         self.add_network_initializer(MarchandModelBuilder.supply_initializer)
 
-    def build(self):
+    def build(self, mungers=None):
         """
         Configure, build and return a Marchand model.
+
+        The build phases are timed by the active instrumentation, see
+        effayoh.instrumentation, and the build, munge and initializer
+        callbacks of the builder hooks are called around them.
+
+        Parameters
+        ----------
+        mungers:
+            An optional list to which the munger instances are appended,
+            e.g. to measure their data, see memory_report.
         """
+        instr = instrumentation.active()
+        with instr.timer("build"):
+            self.hooks.run_pre("build", self)
+            model = self._build(instr, mungers)
+            self.hooks.run_post("build", self, model)
+            if self.artifact_path is not None:
+                with instr.timer("artifact"):
+                    save_model(model, self.artifact_path)
+        return model
+
+    def load(self, path):
+        """
+        Return the model of the artifact at path configured by this
+        builder, without reading the data files, see load_model.
+        """
+        return load_model(path, builder=self)
+
+    def _build(self, instr, mungers):
         recorders = [recorder_class() for recorder_class in self.recorder_classes]
 
         model = MarchandModel(self.static_params,
@@ -172,6 +339,21 @@ class MarchandModelBuilder:
                               recorders,
                               self.politent_maps,
                               builder=self)
+        model.hooks = self.hooks.copy()
+
+        cache = self.build_cache
+        network_key = None
+        if cache is not None:
+            network_key = self.network_key()
+            cached = cache.get("network", network_key)
+            if cached is not None:
+                instr.count("cache_hits", stage="network")
+                network, layers = cached
+                model.network.add_nodes_from(network.nodes(data=True))
+                model.network.add_edges_from(network.edges(data=True))
+                model.layers = {suffix: layer.copy()
+                                for suffix, layer in layers.items()}
+                return model
 
         political_rectifier = model.get_political_rectifier()
         # Add filters to the political rectifier.
@@ -186,55 +368,239 @@ class MarchandModelBuilder:
             political_rectifier.register_model_compound_politent(politent)
 
         # Instantiate the data mungers.
-        for MungerClass in self.munger_classes:
-            munger = MungerClass(political_rectifier)
-            munger.set_years(self.years)
-            munger.munge()
+        with instr.timer("munge"):
+            parsed = None
+            if cache is not None:
+                parsed = self.parse_cached(cache, instr)
+            elif self.parse_processes != 1 and len(self.munger_classes) > 1:
+                with instr.timer("parse"):
+                    parsed = self.parse_data_sources()
+            for index, MungerClass in enumerate(self.munger_classes):
+                munger = MungerClass(political_rectifier)
+                munger.set_years(self.years)
+                if self.year_aggregation is not None:
+                    munger.set_aggregation(self.year_aggregation)
+                if self.commodity_layers:
+                    munger.set_commodity_layers(self.commodity_layers)
+                data = None
+                if parsed is not None:
+                    data, munger.rows_read, munger.rows_kept = parsed[index]
+                    parsed[index] = None
+                name = instrumentation.name_of(MungerClass)
+                self.hooks.run_pre("munge", munger)
+                with instr.timer(name):
+                    munger.munge(data)
+                self.hooks.run_post("munge", munger)
+                if self.release_munger_data:
+                    munger.data = None
+                if mungers is not None:
+                    mungers.append(munger)
+                instr.count("rows_read",
+                            getattr(munger, "rows_read", 0),
+                            source=name)
+                instr.count("rows_kept",
+                            getattr(munger, "rows_kept", 0),
+                            source=name)
+
+        instr.count("edges_set", political_rectifier.edges_set)
+        instr.count("edges_filtered", political_rectifier.edges_filtered)
+        instr.count("node_attrs_set", political_rectifier.node_attrs_set)
+        instr.count("node_attrs_filtered",
+                    political_rectifier.node_attrs_filtered)
+
+        if self.year_aggregation is not None or self.commodity_layers:
+            model.layers = split_layers(model.network)
 
         # Apply the network intializers.
-        for initializer in self.network_initializers:
-            initializer(model.network)
+        with instr.timer("initializers"):
+            self.apply_initializers(model.network, instr)
+
+        if network_key is not None:
+            layers = {suffix: layer.copy()
+                      for suffix, layer in model.layers.items()}
+            cache.put("network", network_key, (model.network.copy(), layers))
 
         return model
 
-    @staticmethod
-    def supply_initializer(network):
-        for node, data in network.node.items():
-            if not "production" in data:
-                continue
-            data["supply"] = data["production"]
+    def apply_initializers(self, network, instr=None):
+        """ Apply the network initializers to network in order. """
+        instr = instr or instrumentation.active()
+        network_initializers = self.network_initializers
+        if self.fuse_initializers:
+            network_initializers = initializers.fuse(network_initializers)
+        for initializer in network_initializers:
+            self.hooks.run_pre("initializer", initializer, network)
+            with instr.timer(instrumentation.name_of(initializer)):
+                initializer(network)
+            self.hooks.run_post("initializer", initializer, network)
+
+    def parse_data_sources(self, munger_classes=None):
+        """
+        Read the data of each data source in a process pool.
 
-        for u, v, data in network.edges(data=True):
-            if "supply" in network.node[u]:
-                network.node[u]["supply"] -= data["exports"]
-            else:
-                network.node[u]["supply"] = -data["exports"]
-            if "supply" in network.node[v]:
-                network.node[v]["supply"] += data["exports"]
+        Returns a list of the (data, rows_read, rows_kept) tuples of the
+        munger classes, in order, by default those of the registered
+        data sources.
+        """
+        if munger_classes is None:
+            munger_classes = self.munger_classes
+        processes = len(munger_classes)
+        if self.parse_processes is not None:
+            processes = min(self.parse_processes, processes)
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(parse_data_source,
+                            [(munger_class, self.years)
+                             for munger_class in munger_classes],
+                            chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    def parse_cached(self, cache, instr):
+        """
+        Return the (data, rows_read, rows_kept) tuples of the munger
+        classes, in order, reading only the data sources whose data is
+        not in cache.
+        """
+        keys = self.parse_keys()
+        parsed = [cache.get("parse", key) for key in keys]
+        missing = [i for i, output in enumerate(parsed) if output is None]
+        instr.count("cache_hits", len(keys) - len(missing), stage="parse")
+        if not missing:
+            return parsed
+        with instr.timer("parse"):
+            if self.parse_processes != 1 and len(missing) > 1:
+                outputs = self.parse_data_sources(
+                    [self.munger_classes[i] for i in missing]
+                )
             else:
-                network.node[v]["supply"] = data["exports"]
-
-    @staticmethod
-    def shocked_initializer(network):
-        for node, data in network.node.items():
-            data["shocked"] = False
-
-    @staticmethod
-    def consumption_initializer(network):
-        for node, data in network.node.items():
-            if not "consumption" in data:
-                msg = "{node} has no consumption data"
-                print(msg.format(node=node))
-                data["consumption"] = 0.0
-
-    @staticmethod
-    def reserves_initializer(network):
-        for node, data in network.node.items():
-            if not "reserves" in data:
-                data["reserves"] = 0.0
-
-    @staticmethod
-    def production_initializer(network):
-        for node, data in network.node.items():
-            if not "production" in data:
-                data["production"] = 0.0
+                outputs = [parse_data_source((self.munger_classes[i],
+                                              self.years))
+                           for i in missing]
+        for i, output in zip(missing, outputs):
+            cache.put("parse", keys[i], output)
+            parsed[i] = output
+        return parsed
+
+    def parse_keys(self):
+        """
+        Return the cache keys of the data read by each munger class, in
+        order, see effayoh.marchandmodel.cache.
+        """
+        keys = []
+        for MungerClass in self.munger_classes:
+            path = data_path(MungerClass)
+            keys.append(digest({
+                "munger": identity(MungerClass),
+                "data_file": None if path is None else file_fingerprint(path),
+                "years": list(self.years),
+            }))
+        return keys
+
+    def network_key(self):
+        """
+        Return the cache key of the network built by this builder, see
+        effayoh.marchandmodel.cache.
+        """
+        configuration = self.configuration()
+        # Only the execution of a model depends on these.
+        for name in ("static_params", "dynamic_params", "policy",
+                     "recorders"):
+            del configuration[name]
+        # The data read, as the identities of munger classes in
+        # configuration may coincide, e.g. for classes defined in a
+        # function.
+        configuration["parse"] = self.parse_keys()
+        configuration["hooks"] = {
+            point: [[identity(func) for func in self.hooks.pre[point]],
+                    [identity(func) for func in self.hooks.post[point]]]
+            for point in ("munge", "initializer")
+        }
+        return digest(configuration)
+
+    def data_paths(self):
+        """
+        Return the [identity, path] pairs of the munger classes with a
+        data file, in the order they are registered.
+
+        The pairs are a list rather than a dict keyed on identity as
+        the identities of munger classes may coincide, e.g. for classes
+        defined in a function.
+        """
+        paths = []
+        for MungerClass in self.munger_classes:
+            path = data_path(MungerClass)
+            if path is not None:
+                paths.append([identity(MungerClass), path])
+        return paths
+
+    def configuration(self, file_contents=False):
+        """
+        Return a JSON serializable description of this builder.
+
+        The description identifies everything a built model depends on:
+        the years, the static parameters, the dynamic parameters,
+        policy, filters, recorders and initializers by identity, the
+        registered model political entities and a fingerprint of each
+        data file. Two builders with equal configurations build models
+        that behave the same.
+
+        Parameters
+        ----------
+        file_contents:
+            Fingerprint data files by their contents rather than by
+            their size and modification time.
+        """
+        return {
+            "years": list(self.years),
+            "static_params": sorted(
+                (name, repr(value))
+                for name, value in self.static_params.items()
+            ),
+            "dynamic_params": sorted(
+                (name, identity(func))
+                for name, func in self.dynamic_params.items()
+            ),
+            "policy": identity(self.policy),
+            "mungers": [identity(cls) for cls in self.munger_classes],
+            "data_files": [
+                [name, file_fingerprint(path, file_contents)]
+                for name, path in self.data_paths()
+            ],
+            "politent_maps": sorted(
+                identity(cls) for cls in self.politent_maps
+            ),
+            "filters": [identity(cls) for cls in self.filter_classes],
+            "recorders": [identity(cls) for cls in self.recorder_classes],
+            "component_groups": [
+                (group.name, sorted(repr(c) for c in group))
+                for group in self.model_component_groups
+            ],
+            "compound_politents": [
+                (repr(compound.effpent),
+                 sorted(compound.distribution.items()))
+                for compound in self.model_compound_politents
+            ],
+            "initializers": [
+                identity(initializer)
+                for initializer in self.network_initializers
+            ],
+            "year_aggregation": repr(self.year_aggregation),
+            "commodity_layers": [
+                (name, sorted(repr(item) for item in items))
+                for name, items in self.commodity_layers
+            ],
+        }
+
+    def fingerprint(self, file_contents=False):
+        """ Return a hex digest of the configuration of this builder. """
+        return digest(self.configuration(file_contents))
+
+    # The base network initializers, see
+    # effayoh.marchandmodel.initializers.
+    supply_initializer = initializers.supply_initializer
+    shocked_initializer = initializers.shocked_initializer
+    consumption_initializer = initializers.consumption_initializer
+    reserves_initializer = initializers.reserves_initializer
+    production_initializer = initializers.production_initializer
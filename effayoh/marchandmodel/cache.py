@@ -0,0 +1,116 @@
+"""
+Cache the outputs of the stages of Marchand model builds.
+
+A builder with a build cache rebuilds only the stages of a build whose
+inputs changed since a previous build:
+
+    builder.set_build_cache()
+    model = builder.build()
+    builder.add_static_param("fr", 0.6)
+    model = builder.build()  # Reuses the network of the first build.
+
+The stages of a build and the inputs that key their outputs are:
+
+parse:
+    The data read by each munger class, keyed on the identity of the
+    class, the fingerprint of its data file and the years. Replacing the
+    PSD data file only reads the PSD data again.
+network:
+    The network and layers of the model after munging, rectification
+    and the network initializers, keyed on the configuration of the
+    builder, see MarchandModelBuilder.configuration, but the static and
+    dynamic parameters, policy and recorders, which only take effect
+    when a model executes, and on the keys of the data read and the
+    munge and initializer hooks. Changing a parameter only creates a new
+    model of a copy of the cached network.
+
+The munge and initializer hooks are not called for the stages whose
+outputs are reused, and mungers are only passed to the build when the
+network is built again.
+
+A cache holds the outputs of the last few keys of each stage in memory
+and, if it has a directory, pickled in the directory, so that a new
+process reuses the outputs of a previous one.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import io
+import os
+import pickle
+from collections import OrderedDict
+
+
+class BuildCacheError(Exception): pass
+
+
+class BuildCache:
+
+    """
+    Hold the outputs of build stages keyed on the digests of their
+    inputs.
+
+    Parameters
+    ----------
+    directory:
+        An optional directory to pickle the outputs to.
+    max_entries:
+        The number of outputs of each stage kept in memory.
+    """
+
+    def __init__(self, directory=None, max_entries=4):
+        if max_entries < 1:
+            raise BuildCacheError("max_entries must be positive.")
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, stage, key):
+        return os.path.join(self.directory,
+                            "{}-{}.pickle".format(stage, key))
+
+    def get(self, stage, key):
+        """ Return the output of stage for key, None if not cached. """
+        entries = self.entries.setdefault(stage, OrderedDict())
+        if key in entries:
+            value = entries.pop(key)
+            entries[key] = value
+            self.hits += 1
+            return value
+        if self.directory is not None:
+            try:
+                with io.open(self.path(stage, key), mode="rb") as fh:
+                    value = pickle.load(fh)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError):
+                value = None
+            if value is not None:
+                self._remember(entries, key, value)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, stage, key, value):
+        """ Cache value as the output of stage for key. """
+        entries = self.entries.setdefault(stage, OrderedDict())
+        self._remember(entries, key, value)
+        if self.directory is not None:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            path = self.path(stage, key)
+            partial = path + ".partial"
+            with io.open(partial, mode="wb") as fh:
+                pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            getattr(os, "replace", os.rename)(partial, path)
+
+    def _remember(self, entries, key, value):
+        entries.pop(key, None)
+        entries[key] = value
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def clear(self):
+        """ Forget the outputs held in memory. """
+        self.entries = {}
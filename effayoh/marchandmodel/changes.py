@@ -0,0 +1,42 @@
+"""
+Provide the IterationChanges class.
+
+An IterationChanges instance collects the changes a MarchandModel
+iteration makes to the network. It is passed to recorders so that they
+can update their records in proportion to the changes rather than
+walking the whole network after every iteration.
+
+"""
+
+
+class IterationChanges:
+    """
+    The changes made to the network by one iteration.
+
+    Attributes
+    ----------
+    iteration:
+        The number of the iteration, starting from 1.
+    nodes:
+        A dict mapping each updated node to a (dR, dC, Tshock) tuple:
+        the decrease of its reserves, the decrease of its consumption
+        and the shock it passed on to its trade partners. The supply of
+        the node decreased by dR + dC.
+    edges:
+        A dict mapping each adjusted (exporter, importer) edge to the
+        change of its exports. An edge removed from the network has a
+        change of minus its previous exports.
+    removed_edges:
+        The list of the edges removed from the network.
+    shocked:
+        The list of the nodes first flagged as shocked by the iteration.
+    """
+
+    __slots__ = ["iteration", "nodes", "edges", "removed_edges", "shocked"]
+
+    def __init__(self, iteration):
+        self.iteration = iteration
+        self.nodes = {}
+        self.edges = {}
+        self.removed_edges = []
+        self.shocked = []
@@ -0,0 +1,227 @@
+"""
+Provide the CompiledNetwork class.
+
+A CompiledNetwork is a compact, array based copy of a built Marchand
+model network. Node state is held in one typed array per attribute and
+trade links are held in compressed sparse row (CSR) form, once indexed
+by exporter and once by importer. The arrays are plain buffers so they
+can be placed in shared memory or written to disk without conversion.
+
+Nodes are indexed in sorted name order and the trade links of each node
+are sorted by the index of the partner, which gives every engine
+working on a CompiledNetwork the same canonical order.
+
+"""
+
+from array import array
+
+
+class CompiledNetworkError(Exception): pass
+
+
+# The node attributes of the base model, in layout order.
+NODE_ATTRS = ("production", "reserves", "consumption", "supply")
+
+# The typecodes of the compiled arrays, in layout order.
+ARRAY_TYPECODES = (
+    ("production", "d"),
+    ("reserves", "d"),
+    ("consumption", "d"),
+    ("supply", "d"),
+    ("shocked", "b"),
+    # Out-CSR: edges e in [out_ptr[i], out_ptr[i+1]) are the exports of
+    # node i to edge_dst[e]. edge_src[e] is i.
+    ("out_ptr", "i"),
+    ("edge_src", "i"),
+    ("edge_dst", "i"),
+    ("exports", "d"),
+    # In-CSR: in_edges[k] for k in [in_ptr[i], in_ptr[i+1]) are the
+    # indices of the edges importing into node i.
+    ("in_ptr", "i"),
+    ("in_edges", "i"),
+)
+
+
+class CompiledNodes:
+    """
+    A read only mapping of node names to node data dicts.
+
+    Lets code written against the node attribute of a NetworkX graph,
+    e.g. ShockScenario.initial_shocks, read a CompiledNetwork.
+    """
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+
+    def __contains__(self, name):
+        return name in self.compiled.index
+
+    def __iter__(self):
+        return iter(self.compiled.nodes)
+
+    def __len__(self):
+        return len(self.compiled.nodes)
+
+    def __getitem__(self, name):
+        i = self.compiled.index[name]
+        data = {attr: self.compiled.arrays[attr][i] for attr in NODE_ATTRS}
+        data["shocked"] = bool(self.compiled.arrays["shocked"][i])
+        return data
+
+
+class CompiledNetwork:
+    """
+    An array representation of a Marchand model network.
+
+    """
+
+    def __init__(self, nodes, arrays, static_params=None):
+        """
+        Parameters
+        ----------
+        nodes:
+            The node names in index order.
+        arrays:
+            A dict mapping each name in ARRAY_TYPECODES to a typed
+            buffer, an array.array or a memoryview of the matching
+            typecode.
+        static_params:
+            The static parameters of the model.
+        """
+        missing = [name for name, _ in ARRAY_TYPECODES if name not in arrays]
+        if missing:
+            msg = "Missing compiled arrays: {}".format(", ".join(missing))
+            raise CompiledNetworkError(msg)
+        self.nodes = list(nodes)
+        self.index = {name: i for i, name in enumerate(self.nodes)}
+        self.arrays = arrays
+        self.static_params = dict(static_params or {})
+
+    @classmethod
+    def from_network(cls, network, static_params=None):
+        """
+        Compile the NetworkX graph network.
+
+        Every node must have been initialized, see the network
+        initializers of the MarchandModelBuilder, and every edge must
+        have an exports attribute.
+        """
+        nodes = sorted(network)
+        index = {name: i for i, name in enumerate(nodes)}
+        arrays = {name: array(typecode) for name, typecode in ARRAY_TYPECODES}
+
+        for name in nodes:
+            data = network.node[name]
+            for attr in NODE_ATTRS:
+                arrays[attr].append(data.get(attr, 0.0))
+            arrays["shocked"].append(1 if data.get("shocked") else 0)
+
+        out_ptr = arrays["out_ptr"]
+        edge_src, edge_dst = arrays["edge_src"], arrays["edge_dst"]
+        exports = arrays["exports"]
+        importers = [[] for _ in nodes]
+        out_ptr.append(0)
+        for i, u in enumerate(nodes):
+            for v in sorted(network.successors(u), key=index.__getitem__):
+                j = index[v]
+                importers[j].append((i, len(exports)))
+                edge_src.append(i)
+                edge_dst.append(j)
+                exports.append(network[u][v]["exports"])
+            out_ptr.append(len(exports))
+
+        in_ptr, in_edges = arrays["in_ptr"], arrays["in_edges"]
+        in_ptr.append(0)
+        for edges in importers:
+            # The edges of importers[j] were appended in exporter order.
+            for i, e in edges:
+                in_edges.append(e)
+            in_ptr.append(len(in_edges))
+
+        return cls(nodes, arrays, static_params)
+
+    @property
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def number_of_edges(self):
+        return len(self.arrays["exports"])
+
+    def node_data(self):
+        """ Return a CompiledNodes view of this network. """
+        return CompiledNodes(self)
+
+    def layout(self):
+        """
+        Return a list of (name, typecode, length) triples.
+
+        The layout describes the arrays of this network in the order of
+        ARRAY_TYPECODES and is what is needed, together with the node
+        names, to rebuild a CompiledNetwork over a flat buffer.
+        """
+        return [(name, typecode, len(self.arrays[name]))
+                for name, typecode in ARRAY_TYPECODES]
+
+    def to_network(self, network=None):
+        """
+        Return a NetworkX DiGraph with the state of this network.
+
+        The nodes and edges are added to network if it is given, e.g.
+        the empty network of a MarchandModel, otherwise to a new graph.
+        """
+        import networkx as nx
+
+        if network is None:
+            network = nx.DiGraph()
+        shocked = self.arrays["shocked"]
+        for i, name in enumerate(self.nodes):
+            data = {attr: self.arrays[attr][i] for attr in NODE_ATTRS}
+            data["shocked"] = bool(shocked[i])
+            network.add_node(name, **data)
+        edge_src, edge_dst = self.arrays["edge_src"], self.arrays["edge_dst"]
+        exports = self.arrays["exports"]
+        for e in range(self.number_of_edges):
+            network.add_edge(self.nodes[edge_src[e]],
+                             self.nodes[edge_dst[e]],
+                             exports=exports[e])
+        return network
+
+
+def buffer_layout(layout, alignment=8):
+    """
+    Return the offsets of the arrays of layout in a flat buffer.
+
+    Returns a list of (name, typecode, offset, length) tuples and the
+    total size in bytes. Each array starts on an alignment boundary.
+    """
+    offsets = []
+    offset = 0
+    for name, typecode, length in layout:
+        offset = -(-offset // alignment) * alignment
+        offsets.append((name, typecode, offset, length))
+        offset += array(typecode).itemsize * length
+    return offsets, offset
+
+
+def write_buffer(compiled, buf, offsets):
+    """ Copy the arrays of compiled into the writable buffer buf. """
+    view = memoryview(buf)
+    for name, typecode, offset, length in offsets:
+        data = compiled.arrays[name]
+        nbytes = array(typecode).itemsize * length
+        view[offset:offset + nbytes] = memoryview(data).cast("B")
+
+
+def map_buffer(buf, offsets):
+    """
+    Return a dict of typed memoryviews of the arrays in buf.
+
+    No data is copied, the views share the memory of buf.
+    """
+    view = memoryview(buf)
+    arrays = {}
+    for name, typecode, offset, length in offsets:
+        nbytes = array(typecode).itemsize * length
+        arrays[name] = view[offset:offset + nbytes].cast(typecode)
+    return arrays
@@ -0,0 +1,303 @@
+"""
+Provide the ArrayEngine class.
+
+The ArrayEngine executes the base Marchand model on a CompiledNetwork.
+It applies the same node update and iteration rules as the
+MarchandModel but keeps its state in typed arrays, so a run needs no
+NetworkX graph and only copies the mutable parts of the network.
+
+"""
+
+import math
+from array import array
+
+from effayoh.marchandmodel import MarchandModelError, TRADE_EPSILON
+
+
+class ScenarioResult:
+    """
+    The final state of the execution of a scenario.
+
+    The node arrays are indexed like the nodes of the CompiledNetwork
+    and exports and alive like its edges. An edge is no longer alive
+    once its exports fell below the removal threshold, at which point
+    the MarchandModel removes it from the network. volumes holds the
+    total trade volume before the first iteration and after every
+    iteration, as recorded by the TradeVolumeRecorder.
+    """
+
+    __slots__ = ["scenario", "iterations", "production", "reserves",
+                 "consumption", "supply", "shocked", "exports", "alive",
+                 "volumes"]
+
+    def __init__(self, scenario, iterations, production, reserves,
+                 consumption, supply, shocked, exports, alive, volumes):
+        self.scenario = scenario
+        self.iterations = iterations
+        self.production = production
+        self.reserves = reserves
+        self.consumption = consumption
+        self.supply = supply
+        self.shocked = shocked
+        self.exports = exports
+        self.alive = alive
+        self.volumes = volumes
+
+    def node_state(self, nodes):
+        """ Return a dict mapping each of nodes to its final state. """
+        return {
+            name: {
+                "production": self.production[i],
+                "reserves": self.reserves[i],
+                "consumption": self.consumption[i],
+                "supply": self.supply[i],
+                "shocked": bool(self.shocked[i]),
+            }
+            for i, name in enumerate(nodes)
+        }
+
+
+class ArrayEngine:
+    """
+    Execute scenarios of the base Marchand model on a CompiledNetwork.
+
+    Only static parameters are supported, dynamic parameters are
+    functions of a MarchandModel instance.
+
+    In reproducible mode nodes and edges are evaluated in the canonical
+    order of the CompiledNetwork and sums are exactly rounded, which
+    makes the final state bit identical to that of a MarchandModel in
+    reproducible mode, see MarchandModel.iterate.
+    """
+
+    def __init__(self, compiled, static_params=None, max_iterations=50,
+                 reproducible=False):
+        self.compiled = compiled
+        params = dict(compiled.static_params)
+        params.update(static_params or {})
+        for name in ("fc", "fr", "fp", "alpha"):
+            if name not in params:
+                msg = "Missing static parameter {}".format(name)
+                raise MarchandModelError(msg)
+        self.params = params
+        self.max_iterations = max_iterations
+        self.reproducible = reproducible
+        self.trade_totals_refresh_interval = 10
+
+    def run(self, scenario):
+        """ Execute scenario and return its ScenarioResult. """
+        run = _Run(self)
+        run.execute(scenario)
+        return ScenarioResult(
+            scenario,
+            run.iterations,
+            run.production,
+            run.reserves,
+            run.consumption,
+            run.supply,
+            run.shocked,
+            run.exports,
+            run.alive,
+            run.volumes,
+        )
+
+
+class _Run:
+    """ The mutable state of one execution of an ArrayEngine. """
+
+    def __init__(self, engine):
+        compiled = engine.compiled
+        arrays = compiled.arrays
+        self.compiled = compiled
+        self.params = engine.params
+        self.max_iterations = engine.max_iterations
+        self.reproducible = engine.reproducible
+        self.refresh_interval = engine.trade_totals_refresh_interval
+
+        # Read only structure, shared with the CompiledNetwork.
+        self.out_ptr = arrays["out_ptr"]
+        self.edge_src = arrays["edge_src"]
+        self.edge_dst = arrays["edge_dst"]
+        self.in_ptr = arrays["in_ptr"]
+        self.in_edges = arrays["in_edges"]
+
+        # Per-run state.
+        self.production = array("d", arrays["production"])
+        self.reserves = array("d", arrays["reserves"])
+        self.consumption = array("d", arrays["consumption"])
+        self.supply = array("d", arrays["supply"])
+        self.shocked = array("b", arrays["shocked"])
+        self.exports = array("d", arrays["exports"])
+        self.alive = array("b", [1]) * len(self.exports)
+        self.export_totals = array("d", [0.0]) * compiled.number_of_nodes
+        self.import_totals = array("d", [0.0]) * compiled.number_of_nodes
+        self.volumes = array("d")
+        self.iterations = 0
+        self.affected_nodes = {}
+        self.affected_edges = {}
+
+    def execute(self, scenario):
+        fp = self.params["fp"]
+        index = self.compiled.index
+        shocks = scenario.initial_shocks(self.compiled.node_data(), fp)
+        for name, shock in shocks:
+            i = index[name]
+            self.production[i] -= shock
+            self.affected_nodes[i] = shock
+        self.compute_trade_totals()
+        self.volume = sum(self.exports)
+        self.volumes.append(self.volume)
+
+        for i in range(1, self.max_iterations+1):
+            self.iterations = i
+            if i % self.refresh_interval == 0:
+                self.compute_trade_totals()
+            self.affected_edges = {}
+            self.iterate()
+            self.volumes.append(self.volume)
+            if not self.affected_nodes:
+                break
+
+    def iterate(self):
+        affected_nodes = self.affected_nodes.items()
+        affected_edges = self.affected_edges.items()
+        if self.reproducible:
+            affected_nodes = sorted(affected_nodes)
+        for node, shock in affected_nodes:
+            self.node_update(node, shock)
+        self.affected_nodes = {}
+        if self.reproducible:
+            # Edge indices are in canonical (exporter, importer) order.
+            affected_edges = sorted(affected_edges)
+            total = math.fsum
+        else:
+            total = sum
+
+        exports, alive = self.exports, self.alive
+        edge_src, edge_dst = self.edge_src, self.edge_dst
+        shocks = {}
+        for e, adjustments in affected_edges:
+            u, v = edge_src[e], edge_dst[e]
+            if u in adjustments:  # v is shocked
+                shocks.setdefault(v, []).append(abs(adjustments[u]))
+            if v in adjustments:  # u is shocked
+                shocks.setdefault(u, []).append(abs(adjustments[v]))
+
+            old = exports[e]
+            if self.reproducible:
+                exports[e] = total([old] + list(adjustments.values()))
+            else:
+                exports[e] += total(adjustments.values())
+            delta = exports[e] - old
+
+            if abs(exports[e]) < 0.001:
+                delta -= exports[e]
+                exports[e] = 0.0
+                alive[e] = 0
+
+            self.export_totals[u] += delta
+            if not self.shocked[u]:
+                self.import_totals[v] += delta
+            self.volume += delta
+
+        for node, increments in shocks.items():
+            self.affected_nodes[node] = total(increments)
+
+    def node_update(self, node, shock):
+        params = self.params
+        reserves, consumption = self.reserves, self.consumption
+
+        # Absorb some of the shock through reserves.
+        dR = min(shock, params["fr"]*reserves[node])
+        shock -= dR
+        # Absorb some of the shock through consumption.
+        max_dC = params["fc"]*consumption[node]
+        dC = min(max_dC, shock)
+        if dC > 0.0:
+            self.set_shocked(node)
+        shock -= dC
+
+        Tvol = self.adjustable_trade_volume(node)
+        if shock <= params["alpha"]*self.supply[node] or Tvol < TRADE_EPSILON:
+            dC += shock
+            self.apply(node, dR, dC)
+            return
+
+        Tshock = min(shock, Tvol)
+        if shock > Tshock:
+            shock -= Tshock
+            dC += shock
+
+        exports, alive = self.exports, self.alive
+        affected_edges = self.affected_edges
+
+        # Set the amount this node wants to adjust exports by.
+        for e in range(self.out_ptr[node], self.out_ptr[node+1]):
+            if not alive[e]:
+                continue
+            adjustment = -(Tshock*exports[e]/Tvol)
+            if e in affected_edges:
+                affected_edges[e][node] = adjustment
+            else:
+                affected_edges[e] = {node: adjustment}
+
+        # Set the amount this node wants to adjust imports by.
+        shocked = self.shocked
+        edge_src = self.edge_src
+        in_edges = self.in_edges
+        for k in range(self.in_ptr[node], self.in_ptr[node+1]):
+            e = in_edges[k]
+            if not alive[e] or shocked[edge_src[e]]:
+                continue
+            adjustment = Tshock*exports[e]/Tvol
+            if e in affected_edges:
+                affected_edges[e][node] = adjustment
+            else:
+                affected_edges[e] = {node: adjustment}
+
+        self.apply(node, dR, dC)
+
+    def adjustable_trade_volume(self, node):
+        if not self.reproducible:
+            return self.export_totals[node] + self.import_totals[node]
+
+        exports, alive = self.exports, self.alive
+        shocked, edge_src = self.shocked, self.edge_src
+        volumes = [exports[e]
+                   for e in range(self.out_ptr[node], self.out_ptr[node+1])
+                   if alive[e]]
+        for k in range(self.in_ptr[node], self.in_ptr[node+1]):
+            e = self.in_edges[k]
+            if alive[e] and not shocked[edge_src[e]]:
+                volumes.append(exports[e])
+        return math.fsum(volumes)
+
+    def apply(self, node, dR, dC):
+        self.reserves[node] -= dR
+        self.consumption[node] -= dC
+        self.supply[node] -= (dR + dC)
+
+    def set_shocked(self, node):
+        if self.shocked[node]:
+            return
+        self.shocked[node] = 1
+        exports, alive, edge_dst = self.exports, self.alive, self.edge_dst
+        for e in range(self.out_ptr[node], self.out_ptr[node+1]):
+            if alive[e]:
+                self.import_totals[edge_dst[e]] -= exports[e]
+
+    def compute_trade_totals(self):
+        n = self.compiled.number_of_nodes
+        export_totals = array("d", [0.0]) * n
+        import_totals = array("d", [0.0]) * n
+        exports, alive, shocked = self.exports, self.alive, self.shocked
+        edge_dst = self.edge_dst
+        for u in range(n):
+            for e in range(self.out_ptr[u], self.out_ptr[u+1]):
+                if not alive[e]:
+                    continue
+                export_totals[u] += exports[e]
+                if not shocked[u]:
+                    import_totals[edge_dst[e]] += exports[e]
+        self.export_totals = export_totals
+        self.import_totals = import_totals
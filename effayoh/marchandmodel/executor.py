@@ -0,0 +1,171 @@
+"""
+Provide the ScenarioExecutor class.
+
+The ScenarioExecutor fans the execution of many scenarios out to a
+process pool. The compiled base network is placed once in a
+multiprocessing.shared_memory block, workers map its arrays without
+copying and only allocate the per-scenario mutable state. Each scenario
+is returned as a ScenarioResult of typed arrays rather than a graph.
+
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+from effayoh.marchandmodel import MarchandModel, MarchandModelError
+from effayoh.marchandmodel.compiled import (
+    CompiledNetwork, buffer_layout, write_buffer, map_buffer
+)
+from effayoh.marchandmodel.engine import ArrayEngine
+
+
+class SharedNetwork:
+    """
+    A CompiledNetwork held in a block of shared memory.
+
+    The process that creates a SharedNetwork owns the block and must
+    call unlink once all the workers are done with it. The handle
+    attribute is a small picklable description of the block which
+    workers pass to SharedNetwork.attach.
+    """
+
+    def __init__(self, shm, handle, owner):
+        self.shm = shm
+        self.handle = handle
+        self.owner = owner
+        nodes, static_params, offsets = handle[1:]
+        self.compiled = CompiledNetwork(nodes,
+                                        map_buffer(shm.buf, offsets),
+                                        static_params)
+
+    @classmethod
+    def create(cls, compiled):
+        """ Copy compiled into a new block of shared memory. """
+        offsets, size = buffer_layout(compiled.layout())
+        # A block cannot be empty.
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        write_buffer(compiled, shm.buf, offsets)
+        handle = (shm.name, compiled.nodes, compiled.static_params, offsets)
+        return cls(shm, handle, owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        """ Map the block described by handle into this process. """
+        shm = shared_memory.SharedMemory(name=handle[0])
+        return cls(shm, handle, owner=False)
+
+    def close(self):
+        # The memoryviews of the compiled arrays must be released
+        # before the block can be closed.
+        for view in self.compiled.arrays.values():
+            view.release()
+        self.compiled = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+
+# The worker process state, set up by _init_worker.
+_worker = {}
+
+
+def _init_worker(handle, static_params, max_iterations, reproducible):
+    shared = SharedNetwork.attach(handle)
+    _worker["shared"] = shared
+    _worker["engine"] = ArrayEngine(shared.compiled,
+                                    static_params,
+                                    max_iterations,
+                                    reproducible)
+
+
+def _run_scenario(scenario):
+    return _worker["engine"].run(scenario)
+
+
+class ScenarioExecutor:
+    """
+    Execute scenarios of one base network in a process pool.
+
+    Usage
+    -----
+    with ScenarioExecutor(model, processes=8) as executor:
+        results = executor.run(scenarios)
+
+    The results are ScenarioResult instances in the order of scenarios,
+    their arrays are indexed by executor.nodes.
+    """
+
+    def __init__(self, network, processes=None, static_params=None,
+                 max_iterations=None, reproducible=False):
+        """
+        Parameters
+        ----------
+        network:
+            A built MarchandModel, that has not been executed, or a
+            CompiledNetwork.
+        processes:
+            The number of worker processes, defaults to the number of
+            CPUs.
+        static_params:
+            Static parameters overriding those of network.
+        max_iterations:
+            The maximum number of iterations of each execution,
+            defaults to the max_iterations of the model.
+        reproducible:
+            Execute scenarios in reproducible mode. Each scenario is
+            executed by a single worker so its result is then the same
+            for any number of processes.
+        """
+        if isinstance(network, MarchandModel):
+            if network.dynamic_params:
+                msg = ("The ScenarioExecutor does not support dynamic "
+                       "parameters.")
+                raise MarchandModelError(msg)
+            if max_iterations is None:
+                max_iterations = network.max_iterations
+            network = network.compile()
+        if max_iterations is None:
+            max_iterations = 50
+
+        self.shared = SharedNetwork.create(network)
+        self.nodes = network.nodes
+        try:
+            self.pool = multiprocessing.Pool(
+                processes,
+                initializer=_init_worker,
+                initargs=(self.shared.handle,
+                          static_params,
+                          max_iterations,
+                          reproducible)
+            )
+        except BaseException:
+            # Nothing else would free the block, which outlives this
+            # process.
+            self.shared.close()
+            self.shared.unlink()
+            raise
+
+    def run(self, scenarios, chunksize=1):
+        """ Execute scenarios and return their ScenarioResults. """
+        return self.pool.map(_run_scenario, scenarios, chunksize)
+
+    def imap(self, scenarios, chunksize=1):
+        """ Yield ScenarioResults in order as they are completed. """
+        return self.pool.imap(_run_scenario, scenarios, chunksize)
+
+    def close(self):
+        if self.pool is None:
+            return
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+        self.shared.close()
+        self.shared.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
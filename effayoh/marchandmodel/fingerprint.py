@@ -0,0 +1,68 @@
+"""
+Provide helpers for fingerprinting model configurations.
+
+A fingerprint is a hex digest that changes whenever one of the inputs
+of a model build or execution changes. Functions and classes are
+identified by their qualified names and data files by their size and
+modification time, or optionally their contents.
+
+"""
+
+import functools
+import hashlib
+import json
+import os
+
+
+def identity(obj):
+    """
+    Return a str identifying the function or class obj.
+
+    Lambdas are told apart by the line they are defined on and
+    functools.partial instances by their function and arguments.
+    """
+    if isinstance(obj, functools.partial):
+        return "partial({}, {!r}, {!r})".format(identity(obj.func),
+                                               obj.args,
+                                               sorted(obj.keywords.items()))
+    module = getattr(obj, "__module__", None)
+    name = getattr(obj, "__qualname__", None) or getattr(obj, "__name__", None)
+    if module is None or name is None:
+        return repr(obj)
+    if "<lambda>" in name:
+        name = "{}:{}".format(name, obj.__code__.co_firstlineno)
+    return "{}.{}".format(module, name)
+
+
+def file_fingerprint(path, contents=False):
+    """
+    Return a dict fingerprinting the file at path.
+
+    By default a file is identified by its path, size and modification
+    time. If contents is True the sha256 digest of the file is added,
+    which detects a file replaced in place by one of the same size.
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {"path": path, "missing": True}
+
+    fingerprint = {
+        "path": path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+    }
+    if contents:
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(chunk)
+        fingerprint["sha256"] = digest.hexdigest()
+    return fingerprint
+
+
+def digest(description):
+    """ Return the sha256 hex digest of a JSON serializable value. """
+    text = json.dumps(description, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
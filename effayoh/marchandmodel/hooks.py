@@ -0,0 +1,99 @@
+"""
+Provide the HookRegistry class.
+
+A HookRegistry holds the callbacks called before (pre) and after (post)
+each phase of a build or an execution. Profilers, tracers and custom
+metrics attach to a builder or a model through its hooks instead of
+modifying the engine:
+
+    def start(model, iteration):
+        ...
+
+    def end(model, iteration, changes):
+        ...
+
+    builder.add_hook("iteration", pre=start, post=end)
+
+The hook points and the arguments of their callbacks are:
+
+build:
+    pre(builder), post(builder, model)
+munge:
+    pre(munger), post(munger), for each munger
+initializer:
+    pre(initializer, network), post(initializer, network), for each
+    network initializer
+execute:
+    pre(model), post(model)
+iteration:
+    pre(model, iteration), post(model, iteration, changes)
+node_update:
+    pre(model, node, shock), post(model, node, shock), for each node
+    update
+
+The model only looks for iteration and node update callbacks once per
+execution and once per iteration respectively, and does not wrap the
+node updates at all when no node_update callback is registered, so
+hooks cost nothing unless they are used.
+
+"""
+
+
+class HookError(Exception): pass
+
+
+HOOK_POINTS = (
+    "build",
+    "munge",
+    "initializer",
+    "execute",
+    "iteration",
+    "node_update",
+)
+
+
+class HookRegistry:
+
+    def __init__(self):
+        self.pre = {point: [] for point in HOOK_POINTS}
+        self.post = {point: [] for point in HOOK_POINTS}
+
+    def add(self, point, pre=None, post=None):
+        """ Register the pre and post callbacks of the hook point. """
+        self._check_point(point)
+        if pre is not None:
+            self.pre[point].append(pre)
+        if post is not None:
+            self.post[point].append(post)
+
+    def remove(self, point, pre=None, post=None):
+        """ Unregister the pre and post callbacks of the hook point. """
+        self._check_point(point)
+        if pre is not None:
+            self.pre[point].remove(pre)
+        if post is not None:
+            self.post[point].remove(post)
+
+    def has(self, point):
+        """ Return whether any callback is registered at point. """
+        return bool(self.pre[point] or self.post[point])
+
+    def run_pre(self, point, *args):
+        for callback in self.pre[point]:
+            callback(*args)
+
+    def run_post(self, point, *args):
+        for callback in self.post[point]:
+            callback(*args)
+
+    def copy(self):
+        hooks = HookRegistry()
+        for point in HOOK_POINTS:
+            hooks.pre[point] = list(self.pre[point])
+            hooks.post[point] = list(self.post[point])
+        return hooks
+
+    def _check_point(self, point):
+        if point not in self.pre:
+            raise HookError("Unknown hook point {!r}, expected one of "
+                            "{}.".format(point, ", ".join(HOOK_POINTS)))
@@ -0,0 +1,288 @@
+"""
+Provide fusable network initializers.
+
+A network initializer is a function of the network run by the builder
+once the data is munged. Most initializers only set attributes of each
+node, or of the nodes of each edge, so running them in turn makes one
+pass over the nodes or edges per initializer. A FusableInitializer
+instead declares the node attributes it reads and writes and how it
+updates a node and an edge, and fuse combines consecutive fusable
+initializers into a FusedInitializer making a single node pass and a
+single edge pass:
+
+    @node_initializer(reads=["production", "consumption"],
+                      writes=["surplus"])
+    def surplus_initializer(node, data):
+        data["surplus"] = data["production"] - data["consumption"]
+
+Within a fused initializer the node updates of a node are applied in
+the order of the initializers, then the edge updates of an edge, so
+fusion is only valid if no initializer reads or writes an attribute
+that an earlier initializer writes in its edge pass, or writes an
+attribute an earlier edge pass reads or writes. fuse starts a new fused
+initializer whenever this does not hold and leaves other initializers
+as they are, so the order of the initializers is kept.
+
+fuse relies on the declarations alone, so an initializer must declare
+every node attribute its node and edge updates read, including those
+it only tests for, e.g. with "name" in data, and every attribute they
+write.
+
+"""
+from __future__ import division, absolute_import, print_function
+from builtins import super
+
+import logging
+
+from effayoh.logs import fields
+
+
+log = logging.getLogger(__name__)
+
+
+class FusableInitializer(object):
+
+    """
+    A network initializer declaring the node attributes it reads and
+    writes.
+
+    Subclasses define update_node(node, data), applied to each node and
+    its data, and/or update_edge(u, v, data, u_data, v_data), applied to
+    each edge and the data of the edge and of its nodes after all the
+    nodes are updated. start and finish are called before and after the
+    passes, e.g. to collect and report the nodes missing data.
+    """
+
+    update_node = None
+    update_edge = None
+
+    def __init__(self, name, reads=(), writes=()):
+        self.__name__ = name
+        self.__qualname__ = name
+        self.reads = frozenset(reads)
+        self.writes = frozenset(writes)
+
+    def __call__(self, network):
+        run_passes(network, [self])
+
+    def __repr__(self):
+        return "<{} {}>".format(type(self).__name__, self.__name__)
+
+    def start(self):
+        pass
+
+    def finish(self):
+        pass
+
+    def conflicts(self, other):
+        """
+        Return whether the edge pass of self prevents fusing the later
+        initializer other with it.
+
+        The node updates of fused initializers are applied in order
+        before any edge update, so an initializer without an edge pass
+        never conflicts with a later one. One with an edge pass conflicts
+        with a later initializer reading or writing an attribute it
+        writes, or writing an attribute it reads, in either of its
+        passes.
+        """
+        if self.update_edge is None:
+            return False
+        return bool(self.writes & (other.reads | other.writes)
+                    or self.reads & other.writes)
+
+
+class FunctionInitializer(FusableInitializer):
+
+    """ A FusableInitializer applying a node or an edge function. """
+
+    def __init__(self, func, reads=(), writes=(), edge=False):
+        super().__init__(func.__name__, reads, writes)
+        self.__module__ = func.__module__
+        if edge:
+            self.update_edge = func
+        else:
+            self.update_node = func
+
+
+def node_initializer(reads=(), writes=()):
+    """
+    Decorate a function of (node, data) as a fusable initializer.
+    """
+    def decorator(func):
+        return FunctionInitializer(func, reads, writes)
+    return decorator
+
+
+def edge_initializer(reads=(), writes=()):
+    """
+    Decorate a function of (u, v, data, u_data, v_data) as a fusable
+    initializer.
+    """
+    def decorator(func):
+        return FunctionInitializer(func, reads, writes, edge=True)
+    return decorator
+
+
+class DefaultInitializer(FusableInitializer):
+
+    """
+    Set the attribute name of the nodes without it to value, or of every
+    node if replace is True.
+    """
+
+    def __init__(self, initializer_name, name, value, replace=False):
+        # Only the nodes without the attribute are set unless replace.
+        reads = [] if replace else [name]
+        super().__init__(initializer_name, reads=reads, writes=[name])
+        self.name = name
+        self.value = value
+        self.replace = replace
+
+    def update_node(self, node, data):
+        if self.replace or self.name not in data:
+            data[self.name] = self.value
+
+
+class ConsumptionInitializer(DefaultInitializer):
+
+    """ Default consumption to zero and log the nodes without it. """
+
+    def __init__(self):
+        super().__init__("consumption_initializer", "consumption", 0.0)
+        self.missing = []
+
+    def start(self):
+        self.missing = []
+
+    def update_node(self, node, data):
+        if not "consumption" in data:
+            self.missing.append(node)
+            data["consumption"] = 0.0
+
+    def finish(self):
+        if self.missing:
+            log.info("%d nodes have no consumption data.",
+                     len(self.missing),
+                     extra=fields(nodes=sorted(self.missing)))
+        self.missing = []
+
+
+class SupplyInitializer(FusableInitializer):
+
+    """
+    Set the supply of each node to its production plus its imports
+    less its exports.
+
+    The supply of a node without production is that of its trade alone,
+    so production_initializer must run before supply_initializer for
+    every node to have a supply with its production.
+    """
+
+    def __init__(self):
+        # The edge pass adds the exports of each edge to the supply the
+        # node pass, or an earlier edge, set.
+        super().__init__("supply_initializer",
+                         reads=["production", "supply"],
+                         writes=["supply"])
+
+    def update_node(self, node, data):
+        if "production" in data:
+            data["supply"] = data["production"]
+
+    def update_edge(self, u, v, data, u_data, v_data):
+        if "supply" in u_data:
+            u_data["supply"] -= data["exports"]
+        else:
+            u_data["supply"] = -data["exports"]
+        if "supply" in v_data:
+            v_data["supply"] += data["exports"]
+        else:
+            v_data["supply"] = data["exports"]
+
+
+class FusedInitializer(object):
+
+    """ Initializers applied in a single node pass and edge pass. """
+
+    def __init__(self, initializers):
+        self.initializers = list(initializers)
+        self.__name__ = "+".join(i.__name__ for i in self.initializers)
+
+    def __call__(self, network):
+        run_passes(network, self.initializers)
+
+    def __repr__(self):
+        return "<FusedInitializer {}>".format(self.__name__)
+
+
+def run_passes(network, initializers):
+    """
+    Apply the node updates of initializers to each node, then their edge
+    updates to each edge.
+    """
+    node_updates = [i.update_node for i in initializers
+                    if i.update_node is not None]
+    edge_updates = [i.update_edge for i in initializers
+                    if i.update_edge is not None]
+    for initializer in initializers:
+        initializer.start()
+
+    nodes = network.node
+    if node_updates:
+        for node, data in nodes.items():
+            for update in node_updates:
+                update(node, data)
+    if edge_updates:
+        for u, neighbors in network.adj.items():
+            u_data = nodes[u]
+            for v, data in neighbors.items():
+                v_data = nodes[v]
+                for update in edge_updates:
+                    update(u, v, data, u_data, v_data)
+
+    for initializer in initializers:
+        initializer.finish()
+
+
+def fuse(initializers):
+    """
+    Return the list of initializers with consecutive fusable
+    initializers combined into FusedInitializers.
+
+    A fusable initializer alone is kept as it is.
+    """
+    fused = []
+    group = []
+
+    def flush():
+        if len(group) > 1:
+            fused.append(FusedInitializer(group))
+        else:
+            fused.extend(group)
+        del group[:]
+
+    for initializer in initializers:
+        if not isinstance(initializer, FusableInitializer):
+            flush()
+            fused.append(initializer)
+            continue
+        if any(member.conflicts(initializer) for member in group):
+            flush()
+        group.append(initializer)
+    flush()
+    return fused
+
+
+shocked_initializer = DefaultInitializer("shocked_initializer",
+                                         "shocked",
+                                         False,
+                                         replace=True)
+reserves_initializer = DefaultInitializer("reserves_initializer",
+                                          "reserves",
+                                          0.0)
+production_initializer = DefaultInitializer("production_initializer",
+                                            "production",
+                                            0.0)
+consumption_initializer = ConsumptionInitializer()
+supply_initializer = SupplyInitializer()
@@ -0,0 +1,155 @@
+"""
+Provide the network layers of a Marchand model build.
+
+A build whose mungers aggregate the years of the data into several
+layers, see effayoh.mungers.aggregation, sets the attributes of every
+layer on the network, e.g. exports for the mean of the years and
+exports@2005 for the exports of 2005. The builder splits the attributes
+of the layers other than the base layer off the network of the model
+into a graph per layer, with the attributes named as in the base layer:
+
+    builder.set_year_aggregation(YearLayers())
+    model = builder.build()
+    for year in builder.years:
+        year_model = select_year(model, year)
+        year_model.set_epicenter("RUSSIA")
+        year_model.execute()
+
+Likewise a build with commodity layers, see
+MarchandModelBuilder.add_commodity_layer, keeps a layer per commodity
+besides the aggregate network of all the items, e.g. exports#wheat for
+the exports of wheat, from the same pass over the data:
+
+    builder.add_commodity_layer("wheat", commodities.WHEAT)
+    model = builder.build()
+    wheat_model = select_commodity(model, "wheat")
+
+select_layer returns a model of a layer, whose network is initialized
+by the network initializers of the builder, without munging the data
+again.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import networkx as nx
+
+from effayoh.marchandmodel import MarchandModel, MarchandModelError
+from effayoh.mungers.aggregation import (
+    LAYER_SEPARATOR, COMMODITY_SEPARATOR, year_suffix, window_suffix,
+    commodity_suffix
+)
+
+
+SEPARATORS = (COMMODITY_SEPARATOR, LAYER_SEPARATOR)
+
+
+def split_name(name):
+    """
+    Return the (base, suffix) tuple of the attribute name of a layer.
+
+    The suffix of an attribute of the base layer is empty, that of a
+    commodity layer of a year aggregation layer holds both suffixes,
+    e.g. #wheat@2005.
+    """
+    positions = [i for i in map(name.find, SEPARATORS) if i > 0]
+    if not positions:
+        return name, ""
+    i = min(positions)
+    return name[:i], name[i:]
+
+
+def is_layer_name(name):
+    return any(separator in name for separator in SEPARATORS)
+
+
+def split_layers(network):
+    """
+    Move the attributes of the layers other than the base layer from
+    network to a graph per layer.
+
+    Returns a dict mapping the suffix of each layer to its graph. A
+    layer graph has every node of network and the edges with attributes
+    in the layer.
+    """
+    layers = {}
+
+    def layer(suffix):
+        if suffix not in layers:
+            graph = nx.DiGraph()
+            graph.add_nodes_from(network)
+            layers[suffix] = graph
+        return layers[suffix]
+
+    for node, data in network.node.items():
+        for name in [name for name in data if is_layer_name(name)]:
+            base, suffix = split_name(name)
+            if suffix:
+                layer(suffix).node[node][base] = data.pop(name)
+
+    for u, v, data in network.edges(data=True):
+        for name in [name for name in data if is_layer_name(name)]:
+            base, suffix = split_name(name)
+            if suffix:
+                graph = layer(suffix)
+                if not graph.has_edge(u, v):
+                    graph.add_edge(u, v)
+                graph[u][v][base] = data.pop(name)
+    return layers
+
+
+def select_layer(model, suffix):
+    """
+    Return a model of the layer of model with suffix.
+
+    The model has the parameters, policy and hooks of model and new
+    instances of the recorders of its builder, and its network is a
+    copy of the layer initialized by the network initializers of the
+    builder.
+    """
+    if suffix not in model.layers:
+        msg = "The model has no layer {!r}.".format(suffix)
+        raise MarchandModelError(msg)
+    builder = model.builder
+    if builder is None:
+        raise MarchandModelError("The model has no builder.")
+
+    recorders = [recorder_class()
+                 for recorder_class in builder.recorder_classes]
+    layer_model = MarchandModel(model.static_params,
+                                model.dynamic_params,
+                                model.policy,
+                                recorders,
+                                builder.politent_maps,
+                                builder=builder)
+    layer_model.hooks = model.hooks.copy()
+    layer_model.max_iterations = model.max_iterations
+    layer = model.layers[suffix]
+    layer_model.network.add_nodes_from(layer.nodes(data=True))
+    layer_model.network.add_edges_from(layer.edges(data=True))
+    builder.apply_initializers(layer_model.network)
+    return layer_model
+
+
+def select_year(model, year):
+    """ Return a model of the layer of year, see YearLayers. """
+    return select_layer(model, year_suffix(year))
+
+
+def select_window(model, first, last):
+    """
+    Return a model of the layer of the years first to last, see
+    WindowLayers.
+    """
+    return select_layer(model, window_suffix(first, last))
+
+
+def select_commodity(model, name, year=None):
+    """
+    Return a model of the layer of the commodity name, by default of
+    the base layer of the year aggregation, otherwise of year, see
+    MarchandModelBuilder.add_commodity_layer.
+    """
+    suffix = commodity_suffix(name)
+    if year is not None:
+        suffix += year_suffix(year)
+    return select_layer(model, suffix)
@@ -0,0 +1,125 @@
+"""
+Provide a memory report of a Marchand model build.
+
+memory_report builds a model while tracing allocations with tracemalloc
+and attributes the memory held after the build to the structures of the
+build: the object pools of the data source tuple classes, the data of
+each munger and the network. Structures share objects, the pooled
+countries and items are keys of the munger data for instance, so each
+object is attributed to the first structure found to hold it, in that
+order.
+
+"""
+
+import sys
+import tracemalloc
+from collections import deque
+
+from effayoh.mungers import FAOCountry
+from effayoh.mungers.dtm import DTMItem, DTMElement
+from effayoh.mungers.fbs import FBSItem, FBSElement, FBSItemsElementsGroup
+from effayoh.mungers.psd import PSDCommodity, PSDCountry, PSDAttribute
+
+
+# The classes whose instances are pooled for the life of the process.
+POOLED_CLASSES = (
+    FAOCountry,
+    DTMItem,
+    DTMElement,
+    FBSItem,
+    FBSElement,
+    FBSItemsElementsGroup,
+    PSDCommodity,
+    PSDCountry,
+    PSDAttribute,
+)
+
+# Objects shared with the rest of the process, which are not attributed
+# to any structure.
+_SHARED_TYPES = (type, type(sys), type(len), type(lambda: None))
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Return the size in bytes of obj and the objects it holds.
+
+    Dicts, lists, tuples, sets and the attributes of objects are
+    followed. Objects whose id is in seen are not counted, and the ids
+    of the counted objects are added to seen.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    pending = deque([obj])
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            pending.extend(obj)
+        if hasattr(obj, "__dict__"):
+            pending.append(obj.__dict__)
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                pending.append(getattr(obj, slot))
+    return size
+
+
+def memory_report(builder):
+    """
+    Build a model with builder and report its memory use.
+
+    Returns a (model, report) tuple where report is a dict with:
+
+    peak:
+        The peak traced memory during the build, in bytes.
+    retained:
+        The traced memory held by the model after the build.
+    object_pools:
+        A dict mapping each pooled class name to the bytes of its pool.
+    mungers:
+        A dict mapping each munger class name to the bytes of its data,
+        zero if the builder releases munger data.
+    network:
+        The bytes of the network.
+
+    The peak is only measured from the start of the build if tracing is
+    not already started or tracemalloc.reset_peak is available.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        mungers = []
+        model = builder.build(mungers=mungers)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    seen = set()
+    report = {
+        "peak": peak - before,
+        "retained": after - before,
+        "object_pools": {},
+        "mungers": {},
+        "network": 0,
+    }
+    for cls in POOLED_CLASSES:
+        report["object_pools"][cls.__name__] = deep_sizeof(cls.object_pool,
+                                                           seen)
+    for munger in mungers:
+        name = type(munger).__name__
+        data = getattr(munger, "data", None)
+        size = deep_sizeof(data, seen) if data is not None else 0
+        report["mungers"][name] = report["mungers"].get(name, 0) + size
+    report["network"] = deep_sizeof(model.network, seen)
+    return model, report
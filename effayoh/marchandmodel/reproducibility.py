@@ -0,0 +1,112 @@
+"""
+Provide a harness checking that engines produce bit identical results.
+
+In reproducible mode the MarchandModel, the ArrayEngine and the
+ScenarioExecutor, for any number of worker processes, evaluate nodes
+and edges in the same canonical order and round every sum exactly, so
+the final state of a scenario must not differ in a single bit between
+them. check_reproducible runs scenarios on each engine and reports any
+difference.
+
+"""
+
+from effayoh.marchandmodel.engine import ArrayEngine
+from effayoh.marchandmodel.executor import ScenarioExecutor
+
+
+NODE_FIELDS = ("production", "reserves", "consumption", "supply", "shocked")
+
+
+def serial_state(model, scenario):
+    """
+    Execute scenario on model in reproducible mode.
+
+    Returns the final node state as a dict mapping each field to a list
+    in canonical node order and the final exports as a dict mapping
+    each remaining (exporter, importer) pair to its value.
+    """
+    model.set_reproducible()
+    model.set_scenario(scenario)
+    model.execute()
+    nodes = sorted(model.network)
+    state = {
+        field: [model.network.node[node][field] for node in nodes]
+        for field in NODE_FIELDS
+    }
+    state["shocked"] = [bool(shocked) for shocked in state["shocked"]]
+    exports = {(u, v): data["exports"]
+               for u, v, data in model.network.edges(data=True)}
+    return state, exports
+
+
+def result_state(result, compiled):
+    """ Return the state of a ScenarioResult like serial_state. """
+    state = {field: list(getattr(result, field)) for field in NODE_FIELDS}
+    state["shocked"] = [bool(shocked) for shocked in state["shocked"]]
+    nodes = compiled.nodes
+    edge_src = compiled.arrays["edge_src"]
+    edge_dst = compiled.arrays["edge_dst"]
+    exports = {(nodes[edge_src[e]], nodes[edge_dst[e]]): value
+               for e, value in enumerate(result.exports)
+               if result.alive[e]}
+    return state, exports
+
+
+def compare_states(name, expected, actual):
+    """ Return a list of the differences between two states. """
+    mismatches = []
+    expected_nodes, expected_exports = expected
+    actual_nodes, actual_exports = actual
+    for field in NODE_FIELDS:
+        if expected_nodes[field] != actual_nodes[field]:
+            mismatches.append("{}: node {} differs".format(name, field))
+    if expected_exports != actual_exports:
+        mismatches.append("{}: exports differ".format(name))
+    return mismatches
+
+
+def check_reproducible(model_factory, scenarios, processes=(1, 2, 4)):
+    """
+    Return a list of the differences between engines.
+
+    Every scenario is executed by a MarchandModel, an ArrayEngine and a
+    ScenarioExecutor with each number of processes, all in reproducible
+    mode, and compared with the execution of the MarchandModel.
+
+    Parameters
+    ----------
+    model_factory:
+        A callable returning a new built MarchandModel.
+    scenarios:
+        A list of ShockScenarios.
+    processes:
+        The numbers of worker processes to check the executor with.
+    """
+    model = model_factory()
+    compiled = model.compile()
+    engine = ArrayEngine(compiled,
+                         model.static_params,
+                         model.max_iterations,
+                         reproducible=True)
+
+    expected = [serial_state(model_factory(), scenario)
+                for scenario in scenarios]
+
+    mismatches = []
+    for scenario, state in zip(scenarios, expected):
+        actual = result_state(engine.run(scenario), compiled)
+        name = "ArrayEngine {}".format(scenario.key())
+        mismatches.extend(compare_states(name, state, actual))
+
+    for count in processes:
+        with ScenarioExecutor(compiled,
+                              processes=count,
+                              max_iterations=model.max_iterations,
+                              reproducible=True) as executor:
+            results = executor.run(scenarios)
+        for scenario, state, result in zip(scenarios, expected, results):
+            actual = result_state(result, compiled)
+            name = "ScenarioExecutor({}) {}".format(count, scenario.key())
+            mismatches.extend(compare_states(name, state, actual))
+
+    return mismatches
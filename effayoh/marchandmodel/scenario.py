@@ -0,0 +1,133 @@
+"""
+Provide the ShockScenario class.
+
+A shock scenario specifies the initial shocks of a Marchand model
+execution. The base model shocks one epicenter by a fraction fp of its
+production, a scenario generalizes this to several simultaneous origins
+each with its own magnitude, e.g. a correlated drought across the
+Americas.
+
+"""
+
+
+class ScenarioError(Exception): pass
+
+
+class ShockOrigin:
+    """
+    An origin of a shock in a ShockScenario.
+
+    The magnitude of the shock is either an absolute amount or a
+    fraction of the attribute attr of the origin node. If neither is
+    given the fraction defaults to the fp parameter of the model.
+    """
+
+    __slots__ = ["country", "fraction", "amount", "attr"]
+
+    def __init__(self, country, fraction=None, amount=None,
+                 attr="production"):
+        if fraction is not None and amount is not None:
+            msg = "A shock origin takes a fraction or an amount, not both."
+            raise ScenarioError(msg)
+        self.country = country
+        self.fraction = fraction
+        self.amount = amount
+        self.attr = attr
+
+    def key(self):
+        return (self.country, self.fraction, self.amount, self.attr)
+
+
+class ShockScenario:
+    """
+    A collection of shock origins propagated in one model execution.
+
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.origins = []
+
+    @classmethod
+    def single(cls, country, fraction=None):
+        """ Return the scenario of the base model with one epicenter. """
+        scenario = cls(name=country)
+        scenario.add_origin(country, fraction=fraction)
+        return scenario
+
+    def add_origin(self, country, fraction=None, amount=None,
+                   attr="production"):
+        """
+        Add an origin of the shock to this scenario.
+
+        Parameters
+        ----------
+        country:
+            The name of the network node that is shocked.
+        fraction:
+            The magnitude of the shock as a fraction of the attr
+            attribute of country. Defaults to the fp parameter.
+        amount:
+            The absolute magnitude of the shock.
+        attr:
+            The node attribute the fraction is taken of. Setting attr
+            to a per-commodity production attribute shocks one
+            commodity of country rather than its aggregate production.
+        """
+        self.origins.append(ShockOrigin(country, fraction, amount, attr))
+        return self
+
+    @property
+    def countries(self):
+        return [origin.country for origin in self.origins]
+
+    def initial_shocks(self, nodes, default_fraction):
+        """
+        Return a list of (node, shock) pairs seeding the execution.
+
+        The pairs are in the order the origins were added and an origin
+        appearing more than once has its shocks summed. The shocks only
+        depend on the node data so any engine can seed its affected
+        nodes from them. Raises a ScenarioError if the data of the node
+        of a fractional origin has no attr attribute.
+
+        Parameters
+        ----------
+        nodes:
+            A mapping of node names to node data mappings, e.g. the
+            node attribute of a NetworkX graph.
+        default_fraction:
+            The fraction used for origins without a magnitude.
+        """
+        if not self.origins:
+            raise ScenarioError("The scenario has no shock origins.")
+
+        shocks = {}
+        order = []
+        for origin in self.origins:
+            if origin.country not in nodes:
+                msg = "The shock origin {} is not a network node."
+                raise ScenarioError(msg.format(origin.country))
+            if origin.amount is not None:
+                shock = origin.amount
+            else:
+                fraction = origin.fraction
+                if fraction is None:
+                    fraction = default_fraction
+                data = nodes[origin.country]
+                if origin.attr not in data:
+                    msg = "The shock origin {} has no {} attribute."
+                    raise ScenarioError(msg.format(origin.country,
+                                                   origin.attr))
+                shock = fraction*data[origin.attr]
+            if origin.country in shocks:
+                shocks[origin.country] += shock
+            else:
+                shocks[origin.country] = shock
+                order.append(origin.country)
+
+        return [(node, shocks[node]) for node in order]
+
+    def key(self):
+        """ Return a hashable description of this scenario. """
+        return tuple(origin.key() for origin in self.origins)
@@ -0,0 +1,236 @@
+"""
+Provide the ResultStore class.
+
+The ResultStore is a local, content addressed cache of completed model
+executions. A run is keyed by a digest of the builder configuration and
+the scenario, so repeating a run that has already been computed, in
+this or any other process, loads its recorders and final network state
+from disk instead of building and executing the model.
+
+Each run is stored in its own directory under the root of the store,
+named by its key, holding a run.json metadata file and a state.pickle
+file. The store is bounded in size, the least recently used runs are
+evicted first.
+
+"""
+
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+from effayoh.marchandmodel.fingerprint import digest
+
+
+class ResultStoreError(Exception): pass
+
+
+METADATA_FILE = "run.json"
+STATE_FILE = "state.pickle"
+
+
+class StoredRun:
+    """
+    A completed run loaded from a ResultStore.
+
+    Attributes
+    ----------
+    key:
+        The key of the run in the store.
+    metadata:
+        The dict of metadata of the run, see ResultStore.entries.
+    nodes:
+        A dict mapping each node of the network to its final attribute
+        dict.
+    edges:
+        A dict mapping each (exporter, importer) pair to its final
+        attribute dict.
+    recorders:
+        The recorders of the model after execution.
+    """
+
+    def __init__(self, key, metadata, nodes, edges, recorders):
+        self.key = key
+        self.metadata = metadata
+        self.nodes = nodes
+        self.edges = edges
+        self.recorders = recorders
+
+
+class ResultStore:
+
+    def __init__(self, root, max_bytes=1 << 30, file_contents=False):
+        """
+        Parameters
+        ----------
+        root:
+            The directory of the store, created if it does not exist.
+        max_bytes:
+            The maximum total size of the stored runs.
+        file_contents:
+            Fingerprint data files by their contents rather than by
+            their size and modification time.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.file_contents = file_contents
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def key(self, builder, scenario, max_iterations=50):
+        """ Return the key of the run of scenario on builder's model. """
+        return digest({
+            "builder": builder.configuration(self.file_contents),
+            "scenario": scenario.key(),
+            "max_iterations": max_iterations,
+        })
+
+    def run(self, builder, scenario, max_iterations=50):
+        """
+        Return the StoredRun of scenario on the model of builder.
+
+        The run is loaded from the store if it has been computed before,
+        otherwise the model is built, executed and stored.
+        """
+        key = self.key(builder, scenario, max_iterations)
+        stored = self.load(key)
+        if stored is not None:
+            return stored
+
+        model = builder.build()
+        model.max_iterations = max_iterations
+        model.set_scenario(scenario)
+        model.execute()
+        metadata = {
+            "scenario": scenario.name,
+            "origins": [list(origin) for origin in scenario.key()],
+            "years": list(builder.years),
+            "static_params": {name: repr(value) for name, value
+                              in builder.static_params.items()},
+        }
+        return self.put(key, model, metadata)
+
+    def put(self, key, model, metadata=None):
+        """
+        Store the final state and recorders of the executed model.
+
+        Returns the StoredRun of the model. The run is kept even if it
+        is larger than max_bytes on its own, the other runs are evicted
+        to make room for it.
+        """
+        state = {
+            "nodes": dict(model.network.node),
+            "edges": {(u, v): data
+                      for u, v, data in model.network.edges(data=True)},
+            "recorders": model.recorders,
+        }
+        now = time.time()
+        metadata = dict(metadata or {})
+        metadata.update(key=key, created=now, accessed=now)
+
+        # Write into a temporary directory and move it into place so
+        # that readers never see a partially written run.
+        tmp = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            state_path = os.path.join(tmp, STATE_FILE)
+            with open(state_path, "wb") as fh:
+                pickle.dump(state, fh, pickle.HIGHEST_PROTOCOL)
+            metadata["size"] = os.path.getsize(state_path)
+            self._write_metadata(tmp, metadata)
+            target = self._path(key)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            os.rename(tmp, target)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        self.evict(keep=key)
+        return StoredRun(key,
+                         metadata,
+                         state["nodes"],
+                         state["edges"],
+                         state["recorders"])
+
+    def load(self, key):
+        """ Return the StoredRun of key or None if it is not stored. """
+        path = self._path(key)
+        try:
+            metadata = self._read_metadata(path)
+            with open(os.path.join(path, STATE_FILE), "rb") as fh:
+                state = pickle.load(fh)
+        except (IOError, OSError, ValueError, EOFError,
+                pickle.UnpicklingError):
+            return None
+
+        metadata["accessed"] = time.time()
+        self._write_metadata(path, metadata)
+        return StoredRun(key,
+                         metadata,
+                         state["nodes"],
+                         state["edges"],
+                         state["recorders"])
+
+    def __contains__(self, key):
+        return os.path.isfile(os.path.join(self._path(key), METADATA_FILE))
+
+    def entries(self):
+        """
+        Return the list of metadata dicts of the stored runs.
+
+        The metadata of a run holds its key, size in bytes, creation
+        and last access times, and the description of the scenario,
+        years and static parameters it was run with. The list is sorted
+        from the most to the least recently accessed run.
+        """
+        entries = []
+        for name in os.listdir(self.root):
+            if name.startswith("."):
+                continue
+            try:
+                entries.append(self._read_metadata(self._path(name)))
+            except (IOError, OSError, ValueError):
+                continue
+        entries.sort(key=lambda entry: entry["accessed"], reverse=True)
+        return entries
+
+    def size(self):
+        """ Return the total size in bytes of the stored runs. """
+        return sum(entry["size"] for entry in self.entries())
+
+    def remove(self, key):
+        shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def clear(self):
+        for entry in self.entries():
+            self.remove(entry["key"])
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used runs until the store fits, but the
+        run of the key keep.
+        """
+        entries = self.entries()
+        total = sum(entry["size"] for entry in entries)
+        candidates = [entry for entry in entries if entry["key"] != keep]
+        while candidates and total > self.max_bytes:
+            entry = candidates.pop()
+            self.remove(entry["key"])
+            total -= entry["size"]
+
+    def _path(self, key):
+        if not key or os.sep in key or key.startswith("."):
+            raise ResultStoreError("Invalid key {!r}".format(key))
+        return os.path.join(self.root, key)
+
+    def _read_metadata(self, path):
+        with open(os.path.join(path, METADATA_FILE)) as fh:
+            return json.load(fh)
+
+    def _write_metadata(self, path, metadata):
+        tmp = os.path.join(path, METADATA_FILE + ".tmp")
+        with open(tmp, "w") as fh:
+            json.dump(metadata, fh, sort_keys=True)
+        os.replace(tmp, os.path.join(path, METADATA_FILE))
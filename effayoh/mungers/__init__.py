@@ -14,3 +14,7 @@ class FAOCountry(tuple):
             obj = super().__new__(cls, tup)
             FAOCountry.object_pool[obj] = obj
             return obj
+
+    def __getnewargs__(self):
+        # Unpickle through __new__ so that the object is pooled.
+        return tuple(self)
@@ -0,0 +1,212 @@
+"""
+Provide the year aggregations of the data mungers.
+
+The mungers read a value per year for each coordinate of their data,
+e.g. the exports of an item from a reporter to a partner country, and
+aggregate the values of the years into the values set on the network.
+A year aggregation computes the values of one or more layers from the
+year values of a coordinate in one pass over the data: the base layer,
+the mean of the years, and for instance a layer per year. The network
+attributes of a layer are named after the base attribute followed by
+the suffix of the layer, e.g. exports@2005 for the exports of 2005.
+
+The first layer of an aggregation is the base layer, in which every
+coordinate has a value. A coordinate may have no value in another
+layer, e.g. in a year for which the data has no value, in which case
+its aggregator returns None for that layer.
+
+The mungers may also keep a layer per commodity, see commodity_groups,
+whose attributes are named after the base attribute followed by the
+commodity suffix, e.g. exports#wheat for the exports of wheat. The
+commodity layers are kept for every layer of the year aggregation, e.g.
+exports#wheat@2005 for the exports of wheat in 2005.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+
+class AggregationError(Exception): pass
+
+
+LAYER_SEPARATOR = "@"
+COMMODITY_SEPARATOR = "#"
+
+
+def year_suffix(year):
+    """ Return the suffix of the layer of year. """
+    return "{}{}".format(LAYER_SEPARATOR, year)
+
+
+def window_suffix(first, last):
+    """ Return the suffix of the layer of the years first to last. """
+    return "{}{}-{}".format(LAYER_SEPARATOR, first, last)
+
+
+def commodity_suffix(name):
+    """ Return the suffix of the layer of the commodity name. """
+    return "{}{}".format(COMMODITY_SEPARATOR, name)
+
+
+def commodity_groups(group, commodity_layers, suffix=""):
+    """
+    Return the (suffix, items, commodity) tuples of the layers of a
+    munger group in the year aggregation layer with suffix.
+
+    The first tuple is that of the aggregate layer, with every item of
+    group and a None commodity, followed by a tuple per (name, items)
+    commodity layer with the items of group in the commodity and the
+    items of the commodity, but for the commodities without an item of
+    group. A group converts the values of the items of a commodity as it
+    does those of all its items, e.g. a sum over the items, and the
+    mungers only set the value of a group in a commodity layer on the
+    edges and nodes with a value of an item of the commodity, so a
+    commodity layer is the network of a build of the items of the
+    commodity alone, whose groups hold only the items of the commodity.
+    """
+    groups = [(suffix, group, None)]
+    for name, items in commodity_layers:
+        commodity_group = group & items
+        if commodity_group:
+            groups.append((commodity_suffix(name) + suffix,
+                           commodity_group,
+                           items))
+    return groups
+
+
+class MeanAggregation:
+
+    """ Aggregate the years of a coordinate into their mean. """
+
+    def suffixes(self, years):
+        """ Return the suffixes of the layers for the years. """
+        return [""]
+
+    def aggregator(self, years):
+        """
+        Return a function of the dict of year values of a coordinate
+        returning the list of its values in each layer.
+        """
+        def aggregate(values):
+            return [sum(values.values()) / len(values)]
+        return aggregate
+
+    def __repr__(self):
+        return "{}()".format(type(self).__name__)
+
+
+class YearLayers(MeanAggregation):
+
+    """
+    Keep the value of each year in a layer of its own besides the mean.
+    """
+
+    def suffixes(self, years):
+        return [""] + [year_suffix(year) for year in years]
+
+    def aggregator(self, years):
+        years = list(years)
+
+        def aggregate(values):
+            mean = sum(values.values()) / len(values)
+            return [mean] + [values.get(year) for year in years]
+        return aggregate
+
+
+class WindowLayers(MeanAggregation):
+
+    """
+    Keep the mean of each window of consecutive years in a layer of its
+    own besides the mean of all the years.
+
+    The windows of each width slide over the selected years in order,
+    e.g. the 5 year windows of 2005 to 2013 are 2005-2009, 2006-2010,
+    and so on up to 2009-2013. The mean of a window is that of the years
+    of the window with a value, None if none has one.
+
+    The means of every window of a coordinate are computed from the
+    prefix sums of its year values in one pass over its years, so the
+    layers cost about as much as the mean of all the years whatever the
+    number and width of the windows. The means of a window are equal,
+    up to rounding, to those of a build of the years of the window.
+    """
+
+    def __init__(self, *widths):
+        if not widths or any(width < 1 for width in widths):
+            msg = "Window widths must be positive integers."
+            raise AggregationError(msg)
+        self.widths = widths
+
+    def windows(self, years):
+        """ Return the (first, last) years of each window. """
+        years = sorted(years)
+        windows = []
+        for width in self.widths:
+            for i in range(len(years) - width + 1):
+                windows.append((years[i], years[i + width - 1]))
+        return windows
+
+    def suffixes(self, years):
+        return [""] + [window_suffix(first, last)
+                       for first, last in self.windows(years)]
+
+    def aggregator(self, years):
+        years = sorted(years)
+        # The (start, end) prefix indices of each window.
+        bounds = [(i, i + width)
+                  for width in self.widths
+                  for i in range(len(years) - width + 1)]
+
+        def aggregate(values):
+            sums = [0.0]
+            counts = [0]
+            total = 0.0
+            count = 0
+            for year in years:
+                value = values.get(year)
+                if value is not None:
+                    total += value
+                    count += 1
+                sums.append(total)
+                counts.append(count)
+
+            means = [sum(values.values()) / len(values)]
+            for start, end in bounds:
+                n = counts[end] - counts[start]
+                means.append((sums[end] - sums[start]) / n if n else None)
+            return means
+        return aggregate
+
+    def __repr__(self):
+        return "WindowLayers({})".format(", ".join(map(str, self.widths)))
+
+
+MEAN = MeanAggregation()
+
+
+def row_aggregator(aggregation, years):
+    """
+    Return a function of the sequence of the values of the years of a
+    coordinate, NaN for a year without a value, returning the list of
+    its values in each layer of aggregation.
+
+    The mean of MeanAggregation is computed from the sequence, that of
+    other aggregations from the dict of the year values.
+    """
+    if type(aggregation) is MeanAggregation:
+        def aggregate_mean(values):
+            total = sum(values)
+            # The sum is NaN if a year has no value.
+            if total != total:
+                values = [value for value in values if value == value]
+                total = sum(values)
+            return [total / len(values)]
+        return aggregate_mean
+
+    aggregate = aggregation.aggregator(years)
+    years = list(years)
+
+    def aggregate_values(values):
+        return aggregate({year: value
+                          for year, value in zip(years, values)
+                          if value == value})
+    return aggregate_values
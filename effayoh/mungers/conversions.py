@@ -0,0 +1,135 @@
+"""
+Provide the declarative conversions of the data mungers.
+
+The mungers convert the value of each coordinate of their data, e.g. an
+(item, element) coordinate of the FAO data, and combine the converted
+values of the coordinates of a group into a network attribute. Any
+callable can be set as a conversion, but a munger applies declarative
+conversions without a Python call per value:
+
+    munger.set_item_element_conversion(WHEAT, FOOD, Factor(3340.0))
+    munger.set_element_items_group_conversion(
+        EXPORT_TONNES,
+        items_group,
+        WeightedSum(calories_per_ton)
+    )
+
+A munger converts the values of its coordinates in bulk, see
+apply_conversions: the rows of its data are grouped by the key of their
+conversion, e.g. their (item, element), once per munge, the values of
+the rows of a Factor conversion are multiplied by the factor group by
+group and other conversions are only called on the values of the rows
+of their keys. The rows without a conversion are left unchanged. The
+group conversions that are a Sum, the default, or a
+WeightedSum reduce the (key, value) pairs of a group as they are
+iterated, without building a dict of the values of each group.
+
+Declarative conversions are callables that compute the same values as
+the equivalent functions, so they can be applied by any code expecting
+a conversion function.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+
+class ConversionError(Exception): pass
+
+
+class Factor:
+
+    """ Multiply a value by a constant factor. """
+
+    __slots__ = ["factor"]
+
+    def __init__(self, factor):
+        self.factor = factor
+
+    def __call__(self, value):
+        return value*self.factor
+
+    def __repr__(self):
+        return "Factor({!r})".format(self.factor)
+
+
+class Sum:
+
+    """ Sum the values of a group. """
+
+    def reduce(self, pairs):
+        """ Return the conversion of an iterable of (key, value) pairs. """
+        return sum(value for _, value in pairs)
+
+    def __call__(self, values):
+        return self.reduce(values.items())
+
+    def __repr__(self):
+        return "Sum()"
+
+
+class WeightedSum(Sum):
+
+    """
+    Sum the values of a group, each multiplied by the weight of its key.
+    """
+
+    def __init__(self, weights):
+        self.weights = dict(weights)
+
+    def reduce(self, pairs):
+        weights = self.weights
+        try:
+            return sum(weights[key]*value for key, value in pairs)
+        except KeyError as e:
+            msg = "WeightedSum has no weight for {!r}.".format(e.args[0])
+            raise ConversionError(msg)
+
+    def __repr__(self):
+        return "WeightedSum({!r})".format(self.weights)
+
+
+SUM = Sum()
+
+
+def apply_conversions(table, layers, conversions, dimensions):
+    """
+    Convert the values of layers in place, table is left unchanged.
+
+    layers is a list of arrays of a value per row of table, NaN for a
+    row without a value, and conversions a dict of conversions keyed on
+    the tuples of the keys of the rows in dimensions, e.g. the (item,
+    element) of the rows of the FAO data. The rows of each key are
+    found in one pass over the coordinates of table, the values of the
+    rows of a Factor are multiplied by its factor and the other
+    conversions are called on the values of their rows only.
+    """
+    if not conversions:
+        return
+    positions = [table.dimensions.index(name) for name in dimensions]
+    # The conversion of the codes of each key of the table.
+    code_conversions = {}
+    for key, conversion in conversions.items():
+        codes = tuple(table.codes[i].get(k) for i, k in zip(positions, key))
+        if None not in codes:
+            code_conversions[codes] = conversion
+    if not code_conversions:
+        return
+
+    key_rows = {}
+    columns = [table.coordinates[i] for i in positions]
+    for row, codes in enumerate(zip(*columns)):
+        if codes in code_conversions:
+            key_rows.setdefault(codes, []).append(row)
+
+    for codes, rows in key_rows.items():
+        conversion = code_conversions[codes]
+        if isinstance(conversion, Factor):
+            factor = conversion.factor
+            for layer in layers:
+                for row in rows:
+                    layer[row] *= factor
+        else:
+            for layer in layers:
+                for row in rows:
+                    value = layer[row]
+                    if value == value:
+                        layer[row] = conversion(value)
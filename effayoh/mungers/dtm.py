@@ -15,6 +15,9 @@ a group of elements. Often we will want to combine the values of each
 coordinate. The DTMMunger class exposes a dict item_group_conversions
 for this purpose.
 
+Factor and WeightedSum conversions, see effayoh.mungers.conversions,
+are applied without a function call per value.
+
 """
 from __future__ import division, absolute_import, print_function
 from builtins import super
@@ -22,12 +25,26 @@ from builtins import super
 import os
 import csv
 import io
+from array import array
 
-from effayoh.util import FAOSTAT_DIR
+from effayoh import instrumentation
+from effayoh.util import FAOSTAT_DIR, FAOSTAT_ENCODING
 from effayoh.mungers import FAOCountry
+from effayoh.mungers.aggregation import (
+    MEAN, commodity_groups, row_aggregator
+)
+from effayoh.mungers.conversions import SUM, Sum, apply_conversions
+from effayoh.mungers.storage import (
+    NAN, CoordinateTable, NestedView, as_table
+)
 from effayoh.resources.faostat import map as map_
 
 
+# The dimensions of the coordinates of the data, see
+# effayoh.mungers.storage.
+DIMENSIONS = ("reporter", "partner", "element", "item")
+
+
 class DTMItem(tuple):
 
     __slots__ = []
@@ -42,6 +59,10 @@ class DTMItem(tuple):
             DTMItem.object_pool[obj] = obj
             return obj
 
+    def __getnewargs__(self):
+        # Unpickle through __new__ so that the object is pooled.
+        return tuple(self)
+
 
 class DTMItemGroup(frozenset):
 
@@ -68,6 +89,10 @@ class DTMElement(tuple):
             DTMElement.object_pool[obj] = obj
             return obj
 
+    def __getnewargs__(self):
+        # Unpickle through __new__ so that the object is pooled.
+        return tuple(self)
+
 
 class DTMMunger(object):
     """
@@ -78,6 +103,10 @@ class DTMMunger(object):
     def __init__(self, political_rectifier):
         self.data_path = None
         self.years = None
+        # The number of rows read from the data file and kept by the
+        # last call to get_raw_data.
+        self.rows_read = 0
+        self.rows_kept = 0
         self.items = set()
         self.elements = set()
         self.item_elem_edges = set()
@@ -85,13 +114,36 @@ class DTMMunger(object):
         self.element_items_groups = set()
         self.element_items_group_conversions = {}
         self.political_rectifier = political_rectifier
+        self.aggregation = MEAN
+        self.commodity_layers = []
 
     def set_data_path(self, data_path):
         self.data_path = data_path
 
+    def get_data_path(self):
+        """ Return the path of the detailed trade matrix file. """
+        if self.data_path:
+            return self.data_path
+        return os.path.join(
+            FAOSTAT_DIR,
+            "detailed-trade-matrix",
+            "Trade_DetailedTradeMatrix_E_All_Data.csv"
+        )
+
     def set_years(self, years):
         self.years = years
 
+    def set_aggregation(self, aggregation):
+        """ Set the year aggregation, see effayoh.mungers.aggregation. """
+        self.aggregation = aggregation
+
+    def set_commodity_layers(self, commodity_layers):
+        """
+        Set the (name, items) commodity layers, see
+        effayoh.mungers.aggregation.commodity_groups.
+        """
+        self.commodity_layers = commodity_layers
+
     def add_item(self, item):
         self.items.add(item)
 
@@ -166,83 +218,144 @@ class DTMMunger(object):
         key = (element, items_group)
         self.element_items_group_conversions[key] = conversion
 
-    def munge(self):
+    def munge(self, data=None):
         """
         Extract and process data in the FAO Detailed Trade Matrix.
+
+        The values of the years are aggregated into the layers of the
+        year aggregation of the munger, by default their mean, and the
+        groups are converted in each commodity layer of the munger, see
+        effayoh.mungers.aggregation.
+
+        Parameters
+        ----------
+        data:
+            The data returned by get_raw_data, e.g. in another process,
+            by default the data is read by this call.
         """
-        data = self.get_raw_data()
-
-        # Apply the (item, element)-wise conversions.
-        for reporter_country, partners in data.items():
-            for partner_country, elements in partners.items():
-                for element, items in elements.items():
-                    for item, years in items.items():
-                        # Items in element-items groups will also be
-                        # processed to obtain value here.
-                        mean = sum(years.values()) / len(years)
-                        func = self.item_element_conversions.get(
-                            (item, element),
-                            lambda x: x
+        if data is None:
+            with instrumentation.active().timer("parse"):
+                data = self.get_raw_data()
+        table = as_table(data, DIMENSIONS, self.years)
+
+        suffixes = self.aggregation.suffixes(self.years)
+        aggregate = row_aggregator(self.aggregation, self.years)
+        # The converted value of each row in each layer, NaN if the row
+        # has no value in the layer.
+        layers = [array("d", [NAN])*len(table) for _ in suffixes]
+        item_keys = table.keys[DIMENSIONS.index("item")]
+        item_codes = table.coordinates[DIMENSIONS.index("item")]
+        # The (reporter, partner, rows) of each element.
+        element_rows = {}
+
+        # Aggregate the values of the years of every row.
+        for row, values in table.rows_values(range(len(table))):
+            for layer, mean in zip(layers, aggregate(values)):
+                if mean is not None:
+                    layer[row] = mean
+
+        # Apply the (item, element)-wise conversions. Items in
+        # element-items groups are also converted here.
+        apply_conversions(table,
+                          layers,
+                          self.item_element_conversions,
+                          ("item", "element"))
+
+        prefixes = table.prefix_rows(3)
+        for (reporter_country, partner_country, element), rows in prefixes:
+            element_rows.setdefault(element, []).append(
+                (reporter_country, partner_country, rows)
+            )
+
+        # Set the (item, element) edges.
+        if self.item_elem_edges:
+            for (reporter_country, partner_country, element), rows in \
+                    prefixes:
+                for row in rows:
+                    item = item_keys[item_codes[row]]
+                    if (item, element) not in self.item_elem_edges:
+                        continue
+                    for suffix, layer in zip(suffixes, layers):
+                        value = layer[row]
+                        if value != value:
+                            continue
+                        self.set_network_item_element_edge(
+                            reporter_country,
+                            partner_country,
+                            item,
+                            element,
+                            value,
+                            suffix
                         )
-                        value = func(mean)
-                        items[item] = value
-
-                        if (item, element) in self.item_elem_edges:
-                            self.set_network_item_element_edge(
-                                reporter_country,
-                                partner_country,
-                                item,
-                                element,
-                                value
-                            )
+        self.data = NestedView(table, layers[0])
 
         # Apply the element-items-group conversions.
-        for element, items_group in self.element_items_groups:
-            for reporter_country, partners in data.items():
-                for partner_country, elements in partners.items():
-                    if not element in elements:
+        for year_suffix, layer in zip(suffixes, layers):
+            for element, items_group in self.element_items_groups:
+                func = self.element_items_group_conversions.get(
+                    (element, items_group),
+                    SUM
+                )
+                reduce_pairs = None
+                if isinstance(func, Sum):
+                    reduce_pairs = func.reduce
+                groups = commodity_groups(items_group,
+                                          self.commodity_layers,
+                                          year_suffix)
+                for reporter_country, partner_country, rows in \
+                        element_rows.get(element, ()):
+                    # The items of the element with a value in the layer.
+                    items = [(item_keys[item_codes[row]], layer[row])
+                             for row in rows
+                             if layer[row] == layer[row]]
+                    if not items:
                         continue
-                    items = elements[element]
-                    args = {item: items[item]
-                            for item in items
-                            if item in items_group}
-                    func = self.element_items_group_conversions.get(
-                        (element, items_group),
-                        lambda x: sum(x.values())
-                    )
-                    value = func(args)
-                    self.set_element_items_group_network_edge(
-                        reporter_country,
-                        partner_country,
-                        element,
-                        items_group,
-                        value
-                    )
+                    for suffix, group, commodity in groups:
+                        # The edges of a commodity layer are those with
+                        # an item of the commodity.
+                        if commodity is not None and not any(
+                                item in commodity for item, _ in items):
+                            continue
+                        pairs = ((item, tons)
+                                 for item, tons in items
+                                 if item in group)
+                        if reduce_pairs is not None:
+                            value = reduce_pairs(pairs)
+                        else:
+                            value = func(dict(pairs))
+                        self.set_element_items_group_network_edge(
+                            reporter_country,
+                            partner_country,
+                            element,
+                            items_group,
+                            value,
+                            suffix
+                        )
 
     def get_raw_data(self):
         """
-        Return a dict of trade matrix data.
+        Return the trade matrix data.
 
-        The dict is five dimensional keyed on: Reporter Country, Partner
+        The data is held in a CoordinateTable of the DIMENSIONS, see
+        effayoh.mungers.storage, and returned as a NestedView of five
+        dimensional nested dicts keyed on: Reporter Country, Partner
         Country, Element, Item and Year.
         """
-        if self.data_path:
-            data_path = self.data_path
-        else:
-            data_path = os.path.join(
-                FAOSTAT_DIR,
-                "detailed-trade-matrix",
-                "Trade_DetailedTradeMatrix_E_All_Data.csv"
-            )
+        data_path = self.get_data_path()
 
-        data = {}
+        table = CoordinateTable(DIMENSIONS, self.years)
         years_fields = [(year, "Y" + str(year)) for year in self.years]
+        rows_read = rows_kept = 0
 
-        with io.open(data_path, mode='rb') as csv_file:
+        with io.open(data_path,
+                     mode='r',
+                     newline='',
+                     encoding=FAOSTAT_ENCODING) as csv_file:
 
             reader = csv.DictReader(csv_file)
 
             for row in reader:
+                rows_read += 1
 
                 item = DTMItem(row["Item"], row["Item Code"])
                 if not item in self.items:
@@ -255,8 +368,7 @@ class DTMMunger(object):
                 # The row has one of the target item codes and one of
                 # the target element codes but it might not have a value
                 # for any of the years. We do the check here to avoid
-                # creating chains of dicts in the data that ultimately
-                # have no values.
+                # adding coordinates to the data that have no values.
                 years_values = []
                 for year, field in years_fields:
                     try:
@@ -282,25 +394,27 @@ class DTMMunger(object):
                 if not (reporter_country in map_ and partner_country in map_):
                     continue
 
-                partners_dict = data.setdefault(reporter_country, {})
-                element_dict = partners_dict.setdefault(partner_country, {})
-                item_dict = element_dict.setdefault(element, {})
-                years_dict = item_dict.setdefault(item, {})
-
-                for year, value in years_values:
-                    years_dict[year] = value
+                rows_kept += 1
+                table.add(
+                    (reporter_country, partner_country, element, item),
+                    years_values
+                )
 
-        self.data = data
+        table.finish()
+        self.rows_read = rows_read
+        self.rows_kept = rows_kept
+        self.data = NestedView(table)
 
-        return data
+        return self.data
 
     def set_network_item_element_edge(self,
                                       reporter_country,
                                       partner_country,
                                       item,
                                       element,
-                                      value):
-        name = "_".join([item[0], element[0]])
+                                      value,
+                                      suffix=""):
+        name = "_".join([item[0], element[0]]) + suffix
         self.political_rectifier.set_network_edge(
             reporter_country,
             partner_country,
@@ -313,10 +427,11 @@ class DTMMunger(object):
                                              partner_country,
                                              element,
                                              items_group,
-                                             value):
+                                             value,
+                                             suffix=""):
         self.political_rectifier.set_network_edge(
             reporter_country,
             partner_country,
-            items_group.attr_name,
+            items_group.attr_name + suffix,
             value
         )
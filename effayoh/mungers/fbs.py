@@ -8,12 +8,29 @@ from builtins import super
 import os
 import csv
 import io
+import logging
+from array import array
 
-from effayoh.util import FAOSTAT_DIR
+from effayoh import instrumentation
+from effayoh.logs import fields
+from effayoh.util import FAOSTAT_DIR, FAOSTAT_ENCODING
 from effayoh.mungers import FAOCountry
+from effayoh.mungers.aggregation import (
+    MEAN, commodity_groups, row_aggregator
+)
+from effayoh.mungers.conversions import SUM, Sum, apply_conversions
+from effayoh.mungers.storage import (
+    NAN, CoordinateTable, NestedView, as_table
+)
 from effayoh.resources.faostat import map as map_
 
 
+log = logging.getLogger(__name__)
+
+# The dimensions of the coordinates of the data, see
+# effayoh.mungers.storage.
+DIMENSIONS = ("country", "item", "element")
+
 
 class FBSItem(tuple):
 
@@ -29,6 +46,10 @@ class FBSItem(tuple):
             FBSItem.object_pool[obj] = obj
             return obj
 
+    def __getnewargs__(self):
+        # Unpickle through __new__ so that the object is pooled.
+        return tuple(self)
+
 
 class FBSItemGroup(frozenset):
 
@@ -50,6 +71,10 @@ class FBSElement(tuple):
             FBSElement.object_pool[obj] = obj
             return obj
 
+    def __getnewargs__(self):
+        # Unpickle through __new__ so that the object is pooled.
+        return tuple(self)
+
 
 class FBSElementGroup(frozenset):
 
@@ -100,19 +125,46 @@ class FBSMunger(object):
     def __init__(self, political_rectifier):
         self.data_path = None
         self.years = None
+        # The number of rows read from the data file and kept by the
+        # last call to get_raw_data.
+        self.rows_read = 0
+        self.rows_kept = 0
         self.items = set()
         self.elements = set()
         self.item_element_conversions = {}
         self.items_elements_groups = set()
         self.items_elements_groups_conversions = {}
         self.political_rectifier = political_rectifier
+        self.aggregation = MEAN
+        self.commodity_layers = []
 
     def set_data_path(self, data_path):
         self.data_path = data_path
 
+    def get_data_path(self):
+        """ Return the path of the food balance sheet file. """
+        if self.data_path:
+            return self.data_path
+        return os.path.join(
+            FAOSTAT_DIR,
+            "food-balance-sheets",
+            "FoodBalanceSheets_E_All_Data.csv"
+        )
+
     def set_years(self, years):
         self.years = years
 
+    def set_aggregation(self, aggregation):
+        """ Set the year aggregation, see effayoh.mungers.aggregation. """
+        self.aggregation = aggregation
+
+    def set_commodity_layers(self, commodity_layers):
+        """
+        Set the (name, items) commodity layers, see
+        effayoh.mungers.aggregation.commodity_groups.
+        """
+        self.commodity_layers = commodity_layers
+
     def add_item(self, item):
         self.items.add(item)
 
@@ -155,73 +207,137 @@ class FBSMunger(object):
         key = (items_group, elements_group)
         self.items_elements_groups_conversions[key] = conversion
 
-    def munge(self):
+    def munge(self, data=None):
         """
         Extract and process data in FAO Food Balance Sheet.
+
+        The values of the years are aggregated into the layers of the
+        year aggregation of the munger, by default their mean, and the
+        groups are converted in each commodity layer of the munger, see
+        effayoh.mungers.aggregation.
+
+        Parameters
+        ----------
+        data:
+            The data returned by get_raw_data, e.g. in another process,
+            by default the data is read by this call.
         """
-        data = self.get_raw_data()
+        if data is None:
+            with instrumentation.active().timer("parse"):
+                data = self.get_raw_data()
+        table = as_table(data, DIMENSIONS, self.years)
+
+        suffixes = self.aggregation.suffixes(self.years)
+        aggregate = row_aggregator(self.aggregation, self.years)
+        # The converted value of each row in each layer, NaN if the row
+        # has no value in the layer.
+        layers = [array("d", [NAN])*len(table) for _ in suffixes]
+        item_keys = table.keys[DIMENSIONS.index("item")]
+        item_codes = table.coordinates[DIMENSIONS.index("item")]
+        element_keys = table.keys[DIMENSIONS.index("element")]
+        element_codes = table.coordinates[DIMENSIONS.index("element")]
+        # The (country, rows, cells) of each country, cells mapping each
+        # (item, element) of the country to its row.
+        countries = []
+
+        # Aggregate the values of the years of every row.
+        for row, values in table.rows_values(range(len(table))):
+            for layer, mean in zip(layers, aggregate(values)):
+                if mean is not None:
+                    layer[row] = mean
 
         # Apply the item-element conversions.
-        for country, items in data.items():
-            for item, elements in items.items():
-                for element, years in elements.items():
-                    mean = sum(years.values()) / len(years)
-                    key = (item, element)
-                    func = self.item_element_conversions.get(
-                        key,
-                        lambda x: x
-                    )
-                    value = func(mean)
-                    elements[element] = value
+        apply_conversions(table,
+                          layers,
+                          self.item_element_conversions,
+                          ("item", "element"))
+
+        for (country,), rows in table.prefix_rows(1):
+            cells = {}
+            for row in rows:
+                item = item_keys[item_codes[row]]
+                element = element_keys[element_codes[row]]
+                cells[(item, element)] = row
+            countries.append((country, rows, cells))
+        self.data = NestedView(table, layers[0])
 
         # Apply items-elements groups conversions.
-        for group in self.items_elements_groups:
-            gitems, gelements = group.items, group.elements
-            for country, citems in data.items():
+        for year_suffix, layer in zip(suffixes, layers):
+            # The countries with a value in the layer.
+            layer_countries = [(country, cells)
+                               for country, rows, cells in countries
+                               if any(layer[row] == layer[row]
+                                      for row in rows)]
+            # The items of each country with a value in the layer, to
+            # tell the countries of each commodity layer.
+            layer_items = {}
+            if self.commodity_layers:
+                for country, cells in layer_countries:
+                    layer_items[country] = set(
+                        item for (item, _), row in cells.items()
+                        if layer[row] == layer[row]
+                    )
+            for group in self.items_elements_groups:
+                gelements = group.elements
                 func = self.items_elements_groups_conversions.get(
                     group,
-                    lambda x: sum(x.values())
+                    SUM
                 )
-
-                args = {}
-                for gitem in gitems:
-                    if not gitem in citems:
-                        continue
-                    for gelement in gelements:
-                        if not gelement in citems[gitem]:
+                reduce_pairs = None
+                if isinstance(func, Sum):
+                    reduce_pairs = func.reduce
+                gitems_groups = commodity_groups(group.items,
+                                                 self.commodity_layers,
+                                                 year_suffix)
+                for country, cells in layer_countries:
+                    for suffix, gitems, commodity in gitems_groups:
+                        if commodity is not None and \
+                                layer_items[country].isdisjoint(commodity):
                             continue
-                        key = (gitem, gelement)
-                        args[key] = citems[gitem][gelement]
-
-                value = func(args)
-                self.set_network_node_attr(country,
-                                           group.attr_name,
-                                           value)
+                        pairs = []
+                        for gitem in gitems:
+                            for gelement in gelements:
+                                key = (gitem, gelement)
+                                row = cells.get(key)
+                                if row is None or layer[row] != layer[row]:
+                                    continue
+                                pairs.append((key, layer[row]))
+                        if reduce_pairs is not None:
+                            value = reduce_pairs(pairs)
+                        else:
+                            value = func(dict(pairs))
+                        self.set_network_node_attr(
+                            country,
+                            group.attr_name + suffix,
+                            value
+                        )
 
     def get_raw_data(self):
         """
-        Return a dict of country data for the selected items and years.
+        Return the country data for the selected items and years.
 
-        The dict is four dimensional keying on Country, Item, Element
-        and Year.
+        The data is held in a CoordinateTable of the DIMENSIONS, see
+        effayoh.mungers.storage, and returned as a NestedView of four
+        dimensional nested dicts keyed on Country, Item, Element and
+        Year.
         """
-        if self.data_path:
-            data_path = self.data_path
-        else:
-            data_path = os.path.join(
-                FAOSTAT_DIR,
-                "food-balance-sheets",
-                "FoodBalanceSheets_E_All_Data.csv"
-            )
+        data_path = self.get_data_path()
 
-        data = {}
+        table = CoordinateTable(DIMENSIONS, self.years)
         years_fields = [(year, "Y" + str(year)) for year in self.years]
+        rows_read = rows_kept = 0
+        # Count the rows of unmapped countries to log a single summary.
+        unmapped = {}
 
-        with io.open(data_path, mode='rb') as csv_file:
+        with io.open(data_path,
+                     mode='r',
+                     newline='',
+                     encoding=FAOSTAT_ENCODING) as csv_file:
 
             reader = csv.DictReader(csv_file)
 
             for row in reader:
+                rows_read += 1
 
                 item = FBSItem(row["Item"], row["Item Code"])
                 if not item in self.items:
@@ -234,8 +350,7 @@ class FBSMunger(object):
                 # The row has one of the target item codes and one of
                 # the target element codes but it might not have a value
                 # for any of the years. We do the check here to avoid
-                # creating chains of dicts in the data that ultimately
-                # have no values.
+                # adding coordinates to the data that have no values.
                 years_values = []
                 for year, field in years_fields:
                     try:
@@ -253,20 +368,24 @@ class FBSMunger(object):
                 )
 
                 if not country in map_:
-                    msg = "FAOCountry {} is not mapped."
-                    print(msg.format(country))
+                    unmapped[country] = unmapped.get(country, 0) + 1
                     continue
 
-                item_dict = data.setdefault(country, {})
-                elem_dict = item_dict.setdefault(item, {})
-                year_dict = elem_dict.setdefault(element, {})
+                rows_kept += 1
+                table.add((country, item, element), years_values)
 
-                for year, value in years_values:
-                    year_dict[year] = value
+        if unmapped:
+            log.info("%d rows of %d unmapped FAOCountries were skipped.",
+                     sum(unmapped.values()),
+                     len(unmapped),
+                     extra=fields(unmapped=sorted(unmapped)))
 
-        self.data = data
+        table.finish()
+        self.rows_read = rows_read
+        self.rows_kept = rows_kept
+        self.data = NestedView(table)
 
-        return data
+        return self.data
 
     def set_network_node_attr(self, country, name, value):
         self.political_rectifier.set_network_node_attr(
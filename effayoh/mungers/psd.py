@@ -11,10 +11,24 @@ from builtins import super
 
 import os
 import csv
-
+from array import array
+
+from effayoh import instrumentation
+from effayoh.mungers.aggregation import (
+    MEAN, commodity_groups, row_aggregator
+)
+from effayoh.mungers.conversions import SUM, Sum, apply_conversions
+from effayoh.mungers.storage import (
+    NAN, CoordinateTable, NestedView, as_table
+)
 from effayoh.util import PSD_DIR
 
 
+# The dimensions of the coordinates of the data, see
+# effayoh.mungers.storage.
+DIMENSIONS = ("country", "attribute", "commodity")
+
+
 class PSDCommodity(tuple):
 
     __slots__ = []
@@ -29,6 +43,10 @@ class PSDCommodity(tuple):
             PSDCommodity.object_pool[psd_commodity] = psd_commodity
             return psd_commodity
 
+    def __getnewargs__(self):
+        # Unpickle through __new__ so that the object is pooled.
+        return tuple(self)
+
 
 class PSDCommodityGroup(frozenset):
 
@@ -55,6 +73,10 @@ class PSDCountry(tuple):
             PSDCountry.object_pool[tup] = obj
             return obj
 
+    def __getnewargs__(self):
+        # Unpickle through __new__ so that the object is pooled.
+        return tuple(self)
+
 
 class PSDAttribute(tuple):
 
@@ -70,6 +92,11 @@ class PSDAttribute(tuple):
             PSDAttribute.object_pool[tup] = obj
             return obj
 
+    def __getnewargs__(self):
+        # Unpickle through __new__ so that the object is pooled.
+        return tuple(self)
+
+
 class PSDMunger(object):
     """
     Data munger for the USDA PSD data set.
@@ -79,19 +106,42 @@ class PSDMunger(object):
     def __init__(self, political_rectifier):
         self.data_path = None
         self.years = None
+        # The number of rows read from the data file and kept by the
+        # last call to get_raw_data.
+        self.rows_read = 0
+        self.rows_kept = 0
         self.attributes = set()
         self.commodities = set()
         self.attribute_commodity_conversions = {}
         self.attribute_commodities_groups = set()
         self.attribute_commodities_group_conversions = {}
         self.political_rectifier = political_rectifier
+        self.aggregation = MEAN
+        self.commodity_layers = []
 
     def set_data_path(self, data_path):
         self.data_path = data_path
 
+    def get_data_path(self):
+        """ Return the path of the PSD data file. """
+        if self.data_path:
+            return self.data_path
+        return os.path.join(PSD_DIR, "psd_alldata-2017-03-15.csv")
+
     def set_years(self, years):
         self.years = years
 
+    def set_aggregation(self, aggregation):
+        """ Set the year aggregation, see effayoh.mungers.aggregation. """
+        self.aggregation = aggregation
+
+    def set_commodity_layers(self, commodity_layers):
+        """
+        Set the (name, items) commodity layers, see
+        effayoh.mungers.aggregation.commodity_groups.
+        """
+        self.commodity_layers = commodity_layers
+
     def set_attribute_commodity_conversion(self,
                                            attribute,
                                            commodity,
@@ -127,67 +177,117 @@ class PSDMunger(object):
         map_ = self.attribute_commodities_group_conversions
         map_[(attribute, commodities_group)] = conversion
 
-    def munge(self):
+    def munge(self, data=None):
         """
         Extract and process data in the USDA PSD data.
+
+        The values of the years are aggregated into the layers of the
+        year aggregation of the munger, by default their mean, and the
+        groups are converted in each commodity layer of the munger, see
+        effayoh.mungers.aggregation.
+
+        Parameters
+        ----------
+        data:
+            The data returned by get_raw_data, e.g. in another process,
+            by default the data is read by this call.
         """
-        data = self.get_raw_data()
+        if data is None:
+            with instrumentation.active().timer("parse"):
+                data = self.get_raw_data()
+        table = as_table(data, DIMENSIONS, self.years)
+
+        suffixes = self.aggregation.suffixes(self.years)
+        aggregate = row_aggregator(self.aggregation, self.years)
+        # The converted value of each row in each layer, NaN if the row
+        # has no value in the layer.
+        layers = [array("d", [NAN])*len(table) for _ in suffixes]
+        commodity_keys = table.keys[DIMENSIONS.index("commodity")]
+        commodity_codes = table.coordinates[DIMENSIONS.index("commodity")]
+        # The (country, rows) of each attribute.
+        attribute_rows = {}
+
+        # Aggregate the values of the years of every row.
+        for row, values in table.rows_values(range(len(table))):
+            for layer, mean in zip(layers, aggregate(values)):
+                if mean is not None:
+                    layer[row] = mean
 
         # Apply the (attribute, commodity) conversions.
-        for country, attributes in data.items():
-            for attribute, commodities in attributes.items():
-                for commodity, years in commodities.items():
-                    mean = sum(years.values()) / len(years)
-                    func = self.attribute_commodity_conversions.get(
-                        (attribute, commodity),
-                        lambda x: x
-                    )
-                    value = func(mean)
-                    commodities[commodity] = value
+        apply_conversions(table,
+                          layers,
+                          self.attribute_commodity_conversions,
+                          ("attribute", "commodity"))
+
+        for (country, attribute), rows in table.prefix_rows(2):
+            attribute_rows.setdefault(attribute, []).append((country, rows))
+        self.data = NestedView(table, layers[0])
 
         # Apply the (attribute, commodities-group) conversions.
-        for attribute, cm_group in self.attribute_commodities_groups:
-            for country, attributes in data.items():
-                if not attribute in attributes:
-                    continue
-                commodities = attributes[attribute]
-                args = {cm: commodities[cm]
-                        for cm in commodities
-                        if cm in cm_group}
+        for year_suffix, layer in zip(suffixes, layers):
+            for attribute, cm_group in self.attribute_commodities_groups:
                 func = self.attribute_commodities_group_conversions.get(
                     (attribute, cm_group),
-                    # If no (attribute, commodities-group) conversion
-                    # is available, the default conversion unpacks the
-                    # 2-key (commodity, year) dict and sums its values.
-                    lambda x: sum(x.values())
-                )
-                value = func(args)
-                self.set_network_node_attr(
-                    country,
-                    cm_group.attr_name,
-                    value
+                    # If no (attribute, commodities-group) conversion is
+                    # available, the default conversion sums the values
+                    # of the commodities.
+                    SUM
                 )
+                reduce_pairs = None
+                if isinstance(func, Sum):
+                    reduce_pairs = func.reduce
+                groups = commodity_groups(cm_group,
+                                          self.commodity_layers,
+                                          year_suffix)
+                for country, rows in attribute_rows.get(attribute, ()):
+                    # The commodities of the attribute with a value in
+                    # the layer.
+                    commodities = [(commodity_keys[commodity_codes[row]],
+                                    layer[row])
+                                   for row in rows
+                                   if layer[row] == layer[row]]
+                    if not commodities:
+                        continue
+                    for suffix, group, commodity in groups:
+                        # The nodes of a commodity layer are those with
+                        # a commodity of the layer.
+                        if commodity is not None and not any(
+                                cm in commodity for cm, _ in commodities):
+                            continue
+                        pairs = ((cm, amount)
+                                 for cm, amount in commodities
+                                 if cm in group)
+                        if reduce_pairs is not None:
+                            value = reduce_pairs(pairs)
+                        else:
+                            value = func(dict(pairs))
+                        self.set_network_node_attr(
+                            country,
+                            cm_group.attr_name + suffix,
+                            value
+                        )
 
     def get_raw_data(self):
         """
-        Return a dict of PSD data.
+        Return the PSD data.
 
-        The dict is four dimensional keyed on country, attribute,
-        commodity and year.
+        The data is held in a CoordinateTable of the DIMENSIONS, see
+        effayoh.mungers.storage, and returned as a NestedView of four
+        dimensional nested dicts keyed on country, attribute, commodity
+        and year.
         """
-        if self.data_path:
-            data_path = self.data_path
-        else:
-            data_path = os.path.join(PSD_DIR, "psd_alldata-2017-03-15.csv")
+        data_path = self.get_data_path()
 
-        data = {}
+        table = CoordinateTable(DIMENSIONS, self.years)
         years = {str(year): year for year in self.years}
+        rows_read = rows_kept = 0
 
         with open(data_path) as csv_file:
 
             reader = csv.DictReader(csv_file)
 
             for row in reader:
+                rows_read += 1
 
                 aid = row["Attribute_ID"]
                 adesc = row["Attribute_Description"]
@@ -211,16 +311,16 @@ class PSDMunger(object):
 
                 value = float(row["Value"])
 
-                attr_dict = data.setdefault(country, {})
-                commodity_dict = attr_dict.setdefault(attribute, {})
-                year_dict = commodity_dict.setdefault(commodity, {})
-
-                year = years[market_year]
-                year_dict[year] = value
+                rows_kept += 1
+                table.add((country, attribute, commodity),
+                          [(years[market_year], value)])
 
-        self.data = data
+        table.finish()
+        self.rows_read = rows_read
+        self.rows_kept = rows_kept
+        self.data = NestedView(table)
 
-        return data
+        return self.data
 
     def set_network_node_attr(self, country, name, value):
         self.political_rectifier.set_network_node_attr(
@@ -0,0 +1,245 @@
+"""
+Provide the compact storage of the data of the mungers.
+
+The mungers read the values of the years of the coordinates of their
+data, e.g. the exports of an (element, item) from a reporter to a
+partner country. A CoordinateTable holds them as a row per coordinate:
+the dimensions of the coordinates are integer coded, the key of each
+code, e.g. the FAOCountry of a reporter, being held once, and the
+values of the years of every row are held in a single array of floats,
+NaN for a year without a value. A table costs a few bytes per value
+where nested dicts of the coordinates cost a dict per coordinate
+prefix and per coordinate.
+
+The rows of a table are in the order in which their coordinates were
+first added. prefix_rows groups the rows of each coordinate prefix, e.g.
+the rows of the elements and items of a (reporter, partner) pair, in the
+order in which nested dicts of the coordinates would iterate them.
+
+NestedView presents a table as read only nested dicts keyed on its
+dimensions, e.g. data[reporter][partner][element][item][year], for code
+written against the nested dicts the mungers used to hold.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from array import array
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class StorageError(Exception): pass
+
+
+NAN = float("nan")
+
+
+class CoordinateTable:
+
+    """
+    A table of the year values of coordinates with integer coded
+    dimensions.
+
+    Parameters
+    ----------
+    dimensions:
+        The names of the dimensions of the coordinates, e.g. ("reporter",
+        "partner", "element", "item").
+    years:
+        The years of the values of each coordinate, in order.
+    """
+
+    def __init__(self, dimensions, years):
+        self.dimensions = tuple(dimensions)
+        self.years = list(years)
+        self.positions = {year: i for i, year in enumerate(self.years)}
+        # The key of each code and the code of each key of a dimension.
+        self.keys = [[] for _ in self.dimensions]
+        self.codes = [{} for _ in self.dimensions]
+        # The code of each row in each dimension.
+        self.coordinates = [array("i") for _ in self.dimensions]
+        self.values = array("d")
+        # The values of a row without a value.
+        self.missing = array("d", [NAN])*len(self.years)
+        # The row of each coordinate, until finish.
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.coordinates[0])
+
+    def add(self, coordinate, years_values):
+        """
+        Set the values of the (year, value) pairs of a coordinate, a
+        tuple of a key per dimension.
+        """
+        rows = self.rows
+        if rows is None:
+            raise StorageError("The table is finished.")
+        row = rows.get(coordinate)
+        if row is None:
+            row = rows[coordinate] = len(self)
+            for keys, codes, column, key in zip(self.keys,
+                                                self.codes,
+                                                self.coordinates,
+                                                coordinate):
+                code = codes.get(key)
+                if code is None:
+                    code = codes[key] = len(keys)
+                    keys.append(key)
+                column.append(code)
+            self.values.extend(self.missing)
+
+        values = self.values
+        positions = self.positions
+        start = row*len(self.years)
+        try:
+            for year, value in years_values:
+                values[start + positions[year]] = value
+        except KeyError as e:
+            msg = "{!r} is not a year of the table.".format(e.args[0])
+            raise StorageError(msg)
+
+    def finish(self):
+        """ Release the index of the rows used to add coordinates. """
+        self.rows = None
+
+    def key(self, row):
+        """ Return the coordinate of row, a tuple of keys. """
+        return tuple(keys[column[row]]
+                     for keys, column in zip(self.keys, self.coordinates))
+
+    def year_values(self, row):
+        """ Return the dict of the values of the years of row. """
+        width = len(self.years)
+        start = row*width
+        return {year: value
+                for year, value
+                in zip(self.years, self.values[start:start + width])
+                if value == value}
+
+    def rows_values(self, rows):
+        """
+        Return an iterator of the (row, values) tuples of rows, values
+        the array of the values of the years of the row, NaN for a year
+        without a value.
+        """
+        values = self.values
+        width = len(self.years)
+        for row in rows:
+            start = row*width
+            yield row, values[start:start + width]
+
+    def prefix_rows(self, depth):
+        """
+        Return the (prefix, rows) tuples of the coordinate prefixes of
+        length depth, prefix a tuple of keys and rows the list of the
+        rows of the prefix, in the order of nested dicts of the
+        coordinates.
+        """
+        # The first row of each prefix of each length up to depth.
+        firsts = [{} for _ in range(depth)]
+        groups = {}
+        previous = rows = None
+        for row, codes in enumerate(zip(*self.coordinates[:depth])):
+            # The rows of a prefix are mostly consecutive.
+            if codes != previous:
+                previous = codes
+                rows = groups.get(codes)
+                if rows is None:
+                    rows = groups[codes] = []
+                    for i, first in enumerate(firsts):
+                        first.setdefault(codes[:i + 1], row)
+            rows.append(row)
+
+        def nested_order(codes):
+            return tuple(first[codes[:i + 1]]
+                         for i, first in enumerate(firsts))
+
+        return [(tuple(keys[code] for keys, code in zip(self.keys, codes)),
+                 groups[codes])
+                for codes in sorted(groups, key=nested_order)]
+
+    @classmethod
+    def from_nested(cls, data, dimensions, years):
+        """
+        Return the table of nested dicts of data keyed on dimensions
+        whose leaves are dicts of the values of the years.
+        """
+        table = cls(dimensions, years)
+        depth = len(table.dimensions)
+        pending = [((), data)]
+        while pending:
+            prefix, level = pending.pop()
+            if len(prefix) == depth:
+                table.add(prefix, level.items())
+                continue
+            # Push in reverse to add the coordinates in nested order.
+            pending.extend(reversed([(prefix + (key,), child)
+                                     for key, child in level.items()]))
+        table.finish()
+        return table
+
+
+def as_table(data, dimensions, years):
+    """
+    Return the CoordinateTable of data, a table, a view of a table or
+    nested dicts, e.g. returned by the get_raw_data of a subclass.
+    """
+    if isinstance(data, CoordinateTable):
+        return data
+    if isinstance(data, NestedView):
+        return data.table
+    return CoordinateTable.from_nested(data, dimensions, years)
+
+
+class NestedView(Mapping):
+
+    """
+    A read only view of a CoordinateTable as nested dicts keyed on its
+    dimensions.
+
+    The leaves of the view are the dicts of the values of the years of
+    each row or, if values is given, the value of each row in values, an
+    array of a value per row.
+    """
+
+    def __init__(self, table, values=None, rows=None, depth=0):
+        self.table = table
+        self.values = values
+        self.rows = rows
+        self.depth = depth
+        self._children = None
+
+    def children(self):
+        """ Return an ordered dict of the rows of each key. """
+        if self._children is None:
+            column = self.table.coordinates[self.depth]
+            keys = self.table.keys[self.depth]
+            rows = self.rows
+            if rows is None:
+                rows = range(len(self.table))
+            children = OrderedDict()
+            for row in rows:
+                children.setdefault(keys[column[row]], []).append(row)
+            self._children = children
+        return self._children
+
+    def __getitem__(self, key):
+        rows = self.children()[key]
+        if self.depth < len(self.table.dimensions) - 1:
+            return NestedView(self.table, self.values, rows, self.depth + 1)
+        if self.values is None:
+            return self.table.year_values(rows[0])
+        return self.values[rows[0]]
+
+    def __iter__(self):
+        return iter(self.children())
+
+    def __len__(self):
+        return len(self.children())
+
+    def __repr__(self):
+        return "NestedView({!r})".format(dict(self))
@@ -0,0 +1,188 @@
+"""
+Provide an event log recorder.
+
+The event log recorder keeps a snapshot of the network taken before the
+first iteration and logs every change an iteration makes to the network
+as an event: the change of the exports of each adjusted trade link and
+the update of each shocked node. The events are held in typed arrays,
+so the log costs a few dozen bytes per event, and the state of the
+network after any iteration can be replayed from the snapshot and the
+log without executing the model again.
+
+"""
+
+from array import array
+
+
+class EventLog:
+    """
+    The events logged by an EventLogRecorder.
+
+    Nodes are coded by their index in nodes.
+
+    Attributes
+    ----------
+    nodes:
+        The sorted list of the nodes of the network.
+    edge_iteration, exporter, importer, delta, removed:
+        For each edge event, the iteration, the codes of the exporter
+        and the importer, the change of the exports and whether the
+        exports fell below the threshold and were removed.
+    node_iteration, node, dR, dC, Tshock, shocked:
+        For each node event, the iteration, the code of the node, the
+        decrease of its reserves and consumption, the shock it passed
+        on to its trade partners and whether it is shocked after the
+        update.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.edge_iteration = array("i")
+        self.exporter = array("i")
+        self.importer = array("i")
+        self.delta = array("d")
+        self.removed = array("b")
+        self.node_iteration = array("i")
+        self.node = array("i")
+        self.dR = array("d")
+        self.dC = array("d")
+        self.Tshock = array("d")
+        self.shocked = array("b")
+
+    def edge_events(self):
+        """
+        Return an iterator over the edge events.
+
+        Each event is an (iteration, exporter, importer, delta, removed)
+        tuple.
+        """
+        nodes = self.nodes
+        for i, iteration in enumerate(self.edge_iteration):
+            yield (iteration,
+                   nodes[self.exporter[i]],
+                   nodes[self.importer[i]],
+                   self.delta[i],
+                   bool(self.removed[i]))
+
+    def node_events(self):
+        """
+        Return an iterator over the node events.
+
+        Each event is an (iteration, node, dR, dC, Tshock, shocked)
+        tuple.
+        """
+        nodes = self.nodes
+        for i, iteration in enumerate(self.node_iteration):
+            yield (iteration,
+                   nodes[self.node[i]],
+                   self.dR[i],
+                   self.dC[i],
+                   self.Tshock[i],
+                   bool(self.shocked[i]))
+
+    def cut_edges(self):
+        """ Return the list of the (iteration, exporter, importer) cuts. """
+        return [(iteration, u, v)
+                for iteration, u, v, delta, removed in self.edge_events()
+                if removed]
+
+
+class EventLogRecorder:
+
+    def __init__(self):
+        self.snapshot = None
+        self.log = None
+        self.index = None
+        self.iterations = 0
+
+    def record(self, network):
+        """ Take the snapshot of network. """
+        self.snapshot = network.copy()
+        self.log = EventLog(sorted(network))
+        self.index = {node: i for i, node in enumerate(self.log.nodes)}
+        self.iterations = 0
+
+    def record_changes(self, network, changes):
+        """ Log the changes of an iteration. """
+        if self.snapshot is None:
+            self.record(network)
+            return
+
+        if self.iterations == 0:
+            # Production is only decreased by the initial shocks, which
+            # are applied after the snapshot is taken.
+            for node, data in network.node.items():
+                self.snapshot.node[node]["production"] = data["production"]
+        self.iterations = changes.iteration
+
+        log = self.log
+        index = self.index
+        iteration = changes.iteration
+        edges = network.edge
+        for (u, v), delta in changes.edges.items():
+            log.edge_iteration.append(iteration)
+            log.exporter.append(index[u])
+            log.importer.append(index[v])
+            log.delta.append(delta)
+            log.removed.append("exports" not in edges[u].get(v, {}))
+        for node, (dR, dC, Tshock) in changes.nodes.items():
+            log.node_iteration.append(iteration)
+            log.node.append(index[node])
+            log.dR.append(dR)
+            log.dC.append(dC)
+            log.Tshock.append(Tshock)
+            log.shocked.append(bool(network.node[node]["shocked"]))
+
+    def replay(self, iteration=None):
+        """
+        Return the network after iteration, or after the last iteration.
+        """
+        return replay(self.snapshot, self.log, iteration)
+
+
+def replay(snapshot, log, iteration=None):
+    """
+    Replay log on a copy of snapshot up to and including iteration.
+
+    The node states are replayed exactly, the exports of the trade
+    links to within rounding error.
+
+    Parameters
+    ----------
+    snapshot:
+        The network before the first iteration.
+    log:
+        The EventLog of the execution.
+    iteration:
+        The last iteration to replay, by default all of them. Iteration
+        0 is the snapshot.
+    """
+    network = snapshot.copy()
+    nodes = log.nodes
+    edge = network.edge
+    for i, it in enumerate(log.edge_iteration):
+        if iteration is not None and it > iteration:
+            break
+        u = nodes[log.exporter[i]]
+        v = nodes[log.importer[i]]
+        data = edge[u][v]
+        if log.removed[i]:
+            data.pop("exports")
+            if not data:
+                network.remove_edge(u, v)
+        else:
+            data["exports"] += log.delta[i]
+
+    node_data = network.node
+    for i, it in enumerate(log.node_iteration):
+        if iteration is not None and it > iteration:
+            break
+        data = node_data[nodes[log.node[i]]]
+        dR = log.dR[i]
+        dC = log.dC[i]
+        data["reserves"] -= dR
+        data["consumption"] -= dC
+        data["supply"] -= (dR + dC)
+        data["shocked"] = bool(log.shocked[i])
+
+    return network
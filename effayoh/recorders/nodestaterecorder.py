@@ -0,0 +1,256 @@
+"""
+Provide a node state recorder.
+
+The node state recorder records the state of every node of the network
+before the first iteration and after every iteration. The records are
+held in preallocated chunks of a flat array of floats laid out as
+(iterations, nodes, fields), so recording an iteration copies the
+previous record in one block and then only reads the nodes updated by
+the iteration.
+
+The records are exposed as a flat typed buffer with node and field
+labels, which can be written to a file as is or wrapped in a NumPy
+array without copying.
+
+The streaming node state recorder holds a single record and streams the
+records to a record file instead, see effayoh.recorders.recordsink, from
+which its values and series are read back once it is finished.
+
+"""
+
+from array import array
+from builtins import super
+
+from effayoh.recorders.recordsink import RecordFile, RecordSink
+
+
+class NodeStateRecorderError(Exception): pass
+
+
+class NodeStateRecorder:
+
+    # The node attributes to record. The shocked flag is recorded as
+    # 0.0 or 1.0.
+    fields = ("reserves", "consumption", "supply", "shocked")
+
+    # The number of iterations held by each preallocated chunk. Set it
+    # to the max_iterations of the model, plus one for the initial
+    # record, to allocate the records once.
+    chunk_iterations = 64
+
+    def __init__(self):
+        self.nodes = None
+        self.index = None
+        self.chunks = []
+        self.iterations = 0
+
+    @property
+    def row_size(self):
+        return len(self.nodes)*len(self.fields)
+
+    def record(self, network):
+        """ Record the state of every node of network. """
+        if self.nodes is None:
+            self.nodes = sorted(network)
+            self.index = {node: i for i, node in enumerate(self.nodes)}
+        chunk, offset = self._next_row()
+        nfields = len(self.fields)
+        for i, node in enumerate(self.nodes):
+            self._write_node(chunk, offset + i*nfields, network.node[node])
+
+    def record_changes(self, network, changes):
+        """
+        Record the state of network after an iteration.
+
+        The previous record is copied and the nodes updated by the
+        iteration are read from network.
+        """
+        if self.nodes is None:
+            self.record(network)
+            return
+        size = self.row_size
+        previous, previous_offset = self._row(self.iterations - 1)
+        chunk, offset = self._next_row()
+        chunk[offset:offset + size] = \
+            previous[previous_offset:previous_offset + size]
+        nfields = len(self.fields)
+        index = self.index
+        for node in changes.nodes:
+            self._write_node(chunk,
+                             offset + index[node]*nfields,
+                             network.node[node])
+
+    def _write_node(self, chunk, offset, data):
+        for j, field in enumerate(self.fields):
+            chunk[offset + j] = float(data.get(field, 0.0))
+
+    def _row(self, iteration):
+        chunk_index, row = divmod(iteration, self.chunk_iterations)
+        return self.chunks[chunk_index], row*self.row_size
+
+    def _next_row(self):
+        if self.iterations == len(self.chunks)*self.chunk_iterations:
+            size = self.chunk_iterations*self.row_size
+            self.chunks.append(array("d", bytes(8*size)))
+        row = self._row(self.iterations)
+        self.iterations += 1
+        return row
+
+    @property
+    def shape(self):
+        """ The (iterations, nodes, fields) shape of the records. """
+        nodes = len(self.nodes) if self.nodes is not None else 0
+        return (self.iterations, nodes, len(self.fields))
+
+    def values(self):
+        """
+        Return the records as a flat array of shape self.shape.
+
+        The records of a single chunk are returned as a memoryview of
+        the chunk without copying.
+        """
+        if not self.chunks:
+            return array("d")
+        size = self.iterations*self.row_size
+        if len(self.chunks) == 1:
+            return memoryview(self.chunks[0])[:size]
+        values = array("d")
+        for chunk in self.chunks:
+            values.extend(chunk)
+        del values[size:]
+        return values
+
+    def column_index(self, node, field):
+        """ Return the index of node's field in a record. """
+        return self.index[node]*len(self.fields) + self.fields.index(field)
+
+    def series(self, node, field):
+        """ Return the list of the recorded values of node's field. """
+        offset = self.column_index(node, field)
+        series = []
+        for i in range(self.iterations):
+            chunk, row = self._row(i)
+            series.append(chunk[row + offset])
+        return series
+
+    def to_numpy(self):
+        """
+        Return the records as a NumPy array of shape self.shape.
+
+        The array shares the memory of the records when they fit in a
+        single chunk. NumPy is only required by this method.
+        """
+        import numpy
+
+        return numpy.frombuffer(self.values(), dtype=numpy.float64)\
+                    .reshape(self.shape)
+
+    def tofile(self, fh):
+        """
+        Write the records to the binary file object fh.
+
+        The records are written as native float64 values in
+        (iterations, nodes, fields) order, see shape, nodes and fields
+        for the labels.
+        """
+        fh.write(memoryview(self.values()).cast("B"))
+
+
+class StreamingNodeStateRecorder(NodeStateRecorder):
+    """
+    Stream the node states to a record file.
+
+    The header of the record file holds the nodes, the fields and the
+    (nodes, fields) shape of a record. A recorder writes a single run,
+    pass a path per run, for instance with functools.partial:
+
+        builder.add_recorder(partial(StreamingNodeStateRecorder, path))
+
+    Parameters
+    ----------
+    path:
+        The path of the record file.
+    max_pending:
+        The number of records that may be queued for writing.
+    """
+
+    chunk_iterations = 1
+
+    def __init__(self, path, max_pending=64):
+        super().__init__()
+        self.path = path
+        self.max_pending = max_pending
+        self.sink = None
+
+    def record(self, network):
+        super().record(network)
+        self._write()
+
+    def record_changes(self, network, changes):
+        if self.nodes is None:
+            self.record(network)
+            return
+        super().record_changes(network, changes)
+        self._write()
+
+    def _row(self, iteration):
+        # Every record is made in place of the previous one.
+        return self.chunks[0], 0
+
+    def _next_row(self):
+        if not self.chunks:
+            self.chunks.append(array("d", bytes(8*self.row_size)))
+        self.iterations += 1
+        return self.chunks[0], 0
+
+    def _write(self):
+        if self.sink is None:
+            header = {
+                "nodes": self.nodes,
+                "fields": list(self.fields),
+                "shape": [len(self.nodes), len(self.fields)],
+            }
+            self.sink = RecordSink(self.path,
+                                   header,
+                                   self.row_size,
+                                   self.max_pending)
+        self.sink.write(self.chunks[0])
+
+    def finish(self):
+        """ Write the queued records and close the record file. """
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+    def values(self):
+        """
+        Return the records read back from the record file as a flat
+        array of shape self.shape.
+
+        The records are copied into memory, use a RecordFile over path
+        to map them instead.
+        """
+        values = array("d")
+        if self.nodes is None:
+            return values
+        with self._record_file() as record_file:
+            values.frombytes(record_file.values.tobytes())
+        return values
+
+    def series(self, node, field):
+        """
+        Return the list of the recorded values of node's field, read
+        back from the record file.
+        """
+        j = self.column_index(node, field)
+        with self._record_file() as record_file:
+            with record_file.column(j) as column:
+                return column.tolist()
+
+    def _record_file(self):
+        if self.sink is not None:
+            raise NodeStateRecorderError(
+                "The records are still being written to {}, call finish "
+                "before reading them.".format(self.path)
+            )
+        return RecordFile(self.path)
@@ -0,0 +1,210 @@
+"""
+Provide a streaming record sink and a reader for its record files.
+
+A RecordSink streams fixed size rows of floats to an append-only record
+file. Rows are queued in a bounded queue and written by a background
+thread, so a recorder holds at most max_pending rows in memory however
+many iterations it records, and blocks when the disk falls behind.
+
+A record file starts with an 8 byte magic string, the length of a JSON
+header as a little endian 4 byte unsigned integer and the header,
+padded with spaces so that the rows start on an 8 byte boundary. The
+rows follow as native float64 values. The header holds the labels of
+the rows, see RecordFile, and the number of rows is given by the size
+of the file, so the file is never rewritten and a run interrupted
+before the sink is closed leaves a readable file of the rows written so
+far.
+
+A RecordFile memory maps a record file, so the records of many runs can
+be analysed without being read into memory.
+
+"""
+
+import json
+import mmap
+import queue
+import struct
+import threading
+
+
+class RecordSinkError(Exception): pass
+
+
+MAGIC = b"EFFREC\x00\x01"
+HEADER_LENGTH = struct.Struct("<I")
+ITEMSIZE = 8
+
+
+def header_bytes(header):
+    """ Return the bytes of a record file preceding the rows. """
+    encoded = json.dumps(header, sort_keys=True).encode("utf-8")
+    start = len(MAGIC) + HEADER_LENGTH.size
+    padding = -(start + len(encoded)) % ITEMSIZE
+    encoded += b" "*padding
+    return MAGIC + HEADER_LENGTH.pack(len(encoded)) + encoded
+
+
+class RecordSink:
+    """
+    Stream rows of floats to an append-only record file.
+
+    Parameters
+    ----------
+    path:
+        The path of the record file, which is created or truncated.
+    header:
+        A JSON serializable dict describing the rows. Its row_size item
+        is set to the number of floats in a row.
+    row_size:
+        The number of floats in a row.
+    max_pending:
+        The number of rows that may be queued before write blocks.
+    """
+
+    def __init__(self, path, header, row_size, max_pending=64):
+        self.path = path
+        self.row_size = row_size
+        self.rows = 0
+        self.error = None
+        header = dict(header, row_size=row_size)
+        self.fh = open(path, "wb")
+        self.fh.write(header_bytes(header))
+        self.queue = queue.Queue(max_pending)
+        self.thread = threading.Thread(target=self._flush_rows,
+                                       name="RecordSink({})".format(path))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, row):
+        """
+        Queue a copy of row, a buffer of row_size floats, for writing.
+        """
+        if self.thread is None:
+            raise RecordSinkError("The sink is closed.")
+        self._raise_error()
+        data = memoryview(row).cast("B").tobytes()
+        if len(data) != self.row_size*ITEMSIZE:
+            raise RecordSinkError(
+                "Expected a row of {} floats.".format(self.row_size)
+            )
+        self.queue.put(data)
+        self.rows += 1
+
+    def close(self):
+        """ Write the queued rows and close the record file. """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.queue = None
+        self.fh.close()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RecordSinkError(
+                "Writing {} failed: {}".format(self.path, self.error)
+            )
+
+    def _flush_rows(self):
+        # Write the queued rows in batches, flushing the file whenever
+        # the queue is drained.
+        done = False
+        while not done:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if self.error is not None:
+                continue
+            try:
+                self.fh.writelines(batch)
+                self.fh.flush()
+            except (IOError, OSError) as e:
+                self.error = e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordFile:
+    """
+    A memory mapped record file.
+
+    Attributes
+    ----------
+    header:
+        The header dict of the file.
+    row_size:
+        The number of floats in a row.
+    rows:
+        The number of complete rows in the file.
+    values:
+        A flat memoryview of the float64 values of the rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fh = open(path, "rb")
+        start = len(MAGIC) + HEADER_LENGTH.size
+        prefix = self.fh.read(start)
+        if len(prefix) < start or prefix[:len(MAGIC)] != MAGIC:
+            self.fh.close()
+            raise RecordSinkError("{} is not a record file.".format(path))
+        length, = HEADER_LENGTH.unpack(prefix[len(MAGIC):])
+        self.header = json.loads(self.fh.read(length).decode("utf-8"))
+        self.row_size = self.header["row_size"]
+        offset = start + length
+        self.map = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+        row_bytes = self.row_size*ITEMSIZE
+        self.rows = (len(self.map) - offset)//row_bytes if row_bytes else 0
+        end = offset + self.rows*row_bytes
+        self.values = memoryview(self.map)[offset:end].cast("d")
+
+    def row(self, i):
+        """ Return a memoryview of the floats of row i. """
+        return self.values[i*self.row_size:(i + 1)*self.row_size]
+
+    def column(self, j):
+        """ Return a strided memoryview of the float j of every row. """
+        return self.values[j::self.row_size]
+
+    def to_numpy(self):
+        """
+        Return the rows as a NumPy array sharing the mapped memory.
+
+        The array has the shape given by the header, if any, with the
+        number of rows as its first dimension. NumPy is only required
+        by this method.
+        """
+        import numpy
+
+        array = numpy.frombuffer(self.values, dtype=numpy.float64)
+        shape = self.header.get("shape", [self.row_size])
+        return array.reshape([self.rows] + list(shape))
+
+    def close(self):
+        """
+        Unmap and close the file.
+
+        Views of the values, including NumPy arrays, must be released
+        first.
+        """
+        self.values.release()
+        self.map.close()
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
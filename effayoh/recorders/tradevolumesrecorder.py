@@ -5,6 +5,10 @@ The trade volume recorder records the changes in total trade volume of a
 collection of countries during model execution. By default, the trade
 volume recorder records trade for all the countries in the network.
 
+The total is counted over the whole network on the first record and
+then updated from the changes of each iteration, so recording costs in
+proportion to the number of edges an iteration adjusted.
+
 """
 
 
@@ -14,6 +18,7 @@ class TradeVolumeRecorder:
 
     def __init__(self):
         self.volumes = []
+        self.total = None
 
     def record(self, network):
         if self.countries:
@@ -21,6 +26,30 @@ class TradeVolumeRecorder:
         else:
             self.record_all(network)
 
+    def record_changes(self, network, changes):
+        """
+        Record the total trade after the changes of an iteration.
+
+        The total is recounted over network if it has not been counted
+        yet.
+        """
+        if self.total is None:
+            self.record(network)
+            return
+
+        acc = self.total
+        countries = self.countries
+        for (u, v), delta in changes.edges.items():
+            if countries and not (u in countries or v in countries):
+                continue
+            acc += delta
+        self.total = acc
+        self.volumes.append(acc)
+
+    def recount(self):
+        """ Recount the total over the network on the next record. """
+        self.total = None
+
     def record_countries(self, network):
         """
         Record total trade for a subset of countries in the network.
@@ -37,6 +66,7 @@ class TradeVolumeRecorder:
                 continue
             acc += data["exports"]
         else:
+            self.total = acc
             self.volumes.append(acc)
 
     def record_all(self, network):
@@ -44,4 +74,5 @@ class TradeVolumeRecorder:
         for u, v, data in network.edges(data=True):
             acc += data["exports"]
         else:
+            self.total = acc
             self.volumes.append(acc)
@@ -5,12 +5,16 @@ Provides the PoliticalRectifier class.
 
 import logging
 
+from effayoh.logs import fields
 from effayoh.rectification.political_entities import FAOPolitEnt
 
 
 class RectificationError(Exception): pass
 
 
+log = logging.getLogger(__name__)
+
+
 class ModelPolitent: pass
 
 
@@ -101,6 +105,12 @@ class PoliticalRectifier:
         self.effpent_to_mpent = {}
         self.filters = []
         self.intragroup_resolvers = {}
+        # Counts of the edges and node attributes set on the network
+        # and of those excluded by the filters.
+        self.edges_set = 0
+        self.edges_filtered = 0
+        self.node_attrs_set = 0
+        self.node_attrs_filtered = 0
 
     def get_effayoh_politent(self, data_politent):
         """
@@ -161,7 +171,9 @@ class PoliticalRectifier:
         """
         if self.filters_exclude(data_source) or\
            self.filters_exclude(data_dest):
+                self.edges_filtered += 1
                 return
+        self.edges_set += 1
 
         mpent_source = self.get_model_politent(data_source)
         mpent_dest = self.get_model_politent(data_dest)
@@ -266,7 +278,9 @@ class PoliticalRectifier:
         # Verify this data-defined political entity should be included
         # in the network.
         if self.filters_exclude(data_politent):
+            self.node_attrs_filtered += 1
             return
+        self.node_attrs_set += 1
 
         # Look up the corresponding model political entity.
         mpent = self.get_model_politent(data_politent)
@@ -402,16 +416,17 @@ class PoliticalRectifier:
             resolver = self.intragroup_resolvers[name]
             resolver(self.network, group, value)
         else:
-            msg = (
+            log.warning(
                 "The PoliticalRecitifer attempted to set an edge that "
                 "is incident upon two political entities in the same "
                 "ComponentPoliticalEntityGroup. No resolver has been "
                 "registered to handle an intragroup edge for the "
-                "attribute {name}. The model build process will "
+                "attribute %s. The model build process will "
                 "proceed ignoring the information associated with the "
-                "requested edge."
+                "requested edge.",
+                name,
+                extra=fields(attribute=name)
             )
-            logging.warning(msg.format(name=name))
 
     def register_model_compound_politent(self, compound):
         """
@@ -5,5 +5,7 @@ TRIPS_BASE = os.environ['TRIPS_BASE']
 EFFAYOH_DIR, _ = os.path.split(__file__)
 RESOURCES_DIR = os.path.join(TRIPS_BASE, "src/ABN2/resources")
 FAOSTAT_DIR = os.path.join(RESOURCES_DIR, "faostat")
+# The FAOSTAT bulk downloads are Latin-1 encoded.
+FAOSTAT_ENCODING = "latin-1"
 USDA_DIR = os.path.join(RESOURCES_DIR, "usda")
 PSD_DIR = os.path.join(USDA_DIR, "psd")
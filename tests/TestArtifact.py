@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from effayoh.marchandmodel.artifact import (
+    ArtifactError, load_compiled, load_model, save_model
+)
+from effayoh.marchandmodel.layers import select_year
+from effayoh.mungers.aggregation import YearLayers
+
+from benchmarks.synthetic import generate, synthetic_builder
+from TestModelExecute import make_builder
+
+
+def population_initializer(network):
+    for node, data in network.nodes(data=True):
+        data["population"] = 1000.0*len(node)
+
+
+class TestArtifact(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "model.effmdl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        """ A loaded model has the network and parameters saved. """
+        builder = make_builder(cascade_version=True)
+        builder.set_artifact_path(self.path)
+        model = builder.build()
+
+        loaded = builder.load(self.path)
+        self.assertEqual(loaded.static_params, model.static_params)
+        self.assertEqual(sorted(loaded.network.nodes(data=True)),
+                         sorted((node, data) for node, data
+                                in model.network.nodes(data=True)))
+        self.assertEqual(sorted(loaded.network.edges(data=True)),
+                         sorted(model.network.edges(data=True)))
+
+        compiled, header = load_compiled(self.path)
+        self.assertEqual(compiled.nodes, sorted(model.network))
+        self.assertEqual(header["provenance"]["fingerprint"],
+                         builder.fingerprint())
+
+    def test_execute(self):
+        """ A loaded model executes exactly as the model saved. """
+        builder = make_builder(cascade_version=True)
+        builder.set_artifact_path(self.path)
+        model = builder.build()
+        loaded = load_model(self.path)
+        for m in (model, loaded):
+            m.set_reproducible()
+            m.set_epicenter("RUSSIA")
+            m.execute()
+
+        self.assertEqual(dict(loaded.network.nodes(data=True)),
+                         dict(model.network.nodes(data=True)))
+
+    def test_not_an_artifact(self):
+        with open(self.path, "wb") as fh:
+            fh.write(b"Reporter Country Code,Reporter Countries\n")
+        with self.assertRaises(ArtifactError):
+            load_model(self.path)
+
+    def test_extra_attributes(self):
+        """ Attributes that are not compiled and layers are saved. """
+        data = generate(os.path.join(self.directory, "data"),
+                        countries=6,
+                        items=2,
+                        years=2,
+                        density=0.5,
+                        seed=8)
+        builder = synthetic_builder(data)
+        builder.set_year_aggregation(YearLayers())
+        builder.add_network_initializer(population_initializer)
+        builder.set_artifact_path(self.path)
+        model = builder.build()
+
+        loaded = builder.load(self.path)
+        for node, data in model.network.nodes(data=True):
+            self.assertEqual(loaded.network.node[node]["population"],
+                             data["population"])
+        self.assertEqual(sorted(loaded.layers), sorted(model.layers))
+        for suffix, layer in model.layers.items():
+            self.assertEqual(sorted(loaded.layers[suffix].edges(data=True)),
+                             sorted(layer.edges(data=True)))
+        year_model = select_year(loaded, builder.years[0])
+        self.assertEqual(sorted(year_model.network.edges(data=True)),
+                         sorted(select_year(model, builder.years[0])
+                                .network.edges(data=True)))
+
+    def test_interrupted_save(self):
+        """ A failed save leaves the previous artifact in place. """
+        builder = make_builder(cascade_version=True)
+        builder.set_artifact_path(self.path)
+        model = builder.build()
+        with open(self.path, "rb") as fh:
+            saved = fh.read()
+
+        # The partial file cannot be written.
+        os.mkdir(self.path + ".partial")
+        with self.assertRaises(EnvironmentError):
+            save_model(model, self.path, {"note": "second"})
+        with open(self.path, "rb") as fh:
+            self.assertEqual(fh.read(), saved)
+        self.assertEqual(load_model(self.path).max_iterations,
+                         model.max_iterations)
+
+
+if __name__ == "__main__":
+    unittest.main()
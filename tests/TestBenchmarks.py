@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.compare import compare, IMPROVED, OK, REGRESSED
+from benchmarks.suite import BENCHMARKS, measure
+from benchmarks.synthetic import (
+    generate, largest_exporter, synthetic_builder
+)
+
+
+class TestSyntheticData(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = generate(self.directory,
+                             countries=8,
+                             items=3,
+                             years=2,
+                             density=0.5,
+                             seed=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build(self):
+        """ The base mungers build a network of the synthetic countries. """
+        model = synthetic_builder(self.data).build()
+        self.assertEqual(sorted(model.network), self.data.countries)
+        self.assertTrue(model.network.number_of_edges() > 0)
+        for node, data in model.network.node.items():
+            for attr in ("production", "reserves", "consumption", "supply"):
+                self.assertIn(attr, data)
+
+        model.set_epicenter(largest_exporter(model))
+        model.execute()
+
+    def test_reproducible(self):
+        """ The same seed generates the same data. """
+        other = generate(self.directory + "/other",
+                         countries=8,
+                         items=3,
+                         years=2,
+                         density=0.5,
+                         seed=1)
+        for path, other_path in zip(self.data[:3], other[:3]):
+            with open(path) as fh, open(other_path) as other_fh:
+                self.assertEqual(fh.read(), other_fh.read())
+
+    def test_measure(self):
+        """ Every benchmark runs and is measured. """
+        for benchmark in BENCHMARKS:
+            result = measure(benchmark, self.data, repeats=2)
+            self.assertEqual(len(result["times"]), 2)
+            self.assertTrue(result["peak_memory"] >= 0)
+
+
+def results(times, peak_memory=1000000):
+    return {"results": [{"name": "build",
+                         "scale": "small",
+                         "times": times,
+                         "peak_memory": peak_memory}]}
+
+
+class TestCompare(unittest.TestCase):
+
+    baseline = results([1.0, 1.02, 0.98, 1.01, 0.99])
+
+    def status(self, current):
+        comparison, = compare(self.baseline, current)
+        return comparison["status"]
+
+    def test_regression(self):
+        """ A consistent slowdown beyond the threshold regresses. """
+        self.assertEqual(self.status(results([1.3, 1.31, 1.29, 1.3, 1.32])),
+                         REGRESSED)
+        self.assertEqual(self.status(results([0.7, 0.71, 0.69, 0.7, 0.72])),
+                         IMPROVED)
+
+    def test_noise(self):
+        """ A single slow repeat does not regress. """
+        self.assertEqual(self.status(results([1.0, 1.01, 5.0, 0.99, 1.0])),
+                         OK)
+
+    def test_memory(self):
+        """ A peak memory increase beyond the threshold regresses. """
+        current = results([1.0, 1.02, 0.98, 1.01, 0.99], 1500000)
+        self.assertEqual(self.status(current), REGRESSED)
+        current = results([1.0, 1.02, 0.98, 1.01, 0.99], 1010000)
+        self.assertEqual(self.status(current), OK)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from effayoh import instrumentation
+from effayoh.marchandmodel.cache import BuildCache, BuildCacheError
+from effayoh.mungers.aggregation import YearLayers
+
+from benchmarks.synthetic import generate, synthetic_builder
+
+
+def cache_hits(instr, stage):
+    return instr.counters.get(("cache_hits", (("stage", stage),)), 0)
+
+
+class TestBuildCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = generate(os.path.join(self.directory, "data"),
+                             countries=8,
+                             items=3,
+                             years=3,
+                             density=0.5,
+                             seed=6)
+        self.instr = instrumentation.enable()
+
+    def tearDown(self):
+        instrumentation.disable()
+        shutil.rmtree(self.directory)
+
+    def assertSameNetwork(self, network, expected):
+        self.assertEqual(dict(network.nodes(data=True)),
+                         dict(expected.nodes(data=True)))
+        self.assertEqual(sorted(network.edges(data=True)),
+                         sorted(expected.edges(data=True)))
+
+    def test_param_change(self):
+        """ Changing a static parameter reuses the cached network. """
+        builder = synthetic_builder(self.data)
+        builder.set_build_cache()
+        expected = builder.build().network
+
+        builder.add_static_param("fr", 0.6)
+        model = builder.build()
+        self.assertEqual(cache_hits(self.instr, "network"), 1)
+        self.assertEqual(model.static_params["fr"], 0.6)
+        self.assertSameNetwork(model.network, expected)
+        self.assertIsNot(model.network, expected)
+
+    def test_layers_copied(self):
+        """ Changing the layers of a model leaves the cached layers. """
+        builder = synthetic_builder(self.data)
+        builder.set_year_aggregation(YearLayers())
+        builder.set_build_cache()
+        first = builder.build()
+        expected = {suffix: sorted((u, v, dict(data))
+                                   for u, v, data in layer.edges(data=True))
+                    for suffix, layer in first.layers.items()}
+        for layer in first.layers.values():
+            for _, _, data in layer.edges(data=True):
+                data.clear()
+
+        second = builder.build()
+        self.assertEqual(cache_hits(self.instr, "network"), 1)
+        for layer in second.layers.values():
+            for _, _, data in layer.edges(data=True):
+                data.clear()
+        third = builder.build()
+        self.assertEqual(cache_hits(self.instr, "network"), 2)
+        self.assertEqual({suffix: sorted(layer.edges(data=True))
+                          for suffix, layer in third.layers.items()},
+                         expected)
+
+    def test_data_file_change(self):
+        """ Touching a data file only reads that data source again. """
+        builder = synthetic_builder(self.data)
+        builder.set_build_cache()
+        expected = builder.build().network
+        self.assertEqual(cache_hits(self.instr, "parse"), 0)
+
+        stat = os.stat(self.data.psd_path)
+        os.utime(self.data.psd_path, (stat.st_atime, stat.st_mtime + 10))
+        network = builder.build().network
+        self.assertEqual(cache_hits(self.instr, "network"), 0)
+        self.assertEqual(cache_hits(self.instr, "parse"), 2)
+        self.assertEqual(builder.build_cache.misses, 4 + 2)
+        self.assertSameNetwork(network, expected)
+
+    def test_directory(self):
+        """ A cache directory is shared by caches of other processes. """
+        path = os.path.join(self.directory, "cache")
+        builder = synthetic_builder(self.data)
+        builder.set_build_cache(BuildCache(path))
+        expected = builder.build().network
+
+        builder.set_build_cache(BuildCache(path))
+        network = builder.build().network
+        self.assertEqual(cache_hits(self.instr, "network"), 1)
+        self.assertSameNetwork(network, expected)
+
+    def test_max_entries(self):
+        cache = BuildCache(max_entries=1)
+        cache.put("parse", "a", 1)
+        cache.put("parse", "b", 2)
+        self.assertIsNone(cache.get("parse", "a"))
+        self.assertEqual(cache.get("parse", "b"), 2)
+        with self.assertRaises(BuildCacheError):
+            BuildCache(max_entries=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+import unittest
+
+from effayoh.marchandmodel.base.mungers.dtm import (
+    calorie_cereals_exports_converter, calorie_cereals_exports_conversion,
+    WHEAT, MACARONI
+)
+from effayoh.mungers.conversions import (
+    ConversionError, Factor, Sum, WeightedSum, apply_conversions
+)
+from effayoh.mungers.storage import NAN, CoordinateTable
+
+from benchmarks.synthetic import generate, synthetic_builder
+
+
+def as_function(conversion):
+    """ Return a plain function applying conversion. """
+    return lambda x: conversion(x)
+
+
+class TestConversions(unittest.TestCase):
+
+    def test_specs(self):
+        """ Conversions compute the values of the equivalent functions. """
+        self.assertEqual(Factor(3.5)(2.0), 7.0)
+        self.assertEqual(Sum()({"a": 1.0, "b": 2.5}), 3.5)
+        tons = {WHEAT: 12.5, MACARONI: 3.25}
+        self.assertEqual(calorie_cereals_exports_conversion(tons),
+                         calorie_cereals_exports_converter(tons))
+        with self.assertRaises(ConversionError):
+            WeightedSum({"a": 2.0})({"b": 1.0})
+
+    def test_apply_conversions(self):
+        """ Rows are converted by the conversions of their keys. """
+        table = CoordinateTable(("country", "item", "element"), [2005])
+        for coordinate in [("A", "x", "e"), ("A", "y", "e"),
+                           ("B", "x", "e"), ("B", "x", "f")]:
+            table.add(coordinate, [(2005, 1.0)])
+        layers = [table.values[:], table.values[:]]
+        layers[1][2] = NAN
+        apply_conversions(table,
+                          layers,
+                          {("x", "e"): Factor(2.0),
+                           ("y", "e"): as_function(Factor(3.0)),
+                           ("z", "e"): Factor(4.0)},
+                          ("item", "element"))
+        self.assertEqual(list(layers[0]), [2.0, 3.0, 2.0, 1.0])
+        self.assertEqual(list(layers[1])[:2], [2.0, 3.0])
+        self.assertNotEqual(layers[1][2], layers[1][2])
+        self.assertEqual(layers[1][3], 1.0)
+
+
+class TestMungeConversions(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = generate(self.directory,
+                             countries=8,
+                             items=4,
+                             years=3,
+                             density=0.5,
+                             seed=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fallback(self):
+        """ A build with plain functions builds the same network. """
+        expected = synthetic_builder(self.data).build().network
+
+        builder = synthetic_builder(self.data)
+
+        def to_functions(munger):
+            for name in ["item_element_conversions",
+                         "element_items_group_conversions",
+                         "items_elements_groups_conversions",
+                         "attribute_commodity_conversions",
+                         "attribute_commodities_group_conversions"]:
+                conversions = getattr(munger, name, {})
+                for key, conversion in conversions.items():
+                    conversions[key] = as_function(conversion)
+
+        builder.add_hook("munge", pre=to_functions)
+        network = builder.build().network
+
+        self.assertEqual(dict(network.nodes(data=True)),
+                         dict(expected.nodes(data=True)))
+        self.assertEqual(sorted(network.edges(data=True)),
+                         sorted(expected.edges(data=True)))
+
+
+if __name__ == "__main__":
+    unittest.main()
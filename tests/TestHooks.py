@@ -0,0 +1,90 @@
+import unittest
+
+from effayoh.marchandmodel.hooks import HookError
+from effayoh.marchandmodel.initializers import fuse
+
+from TestModelExecute import build_model, make_builder
+
+
+class TestHooks(unittest.TestCase):
+
+    def test_build_hooks(self):
+        """ Build phase callbacks are called around each phase. """
+        calls = []
+        builder = make_builder(cascade_version=True)
+        builder.add_hook("build",
+                         pre=lambda builder: calls.append("build"),
+                         post=lambda builder, model: calls.append("built"))
+        builder.add_hook(
+            "munge",
+            pre=lambda munger: calls.append(("munge", type(munger)))
+        )
+        builder.add_hook(
+            "initializer",
+            post=lambda initializer, network: calls.append(initializer)
+        )
+        builder.build()
+
+        self.assertEqual(calls[0], "build")
+        self.assertEqual(calls[-1], "built")
+        mungers = [call[1] for call in calls if isinstance(call, tuple)]
+        self.assertEqual(mungers, builder.munger_classes)
+        # Consecutive fusable initializers are applied together.
+        applied = [call.__name__ for call in calls if callable(call)]
+        self.assertEqual(applied,
+                         [initializer.__name__ for initializer
+                          in fuse(builder.network_initializers)])
+
+    def test_execution_hooks(self):
+        """ Iteration and node update callbacks see every update. """
+        reference = build_model(cascade_version=True)
+        reference.set_epicenter("RUSSIA")
+        reference.execute()
+
+        model = build_model(cascade_version=True)
+        model.set_epicenter("RUSSIA")
+        iterations = []
+        updates = []
+        model.add_hook("iteration",
+                       pre=lambda model, i: iterations.append(i),
+                       post=lambda model, i, changes: self.assertEqual(
+                           changes.iteration, i))
+        model.add_hook("node_update",
+                       pre=lambda model, node, shock: updates.append(node))
+        executed = []
+        model.add_hook("execute", post=executed.append)
+        model.execute()
+
+        self.assertEqual(iterations, [1, 2, 3])
+        self.assertIn("RUSSIA", updates)
+        self.assertEqual(executed, [model])
+        self.assertEqual(model.network.node, reference.network.node)
+
+    def test_unknown_hook_point(self):
+        model = build_model()
+        with self.assertRaises(HookError):
+            model.add_hook("iterations", pre=print)
+
+    def test_set_functions(self):
+        """ Node update and continuation functions replace the base. """
+        model = build_model(cascade_version=True)
+        model.set_epicenter("RUSSIA")
+        updated = []
+
+        def node_update(model, node, shock):
+            updated.append(node)
+            model.node_update(node, shock)
+
+        model.set_node_update(node_update)
+        model.set_iterate_again_function(lambda model: False)
+        model.execute()
+        self.assertEqual(updated, ["RUSSIA"])
+
+        model = build_model()
+        model.set_execution_function(lambda model: updated.append(model))
+        model.execute()
+        self.assertIs(updated[-1], model)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+
+from effayoh.marchandmodel.builder import MarchandModelBuilder
+from effayoh.marchandmodel.initializers import (
+    DefaultInitializer, FusableInitializer, FusedInitializer, fuse,
+    edge_initializer, node_initializer
+)
+
+from TestModelExecute import make_builder, russian_exports_initializer
+
+
+@node_initializer(reads=["consumption", "supply"], writes=["deficit"])
+def deficit_initializer(node, data):
+    data["deficit"] = max(0.0, data["consumption"] - data["supply"])
+
+
+@edge_initializer(reads=["weight", "inflow"], writes=["inflow"])
+def inflow_initializer(u, v, data, u_data, v_data):
+    weight = u_data.get("weight", 1.0)
+    v_data["inflow"] = v_data.get("inflow", 0.0) + weight*data["exports"]
+
+
+weight_initializer = DefaultInitializer("weight_initializer",
+                                        "weight",
+                                        2.0,
+                                        replace=True)
+
+
+class TestInitializers(unittest.TestCase):
+
+    def test_fuse(self):
+        """ Consecutive compatible initializers are fused in order. """
+        fused = fuse([
+            russian_exports_initializer,
+            MarchandModelBuilder.shocked_initializer,
+            MarchandModelBuilder.production_initializer,
+            MarchandModelBuilder.consumption_initializer,
+            MarchandModelBuilder.supply_initializer,
+            deficit_initializer,
+            MarchandModelBuilder.reserves_initializer,
+        ])
+        self.assertIs(fused[0], russian_exports_initializer)
+        self.assertIsInstance(fused[1], FusedInitializer)
+        self.assertEqual(len(fused[1].initializers), 4)
+        # deficit_initializer reads the supply the supply edge pass
+        # writes, so it starts a new fused initializer.
+        self.assertEqual(fused[2].initializers,
+                         [deficit_initializer,
+                          MarchandModelBuilder.reserves_initializer])
+        self.assertIsInstance(deficit_initializer, FusableInitializer)
+
+    def test_later_node_writer(self):
+        """
+        A node update writing an attribute an earlier edge pass reads is
+        not fused with it.
+        """
+        fused = fuse([MarchandModelBuilder.shocked_initializer,
+                      inflow_initializer,
+                      weight_initializer])
+        self.assertIsInstance(fused[0], FusedInitializer)
+        self.assertEqual(fused[0].initializers,
+                         [MarchandModelBuilder.shocked_initializer,
+                          inflow_initializer])
+        self.assertIs(fused[1], weight_initializer)
+
+        builder = make_builder(cascade_version=True)
+        builder.add_network_initializer(inflow_initializer)
+        builder.add_network_initializer(weight_initializer)
+        builder.set_fuse_initializers(False)
+        expected = builder.build().network
+        builder.set_fuse_initializers()
+        network = builder.build().network
+
+        self.assertEqual(dict(network.nodes(data=True)),
+                         dict(expected.nodes(data=True)))
+        # The inflows are computed before the weights are set.
+        usa = network.node["USA"]
+        self.assertEqual(usa["weight"], 2.0)
+        self.assertEqual(usa["inflow"],
+                         sum(data["exports"]
+                             for u, v, data in network.in_edges("USA",
+                                                                data=True)))
+
+    def test_fused_build(self):
+        """ Fused initializers initialize the network identically. """
+        builder = make_builder(cascade_version=True)
+        builder.add_network_initializer(deficit_initializer)
+        builder.set_fuse_initializers(False)
+        expected = builder.build().network
+        builder.set_fuse_initializers()
+        network = builder.build().network
+
+        self.assertEqual(dict(network.nodes(data=True)),
+                         dict(expected.nodes(data=True)))
+        self.assertTrue(all("deficit" in data
+                            for node, data in network.nodes(data=True)))
+
+
+if __name__ == "__main__":
+    unittest.main()
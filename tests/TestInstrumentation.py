@@ -0,0 +1,56 @@
+import unittest
+
+from effayoh import instrumentation
+
+from TestModelExecute import build_model
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def tearDown(self):
+        instrumentation.disable()
+
+    def test_disabled(self):
+        """ Nothing is recorded when instrumentation is disabled. """
+        self.assertFalse(instrumentation.active().enabled)
+        model = build_model()
+        model.set_epicenter("RUSSIA")
+        model.execute()
+        self.assertIs(instrumentation.active(),
+                      instrumentation.NULL_INSTRUMENTATION)
+
+    def test_report(self):
+        """ Build and execute phases are timed and counted. """
+        instr = instrumentation.enable()
+        model = build_model(cascade_version=True)
+        model.set_epicenter("RUSSIA")
+        model.execute()
+
+        report = instr.report()
+        paths = set(timer["path"] for timer in report["timers"])
+        for path in ("build",
+                     "build/munge",
+                     "build/munge/TestBaseDTMMunger/parse",
+                     "build/initializers",
+                     "execute",
+                     "execute/iteration/node_update",
+                     "execute/record"):
+            self.assertIn(path, paths)
+
+        counters = {}
+        for counter in report["counters"]:
+            name = counter["name"]
+            counters[name] = counters.get(name, 0) + counter["value"]
+        self.assertTrue(counters["rows_read"] >= counters["rows_kept"] > 0)
+        self.assertTrue(counters["edges_set"] > 0)
+        self.assertEqual(counters["nodes_shocked"],
+                         sum(1 for node, data in model.network.node.items()
+                             if data["shocked"]))
+
+        metrics = instr.metrics()
+        self.assertIn('effayoh_phase_seconds{phase="build/munge"}', metrics)
+        self.assertIn('effayoh_rows_read{source="TestBaseDTMMunger"}', metrics)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import shutil
+import tempfile
+import unittest
+
+from effayoh.marchandmodel import MarchandModelError
+from effayoh.marchandmodel.base import commodities
+from effayoh.marchandmodel.layers import (
+    select_year, select_window, select_commodity
+)
+from effayoh.mungers.aggregation import (
+    AggregationError, YearLayers, WindowLayers
+)
+
+from benchmarks.synthetic import (
+    generate, largest_exporter, synthetic_builder
+)
+
+
+class TestYearLayers(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = generate(self.directory,
+                             countries=8,
+                             items=3,
+                             years=3,
+                             density=0.5,
+                             seed=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertNetworksEqual(self, network, expected):
+        self.assertEqual(sorted(network), sorted(expected))
+        for node, data in expected.node.items():
+            self.assertEqual(sorted(network.node[node]), sorted(data))
+            for attr, value in data.items():
+                self.assertAlmostEqual(network.node[node][attr],
+                                       value,
+                                       delta=1e-9*max(1.0, abs(value)))
+        self.assertEqual(sorted(network.edges()), sorted(expected.edges()))
+        for u, v, data in expected.edges(data=True):
+            value = data["exports"]
+            self.assertAlmostEqual(network[u][v]["exports"],
+                                   value,
+                                   delta=1e-9*max(1.0, abs(value)))
+
+    def test_base_layer(self):
+        """ The network of the model is that of the mean of the years. """
+        expected = synthetic_builder(self.data).build().network
+        builder = synthetic_builder(self.data)
+        builder.set_year_aggregation(YearLayers())
+        model = builder.build()
+
+        self.assertEqual(sorted(model.layers),
+                         ["@2005", "@2006", "@2007"])
+        self.assertNetworksEqual(model.network, expected)
+
+    def test_select_year(self):
+        """ A year layer is the network of a build of that year. """
+        builder = synthetic_builder(self.data)
+        builder.set_year_aggregation(YearLayers())
+        model = builder.build()
+
+        for year in self.data.years:
+            year_builder = synthetic_builder(self.data)
+            year_builder.set_years([year])
+            expected = year_builder.build().network
+            year_model = select_year(model, year)
+            self.assertNetworksEqual(year_model.network, expected)
+
+        year_model.set_epicenter(largest_exporter(year_model))
+        year_model.execute()
+        with self.assertRaises(MarchandModelError):
+            select_year(model, 2004)
+
+    def test_select_window(self):
+        """ A window layer is the network of a build of its years. """
+        builder = synthetic_builder(self.data)
+        builder.set_year_aggregation(WindowLayers(2, 3))
+        model = builder.build()
+
+        self.assertEqual(sorted(model.layers),
+                         ["@2005-2006", "@2005-2007", "@2006-2007"])
+        for first, last in [(2005, 2006), (2006, 2007), (2005, 2007)]:
+            window_builder = synthetic_builder(self.data)
+            window_builder.set_years(list(range(first, last + 1)))
+            expected = window_builder.build().network
+            window_model = select_window(model, first, last)
+            self.assertNetworksEqual(window_model.network, expected)
+
+        with self.assertRaises(AggregationError):
+            WindowLayers(0)
+
+    def test_prefix_sums(self):
+        """ Windows skip the years without a value. """
+        aggregate = WindowLayers(2).aggregator([2005, 2006, 2007, 2008])
+        self.assertEqual(aggregate({2005: 1.0, 2006: 3.0, 2008: 5.0}),
+                         [3.0, 2.0, 3.0, 5.0])
+        self.assertEqual(aggregate({2005: 1.0, 2008: 5.0}),
+                         [3.0, 1.0, None, 5.0])
+
+
+class TestCommodityLayers(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = generate(self.directory,
+                             countries=8,
+                             items=3,
+                             years=3,
+                             density=0.5,
+                             seed=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSameValues(self, data, expected):
+        self.assertEqual(sorted(data), sorted(expected))
+        for name, value in expected.items():
+            self.assertAlmostEqual(data[name], value,
+                                   delta=1e-9*max(1.0, abs(value)))
+
+    def test_restricted_build(self):
+        """ A commodity layer is the network of the commodity's items. """
+        builder = synthetic_builder(self.data)
+        for name, items in commodities.COMMODITIES:
+            builder.add_commodity_layer(name, items)
+        model = builder.build()
+
+        for name, items in [("wheat", commodities.WHEAT),
+                            ("rice", commodities.RICE)]:
+            network = select_commodity(model, name).network
+
+            def restrict(munger):
+                if hasattr(munger, "commodities"):
+                    munger.commodities &= items
+                else:
+                    munger.items &= items
+
+            restricted_builder = synthetic_builder(self.data)
+            restricted_builder.add_hook("munge", pre=restrict)
+            expected = restricted_builder.build().network
+
+            self.assertEqual(sorted(network.edges()),
+                             sorted(expected.edges()))
+            for u, v, data in expected.edges(data=True):
+                self.assertSameValues(network[u][v], data)
+            for node, data in expected.nodes(data=True):
+                self.assertSameValues(network.node[node], data)
+            for node in set(network) - set(expected):
+                self.assertEqual(network.degree(node), 0)
+        self.assertTrue(len(select_commodity(model, "wheat").network.edges()))
+
+    def test_select_commodity(self):
+        """ Commodity layers are kept for each year layer. """
+        builder = synthetic_builder(self.data)
+        builder.set_year_aggregation(YearLayers())
+        builder.add_commodity_layer("wheat", commodities.WHEAT)
+        model = builder.build()
+
+        self.assertEqual(sorted(model.layers),
+                         ["#wheat", "#wheat@2005", "#wheat@2006",
+                          "#wheat@2007", "@2005", "@2006", "@2007"])
+        wheat_model = select_commodity(model, "wheat", 2006)
+        self.assertEqual(sorted(wheat_model.network), sorted(model.network))
+        wheat_model.set_epicenter(largest_exporter(wheat_model))
+        wheat_model.execute()
+
+        with self.assertRaises(MarchandModelError):
+            builder.add_commodity_layer("wheat", commodities.WHEAT)
+        with self.assertRaises(MarchandModelError):
+            builder.add_commodity_layer("rice@2005", commodities.RICE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import logging
+import sys
+import unittest
+
+from effayoh import logs
+
+from TestModelExecute import build_model
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger(logs.LOGGER_NAME)
+        self.level = self.logger.level
+
+    def tearDown(self):
+        for handler in self.logger.handlers[1:]:
+            self.logger.removeHandler(handler)
+        self.logger.setLevel(self.level)
+
+    def test_quiet(self):
+        """ Building and executing a model outputs nothing by default. """
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            model = build_model()
+            model.set_epicenter("RUSSIA")
+            model.execute()
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(output, "")
+
+    def test_iteration_records(self):
+        """ Iterations are logged at debug level with structured fields. """
+        handler = logs.configure(logging.DEBUG,
+                                 handler=ListHandler(),
+                                 rate_limit=None)
+        model = build_model()
+        model.set_epicenter("RUSSIA")
+        model.execute()
+
+        iterations = [record.fields["iteration"]
+                      for record in handler.records
+                      if record.msg == "Executing iteration %d"]
+        self.assertEqual(iterations, list(range(1, len(iterations) + 1)))
+        for record in handler.records:
+            if record.msg == "Executing iteration %d":
+                self.assertEqual(record.levelno, logging.DEBUG)
+
+    def test_rate_limit(self):
+        """ At most limit records of a message are let through. """
+        handler = logs.configure(logging.DEBUG,
+                                 handler=ListHandler(),
+                                 rate_limit=2)
+        log = logging.getLogger("effayoh.test")
+        for i in range(5):
+            log.info("Message %d", i, extra=logs.fields(i=i))
+        log.info("Other message")
+
+        messages = [record.getMessage() for record in handler.records]
+        self.assertEqual(messages, ["Message 0", "Message 1", "Other message"])
+        rate_limit, = handler.filters
+        self.assertEqual(rate_limit.suppressed(),
+                         {("effayoh.test", "Message %d"): 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
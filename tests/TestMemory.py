@@ -0,0 +1,38 @@
+import unittest
+
+from effayoh.marchandmodel.memory import memory_report, deep_sizeof
+
+from TestModelExecute import make_builder
+
+
+class TestMemoryReport(unittest.TestCase):
+
+    def test_report(self):
+        """ The report attributes memory to the structures of a build. """
+        model, report = memory_report(make_builder())
+        self.assertTrue(len(model.network) > 0)
+        self.assertTrue(report["peak"] >= report["retained"])
+        self.assertTrue(report["network"] > 0)
+        self.assertTrue(report["object_pools"]["FAOCountry"] > 0)
+        self.assertEqual(len(report["mungers"]), 3)
+        for size in report["mungers"].values():
+            self.assertTrue(size > 0)
+
+    def test_release_munger_data(self):
+        """ Munger data is released when the builder is set to. """
+        builder = make_builder()
+        builder.set_release_munger_data()
+        model, report = memory_report(builder)
+        self.assertEqual(set(report["mungers"].values()), {0})
+
+    def test_deep_sizeof_shared(self):
+        """ Shared objects are counted once. """
+        shared = [1.5] * 100
+        seen = set()
+        first = deep_sizeof({"a": shared}, seen)
+        second = deep_sizeof({"b": shared}, seen)
+        self.assertTrue(second < first)
+
+
+if __name__ == "__main__":
+    unittest.main()
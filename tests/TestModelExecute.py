@@ -2,6 +2,7 @@ import os
 import unittest
 
 from effayoh.marchandmodel.builder import MarchandModelBuilder
+from effayoh.marchandmodel.scenario import ScenarioError, ShockScenario
 from effayoh.mungers.psd import PSDCountry
 from effayoh.resources.usda import map as psd_map
 from effayoh.mungers import FAOCountry
@@ -19,7 +20,7 @@ def russian_exports_initializer(network):
     network["RUSSIA"]["USA"]["exports"] = 3000.0
 
 
-def build_model(cascade_version=False, volumes_version=False):
+def make_builder(cascade_version=False, volumes_version=False):
 
     builder = MarchandModelBuilder()
 
@@ -59,8 +60,12 @@ def build_model(cascade_version=False, volumes_version=False):
         MarchandModelBuilder.reserves_initializer
     )
 
-    model = builder.build()
-    return model
+    return builder
+
+
+def build_model(cascade_version=False, volumes_version=False):
+    builder = make_builder(cascade_version, volumes_version)
+    return builder.build()
 
 
 class TestModelExecute(unittest.TestCase):
@@ -300,5 +305,125 @@ class TestModelExecute(unittest.TestCase):
         self.assertTrue(delta_supply < 0.001)
 
 
+class TestTradeTotals(unittest.TestCase):
+
+    def exact_totals(self, model):
+        """ Return the trade totals of model recomputed from its edges. """
+        export_totals = dict.fromkeys(model.network, 0.0)
+        import_totals = dict.fromkeys(model.network, 0.0)
+        for u, v, data in model.network.edges(data=True):
+            export_totals[u] += data["exports"]
+            if not model.network.node[u]["shocked"]:
+                import_totals[v] += data["exports"]
+        return export_totals, import_totals
+
+    def assertTotalsExact(self, model):
+        export_totals, import_totals = self.exact_totals(model)
+        for node in model.network:
+            self.assertAlmostEqual(model.export_totals[node],
+                                   export_totals[node],
+                                   delta=1e-6)
+            self.assertAlmostEqual(model.unshocked_import_totals[node],
+                                   import_totals[node],
+                                   delta=1e-6)
+
+    def test_running_totals(self):
+        """ The running totals are those of the network at all times. """
+        builder = make_builder(volumes_version=True)
+
+        def small_exports_initializer(network):
+            # Removed with a nonzero volume on its first adjustment.
+            network["GERMANY"]["CHINA"]["exports"] = 0.0015
+
+        builder.add_network_initializer(small_exports_initializer)
+        model = builder.build()
+        model.set_epicenter("GERMANY")
+        model.trade_totals_refresh_interval = 2
+        events = {"iterations": 0, "shocked": 0, "removed": 0}
+
+        def before_iteration(model, iteration):
+            self.assertTotalsExact(model)
+
+        def after_iteration(model, iteration, changes):
+            events["iterations"] += 1
+            events["shocked"] += len(changes.shocked)
+            events["removed"] += len(changes.removed_edges)
+            self.assertTotalsExact(model)
+
+        def after_node_update(model, node, shock):
+            # The nodes shocked by an update leave the totals exact.
+            self.assertTotalsExact(model)
+
+        model.add_hook("iteration", pre=before_iteration,
+                       post=after_iteration)
+        model.add_hook("node_update", post=after_node_update)
+        model.execute()
+
+        # The run crosses refreshes, shocks nodes and removes edges.
+        self.assertGreaterEqual(events["iterations"],
+                                model.trade_totals_refresh_interval)
+        self.assertGreater(events["shocked"], 0)
+        self.assertGreater(events["removed"], 0)
+
+
+class TestShockScenario(unittest.TestCase):
+
+    def assertNodesEqual(self, network_a, network_b):
+        for node, data in network_a.node.items():
+            for attr in ("reserves", "consumption", "supply"):
+                delta = abs(data[attr] - network_b.node[node][attr])
+                self.assertTrue(delta < 0.001)
+
+    def test_single_origin_scenario(self):
+        """ A one origin scenario is the same as setting an epicenter. """
+        epicenter_model = build_model()
+        epicenter_model.set_epicenter("USA")
+        epicenter_model.execute()
+
+        scenario_model = build_model()
+        scenario_model.set_scenario(ShockScenario.single("USA"))
+        scenario_model.execute()
+
+        self.assertNodesEqual(epicenter_model.network, scenario_model.network)
+
+    def test_compound_scenario(self):
+        """ Every origin of a compound scenario is shocked. """
+        model = build_model()
+        usa_production = model.network.node["USA"]["production"]
+        china_production = model.network.node["CHINA"]["production"]
+
+        scenario = ShockScenario("drought")
+        scenario.add_origin("USA", fraction=0.1)
+        scenario.add_origin("CHINA", amount=1000.0)
+        model.set_scenario(scenario)
+        model.execute()
+
+        network = model.network
+        expected = usa_production - 0.1*usa_production
+        self.assertTrue(abs(network.node["USA"]["production"] - expected)
+                        < 0.001)
+        expected = china_production - 1000.0
+        self.assertTrue(abs(network.node["CHINA"]["production"] - expected)
+                        < 0.001)
+        self.assertTrue(network.node["USA"]["shocked"])
+        self.assertTrue(network.node["CHINA"]["shocked"])
+
+    def test_missing_attribute(self):
+        """ A fraction of an attribute the origin lacks is refused. """
+        model = build_model()
+        scenario = ShockScenario("drought")
+        scenario.add_origin("USA", fraction=0.1, attr="prodution")
+        with self.assertRaises(ScenarioError) as raised:
+            scenario.initial_shocks(model.network.node, 0.2)
+        self.assertIn("USA", str(raised.exception))
+        self.assertIn("prodution", str(raised.exception))
+
+        # An absolute amount does not read the attribute.
+        scenario = ShockScenario("drought")
+        scenario.add_origin("USA", amount=10.0, attr="prodution")
+        self.assertEqual(scenario.initial_shocks(model.network.node, 0.2),
+                         [("USA", 10.0)])
+
+
 if __name__ == "__main__":
     unittest.main()
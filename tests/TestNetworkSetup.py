@@ -1,4 +1,5 @@
 import os
+import pickle
 import unittest
 
 from effayoh.marchandmodel.builder import MarchandModelBuilder
@@ -205,5 +206,30 @@ class TestNetworkSetup(unittest.TestCase):
             self.assertTrue(abs(0.4*expected - exports) < 0.001)
 
 
+class TestParallelParse(unittest.TestCase):
+
+    def test_pickle_pooled(self):
+        """ Unpickled pooled objects are the pooled instances. """
+        country = FAOCountry("Russian Federation", "185")
+        self.assertIs(pickle.loads(pickle.dumps(country)), country)
+        self.assertIs(pickle.loads(pickle.dumps(dtm.WHEAT)), dtm.WHEAT)
+
+    def test_parallel_parse(self):
+        """ Parsing in processes builds the same network. """
+        from TestModelExecute import make_builder
+
+        expected = make_builder(cascade_version=True).build().network
+        builder = make_builder(cascade_version=True)
+        builder.set_parse_processes()
+        mungers = []
+        network = builder.build(mungers=mungers).network
+
+        self.assertEqual(sorted(network.nodes(data=True)),
+                         sorted(expected.nodes(data=True)))
+        self.assertEqual(sorted(network.edges(data=True)),
+                         sorted(expected.edges(data=True)))
+        self.assertTrue(all(munger.rows_read > 0 for munger in mungers))
+
+
 if __name__ == "__main__":
     unittest.main()
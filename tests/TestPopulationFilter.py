@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from effayoh.marchandmodel.base.filters.population_filter import (
+    EXCLUDED_COUNTRIES, FAOSTATPopulationFilter, PopulationIndex,
+    population_index
+)
+
+from benchmarks.synthetic import generate
+
+
+class TestPopulationIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = generate(self.directory,
+                             countries=8,
+                             items=2,
+                             years=4,
+                             density=0.5,
+                             seed=7)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_once(self):
+        """ The index of a data file is read once and persisted. """
+        index_path = os.path.join(self.directory, "population.index")
+        index = population_index(self.data.fbs_path, index_path)
+        self.assertEqual(index.years, self.data.years)
+        self.assertEqual(len(index.countries), len(self.data.countries))
+        self.assertIs(population_index(self.data.fbs_path), index)
+        self.assertTrue(os.path.exists(index_path))
+
+        stat = os.stat(self.data.fbs_path)
+        os.utime(self.data.fbs_path, (stat.st_atime, stat.st_mtime + 10))
+        os.remove(index_path)
+        self.assertIsNot(population_index(self.data.fbs_path), index)
+
+    def test_filter(self):
+        """ Filters of any years and threshold query one index. """
+        index = PopulationIndex.read(self.data.fbs_path)
+        years = self.data.years[1:3]
+        populations, missing = index.populations(years)
+        self.assertEqual(missing, [])
+
+        everything = FAOSTATPopulationFilter(years, float("inf"), index)
+        for effpent in populations:
+            self.assertTrue(everything.excludes(effpent))
+
+        nothing = FAOSTATPopulationFilter(years, 0.0, index)
+        self.assertEqual(nothing.country_populations,
+                         everything.country_populations)
+        for effpent, population in nothing.country_populations.items():
+            self.assertGreater(population, 0.0)
+            self.assertEqual([population], populations[effpent])
+        self.assertEqual(nothing.excluded_countries, set(EXCLUDED_COUNTRIES))
+
+    def test_saved_index(self):
+        """ A saved index loads equal and an invalid one is rebuilt. """
+        index_path = os.path.join(self.directory, "population.index")
+        index = population_index(self.data.fbs_path, index_path)
+        fingerprint, loaded = PopulationIndex.load(index_path)
+        self.assertEqual(loaded.years, index.years)
+        self.assertEqual(loaded.countries, index.countries)
+        self.assertEqual(loaded.effpents, index.effpents)
+        self.assertEqual(loaded.values.tobytes(), index.values.tobytes())
+        years = self.data.years[:2]
+        self.assertEqual(loaded.populations(years), index.populations(years))
+
+        with open(index_path, "r+b") as fh:
+            fh.truncate(os.path.getsize(index_path) - 8)
+        with self.assertRaises(ValueError):
+            PopulationIndex.load(index_path)
+        with open(index_path, "wb") as fh:
+            fh.write(b"not an index")
+        with self.assertRaises(ValueError):
+            PopulationIndex.load(index_path)
+
+        # Another process finds the invalid file and rewrites it.
+        stat = os.stat(self.data.fbs_path)
+        os.utime(self.data.fbs_path, (stat.st_atime, stat.st_mtime + 10))
+        rebuilt = population_index(self.data.fbs_path, index_path)
+        self.assertEqual(rebuilt.values.tobytes(), index.values.tobytes())
+        self.assertEqual(PopulationIndex.load(index_path)[0]["mtime"],
+                         os.stat(self.data.fbs_path).st_mtime_ns)
+
+    def test_missing_years(self):
+        """ Countries without a population in the years are missing. """
+        index = PopulationIndex.read(self.data.fbs_path)
+        year = self.data.years[0]
+        for row in range(len(index.countries)):
+            index.values[row*len(index.years)] = float("nan")
+        populations, missing = index.populations([year])
+        self.assertEqual(populations, {})
+        self.assertEqual(missing, index.countries)
+
+    def test_unknown_years(self):
+        """ Years that are not in the food balance sheets are refused. """
+        index = PopulationIndex.read(self.data.fbs_path)
+        with self.assertRaises(ValueError) as raised:
+            index.populations([1990, self.data.years[0], 2990])
+        self.assertIn("[1990, 2990]", str(raised.exception))
+        with self.assertRaises(ValueError):
+            FAOSTATPopulationFilter([1990], index=index)
+
+
+if __name__ == "__main__":
+    unittest.main()
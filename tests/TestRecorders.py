@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+import unittest
+from functools import partial
+
+from effayoh.recorders.eventlogrecorder import EventLogRecorder
+from effayoh.recorders.nodestaterecorder import (
+    NodeStateRecorder,
+    NodeStateRecorderError,
+    StreamingNodeStateRecorder
+)
+from effayoh.recorders.recordsink import RecordFile
+from effayoh.recorders.tradevolumesrecorder import TradeVolumeRecorder
+
+from TestModelExecute import make_builder
+
+
+class RecountingTradeVolumeRecorder(TradeVolumeRecorder):
+
+    def record_changes(self, network, changes):
+        self.record(network)
+
+
+class TestTradeVolumeRecorder(unittest.TestCase):
+
+    def test_incremental_volumes(self):
+        """ Incremental volumes agree with a recount every iteration. """
+        builder = make_builder(cascade_version=True)
+        builder.add_recorder(TradeVolumeRecorder)
+        builder.add_recorder(RecountingTradeVolumeRecorder)
+        model = builder.build()
+        model.set_epicenter("RUSSIA")
+        model.execute()
+
+        incremental, recounting = model.recorders
+        self.assertEqual(len(incremental.volumes), len(recounting.volumes))
+        for actual, expected in zip(incremental.volumes, recounting.volumes):
+            self.assertTrue(abs(actual - expected) < 0.001)
+
+
+class SmallChunkNodeStateRecorder(NodeStateRecorder):
+
+    chunk_iterations = 2
+
+
+class TestNodeStateRecorder(unittest.TestCase):
+
+    def test_node_states(self):
+        """ The records hold the state of the nodes after each iteration. """
+        builder = make_builder(cascade_version=True)
+        builder.add_recorder(NodeStateRecorder)
+        builder.add_recorder(SmallChunkNodeStateRecorder)
+        model = builder.build()
+        initial = {node: dict(data)
+                   for node, data in model.network.node.items()}
+        model.set_epicenter("RUSSIA")
+        model.execute()
+
+        recorder, chunked = model.recorders
+        iterations, nodes, fields = recorder.shape
+        self.assertEqual(nodes, len(model.network))
+        self.assertEqual(fields, len(recorder.fields))
+        self.assertEqual(list(recorder.values()), list(chunked.values()))
+        self.assertEqual(len(recorder.values()), iterations*nodes*fields)
+
+        for node, data in model.network.node.items():
+            for field in ("reserves", "consumption", "supply"):
+                series = recorder.series(node, field)
+                self.assertEqual(series[0], initial[node][field])
+                self.assertEqual(series[-1], data[field])
+            self.assertEqual(recorder.series(node, "shocked")[-1],
+                             float(data["shocked"]))
+
+
+class TestStreamingNodeStateRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_record_file(self):
+        """ The record file holds the records of a NodeStateRecorder. """
+        path = os.path.join(self.directory, "states.rec")
+        builder = make_builder(cascade_version=True)
+        builder.add_recorder(NodeStateRecorder)
+        builder.add_recorder(partial(StreamingNodeStateRecorder,
+                                     path,
+                                     max_pending=2))
+        model = builder.build()
+        model.set_epicenter("RUSSIA")
+        model.execute()
+
+        recorder, streaming = model.recorders
+        self.assertIsNone(streaming.sink)
+        with RecordFile(path) as record_file:
+            self.assertEqual(record_file.header["nodes"], recorder.nodes)
+            self.assertEqual(record_file.rows, recorder.iterations)
+            self.assertEqual(record_file.values.tolist(),
+                             list(recorder.values()))
+            j = recorder.column_index("RUSSIA", "supply")
+            self.assertEqual(record_file.column(j).tolist(),
+                             recorder.series("RUSSIA", "supply"))
+
+        # The streaming recorder reads its records back like the other.
+        self.assertEqual(streaming.shape, recorder.shape)
+        self.assertEqual(list(streaming.values()), list(recorder.values()))
+        self.assertEqual(streaming.series("USA", "reserves"),
+                         recorder.series("USA", "reserves"))
+
+    def test_unfinished(self):
+        """ The records are only read back once the file is closed. """
+        path = os.path.join(self.directory, "states.rec")
+        model = make_builder().build()
+        streaming = StreamingNodeStateRecorder(path)
+        streaming.record(model.network)
+        with self.assertRaises(NodeStateRecorderError):
+            streaming.values()
+        streaming.finish()
+        self.assertEqual(streaming.shape[0], 1)
+        self.assertEqual(len(streaming.values()), streaming.row_size)
+
+
+class TestEventLogRecorder(unittest.TestCase):
+
+    def test_replay(self):
+        """ Replaying the log reconstructs the network at any iteration. """
+        builder = make_builder(cascade_version=True)
+        builder.add_recorder(EventLogRecorder)
+        builder.add_recorder(NodeStateRecorder)
+        model = builder.build()
+        edges = set(model.network.edges())
+        model.set_epicenter("RUSSIA")
+        model.execute()
+
+        events, states = model.recorders
+        for iteration in range(states.iterations):
+            network = events.replay(iteration)
+            for node, data in network.node.items():
+                for field in states.fields:
+                    series = states.series(node, field)
+                    self.assertEqual(float(data[field]), series[iteration])
+
+        network = events.replay()
+        self.assertEqual(set(network.edges()), set(model.network.edges()))
+        for u, v, data in network.edges(data=True):
+            expected = model.network.edge[u][v]["exports"]
+            self.assertTrue(abs(data["exports"] - expected) < 0.001)
+
+        cut = set((u, v) for iteration, u, v in events.log.cut_edges())
+        self.assertEqual(cut, edges - set(model.network.edges()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from effayoh.marchandmodel.scenario import ShockScenario
+from effayoh.marchandmodel.store import STATE_FILE, ResultStore
+
+from benchmarks.synthetic import generate, synthetic_builder
+from TestModelExecute import make_builder
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_cached_run(self):
+        """ A repeated run is loaded from the store. """
+        store = ResultStore(self.root)
+        builder = make_builder()
+        scenario = ShockScenario.single("USA")
+
+        first = store.run(builder, scenario)
+        self.assertEqual(len(store.entries()), 1)
+
+        # The model is not built again for a stored run.
+        builder.build = None
+        second = store.run(builder, scenario)
+        self.assertEqual(first.key, second.key)
+        self.assertEqual(first.nodes, second.nodes)
+
+    def test_key(self):
+        """ The key changes with the configuration and the scenario. """
+        store = ResultStore(self.root)
+        builder = make_builder()
+        usa = ShockScenario.single("USA")
+        china = ShockScenario.single("CHINA")
+
+        key = store.key(builder, usa)
+        self.assertEqual(key, store.key(make_builder(), usa))
+        self.assertNotEqual(key, store.key(builder, china))
+        builder.add_static_param("fr", 0.25)
+        self.assertNotEqual(key, store.key(builder, usa))
+
+    def test_data_file_key(self):
+        """ The key changes with every data file. """
+        store = ResultStore(self.root)
+        data = generate(os.path.join(self.root, "data"),
+                        countries=4,
+                        items=1,
+                        years=1,
+                        density=0.5,
+                        seed=3)
+        builder = synthetic_builder(data)
+        # Munger classes defined in a function may share an identity.
+        for MungerClass in builder.munger_classes:
+            MungerClass.__qualname__ = "Munger"
+        scenario = ShockScenario.single(data.countries[0][0])
+
+        keys = {store.key(builder, scenario)}
+        for path in (data.dtm_path, data.fbs_path, data.psd_path):
+            stat = os.stat(path)
+            os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+            keys.add(store.key(builder, scenario))
+        self.assertEqual(len(keys), 4)
+
+    def test_corrupt_run(self):
+        """ A run whose state cannot be read is not stored. """
+        store = ResultStore(self.root)
+        usa = store.run(make_builder(), ShockScenario.single("USA"))
+        state_path = os.path.join(self.root, usa.key, STATE_FILE)
+        with open(state_path, "r+b") as fh:
+            fh.truncate(os.path.getsize(state_path)//2)
+        self.assertIsNone(store.load(usa.key))
+        with open(state_path, "wb") as fh:
+            fh.write(b"not a pickle")
+        self.assertIsNone(store.load(usa.key))
+
+    def test_eviction(self):
+        """ The least recently used runs are evicted. """
+        store = ResultStore(self.root)
+        builder = make_builder()
+        usa = store.run(builder, ShockScenario.single("USA"))
+        store.run(builder, ShockScenario.single("CHINA"))
+        store.load(usa.key)
+
+        store.max_bytes = usa.metadata["size"]
+        store.evict()
+        self.assertEqual([entry["key"] for entry in store.entries()],
+                         [usa.key])
+
+    def test_tiny_store(self):
+        """ A run larger than the store is returned and kept. """
+        store = ResultStore(self.root, max_bytes=1)
+        builder = make_builder()
+        china = store.run(builder, ShockScenario.single("CHINA"))
+        usa = store.run(builder, ShockScenario.single("USA"))
+        self.assertIsNotNone(usa)
+        self.assertTrue(usa.nodes)
+        self.assertEqual([entry["key"] for entry in store.entries()],
+                         [usa.key])
+        self.assertIsNone(store.load(china.key))
+        self.assertEqual(store.load(usa.key).nodes, usa.nodes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import unittest
+
+from effayoh.marchandmodel.engine import ArrayEngine
+from effayoh.marchandmodel.executor import ScenarioExecutor
+from effayoh.marchandmodel.reproducibility import check_reproducible
+from effayoh.marchandmodel.scenario import ShockScenario
+
+from TestModelExecute import build_model
+
+
+class TestScenarioExecutor(unittest.TestCase):
+
+    def assertStateEqual(self, network, nodes, result):
+        state = result.node_state(nodes)
+        for node, data in network.node.items():
+            for attr in ("reserves", "consumption", "supply"):
+                delta = abs(data[attr] - state[node][attr])
+                self.assertTrue(delta < 0.001)
+
+    def test_array_engine(self):
+        """ The ArrayEngine agrees with MarchandModel.execute. """
+        model = build_model(cascade_version=True)
+        compiled = model.compile()
+        engine = ArrayEngine(compiled, model.static_params)
+        result = engine.run(ShockScenario.single("RUSSIA"))
+
+        model.set_epicenter("RUSSIA")
+        model.execute()
+
+        self.assertStateEqual(model.network, compiled.nodes, result)
+
+    def test_executor(self):
+        """ The ScenarioExecutor returns results in scenario order. """
+        model = build_model()
+        with ScenarioExecutor(model, processes=2) as executor:
+            nodes = executor.nodes
+            scenarios = [ShockScenario.single(node) for node in nodes]
+            results = executor.run(scenarios)
+
+        for node, result in zip(nodes, results):
+            expected = build_model()
+            expected.set_epicenter(node)
+            expected.execute()
+            self.assertStateEqual(expected.network, nodes, result)
+
+    @unittest.skipUnless(os.path.isdir("/dev/shm"), "No /dev/shm")
+    def test_pool_failure(self):
+        """ The shared block is freed when the pool cannot start. """
+        model = build_model()
+        blocks = set(os.listdir("/dev/shm"))
+        with self.assertRaises(ValueError):
+            ScenarioExecutor(model, processes=0)
+        self.assertEqual(set(os.listdir("/dev/shm")) - blocks, set())
+
+
+class TestReproducibility(unittest.TestCase):
+
+    def test_reproducible(self):
+        """ Engines agree bit for bit in reproducible mode. """
+        scenarios = [
+            ShockScenario.single(node)
+            for node in sorted(build_model().network)
+        ]
+        compound = ShockScenario("compound")
+        compound.add_origin("USA").add_origin("RUSSIA", fraction=0.5)
+        scenarios.append(compound)
+
+        for cascade_version in (False, True):
+            mismatches = check_reproducible(
+                lambda: build_model(cascade_version=cascade_version),
+                scenarios,
+                processes=(1, 3)
+            )
+            self.assertEqual(mismatches, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from effayoh.mungers.storage import (
+    CoordinateTable, NestedView, StorageError, as_table
+)
+
+from benchmarks.synthetic import generate, mungers
+
+
+def to_dicts(data):
+    """ Return a copy of nested mappings as nested dicts. """
+    if not isinstance(data, NestedView):
+        return data
+    return {key: to_dicts(value) for key, value in data.items()}
+
+
+NESTED = {
+    "A": {"X": {2005: 1.0, 2006: 2.0}, "Y": {2006: 3.0}},
+    "B": {"Y": {2005: 4.0}},
+    "C": {"X": {2007: 5.0}},
+}
+
+
+class TestCoordinateTable(unittest.TestCase):
+
+    def test_nested_view(self):
+        """ The view of a table is equal to the nested dicts. """
+        table = CoordinateTable.from_nested(NESTED,
+                                            ("country", "item"),
+                                            [2005, 2006, 2007])
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.keys[0], ["A", "B", "C"])
+        view = NestedView(table)
+        self.assertEqual(view, NESTED)
+        self.assertEqual(list(view["A"]), ["X", "Y"])
+        self.assertIs(as_table(view, None, None), table)
+
+        copy = pickle.loads(pickle.dumps(view))
+        self.assertEqual(copy, NESTED)
+        with self.assertRaises(StorageError):
+            table.add(("A", "Z"), [(2005, 1.0)])
+
+    def test_prefix_rows(self):
+        """ Prefixes are in the order of the nested dicts. """
+        table = CoordinateTable(("reporter", "partner"), [2005])
+        for reporter, partner in [("A", "X"), ("B", "Y"), ("A", "Z"),
+                                  ("B", "X"), ("A", "X")]:
+            table.add((reporter, partner), [(2005, 1.0)])
+        self.assertEqual(table.prefix_rows(2),
+                         [(("A", "X"), [0]),
+                          (("A", "Z"), [2]),
+                          (("B", "Y"), [1]),
+                          (("B", "X"), [3])])
+        self.assertEqual(table.prefix_rows(1),
+                         [(("A",), [0, 2]), (("B",), [1, 3])])
+
+    def test_unknown_year(self):
+        table = CoordinateTable(("country",), [2005])
+        with self.assertRaises(StorageError):
+            table.add(("A",), [(2004, 1.0)])
+
+
+class TestMungerStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = generate(self.directory,
+                             countries=8,
+                             items=3,
+                             years=3,
+                             density=0.5,
+                             seed=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_nested_data(self):
+        """ Mungers munge nested dicts as they munge their tables. """
+        for munger, other in zip(mungers(self.data), mungers(self.data)):
+            data = munger.get_raw_data()
+            nested = to_dicts(data)
+            self.assertEqual(data, nested)
+            munger.munge(data)
+            other.munge(nested)
+            self.assertTrue(len(munger.data) > 0)
+            self.assertEqual(other.data, munger.data)
+            network = munger.political_rectifier.network
+            other_network = other.political_rectifier.network
+            self.assertEqual(dict(other_network.nodes(data=True)),
+                             dict(network.nodes(data=True)))
+            self.assertEqual(sorted(other_network.edges(data=True)),
+                             sorted(network.edges(data=True)))
+
+
+if __name__ == "__main__":
+    unittest.main()